@@ -1,11 +1,93 @@
+"""
+Generates the synthetic Goodreads data loaded by load-data.sql.
+
+Every table is produced in fixed-size chunks and appended to its CSV in
+gen_csvs/ as soon as the chunk is ready, so memory stays flat no matter how
+many users are generated. Progress is recorded after each chunk, and a run
+that was interrupted can be continued with --resume.
+
+Chunks can be generated by a pool of worker processes (--workers). Each
+chunk seeds its own random generators from the run's seed, so the output
+only depends on --seed, --as-of and the other settings, not on the number
+of workers.
+
+Usage:
+    python3 data-gen.py [--users N] [--chunk-size N] [--workers N]
+                        [--seed S] [--as-of DATE] [--resume]
+"""
+
+import argparse
+import json
+import os
+import itertools
+import multiprocessing
+from collections import deque
 import pandas as pd
 import random
 import numpy as np
 from faker import Faker
 import hashlib
-import secrets
+from datetime import datetime
 
 fake = Faker()
+rng = np.random.default_rng()
+# generated timestamps fall between the start of this timestamp's decade and it
+timestamps_end = pd.Timestamp(datetime.now())
+
+PERCENT_SERIES = 0.2
+PERCENT_REVIEW = 0.6
+NUMBER_USERS = 500
+MAX_FRIENDS = 50
+MAX_CUSTOM_SHELVES = 5
+MEAN_BOOKS = 10
+
+# rows of the driving table (books or users) generated per chunk
+CHUNK_SIZE = 10000
+OUTPUT_DIR = "gen_csvs"
+PROGRESS_FILE = ".progress.json"
+
+default_shelves = ["Favorites", "Has Read", "Wants to Read", "Currently Reading"]
+genres = ["Fiction", "Non-Fiction", "Science Fiction", "Fantasy", "Mystery",
+          "Thriller", "Romance", "Western", "Dystopian", "Historical Fiction",
+          "Horror", "Memoir", "Biography", "Self-Help", "Cooking", "Art", "Travel",
+          "Religion", "Science", "History", "Math", "Poetry", "Philosophy",
+          "Business", "Economics", "Psychology", "Sociology", "Political Science",
+          "Education", "Technology", "Health", "Fitness", "Sports", "Nature",
+          "Animals", "Crafts", "Hobbies", "Music", "Film", "Theatre", "Television",
+          "Gaming", "Comics", "Graphic Novels", "Manga", "Children's", "Young Adult",
+          "Adult", "Elderly", "LGBTQ+", "Feminism"]
+
+
+def random_timestamps(n):
+    """
+    Draws n random timestamps from the start of the decade until
+    `timestamps_end`, like `fake.date_time_this_decade()` but in one batch.
+    """
+    start = pd.Timestamp(year=timestamps_end.year // 10 * 10, month=1, day=1)
+    span_us = int((timestamps_end - start) / pd.Timedelta(microseconds=1))
+    return start + pd.to_timedelta(rng.integers(0, span_us, size=n), unit='us')
+
+
+def seed_generators(*key):
+    """
+    Reseeds every random generator used here (NumPy, `random` and Faker)
+    from a key such as (seed, stage index, chunk index).
+    """
+    global rng
+    seed_seq = np.random.SeedSequence(list(key))
+    rng = np.random.default_rng(seed_seq)
+    python_seed, faker_seed = seed_seq.generate_state(2)
+    random.seed(int(python_seed))
+    fake.seed_instance(int(faker_seed))
+
+
+def chunk_user_ids(chunk_index, chunk_size, number_users):
+    """
+    Returns the (1-based) user IDs that belong to a chunk.
+    """
+    start = chunk_index * chunk_size + 1
+    return np.arange(start, min(start + chunk_size, number_users + 1))
+
 
 '''
 =====================================
@@ -21,32 +103,64 @@ CREATING BOOK.CSV
     series_name VARCHAR(255)
 =====================================
 '''
-PERCENT_SERIES = 0.2
-PERCENT_REVIEW = 0.6
-
-books_df = pd.read_csv("uncleaned_books.csv")
-
-imported_columns = ['isbn', 'author', 'title', 'publisher', 'year_published', 'language_code', 'num_pages']
-books_df = books_df[imported_columns]
-books_df = books_df[books_df['isbn'].astype(str).str.len() == 13]
-books_df = books_df.dropna()
-books_df = books_df.reset_index(drop=True)
-
-# books_df['year_published'] = pd.to_datetime(books_df['year_published'], errors='coerce').dt.year
-books_df['synopsis'] = [fake.paragraph(nb_sentences=5, variable_nb_sentences=True) for _ in range(len(books_df))]
-books_df['cover_photo'] = [fake.url() for _ in range(len(books_df))]
-
-
-series_books_mapping = {}
-for _ in range(int(len(books_df) * PERCENT_SERIES)):
-    series_name = fake.sentence(nb_words=3)[:-1].title()
-    num_books_in_series = random.randint(2, 10)
-    book_indices = np.random.choice(books_df.index, num_books_in_series, replace=False)
-    series_books_mapping[series_name] = book_indices
-
-books_df['series_name'] = None
-for series_name, book_indices in series_books_mapping.items():
-    books_df.loc[book_indices, 'series_name'] = series_name
+BOOK_COLUMNS = ['isbn', 'title', 'publisher', 'year_published', 'language_code',
+                'num_pages', 'synopsis', 'cover_photo', 'series_name']
+
+
+def load_books(path="uncleaned_books.csv"):
+    """
+    Reads and cleans the Kaggle catalog and assigns books to series. The
+    catalog is the only table held in memory, since reviews and shelves
+    sample from it.
+    """
+    books_df = pd.read_csv(path)
+
+    imported_columns = ['isbn', 'author', 'title', 'publisher', 'year_published', 'language_code', 'num_pages']
+    books_df = books_df[imported_columns]
+    books_df = books_df[books_df['isbn'].astype(str).str.len() == 13]
+    books_df = books_df.dropna()
+    books_df = books_df.reset_index(drop=True)
+
+    series_books_mapping = {}
+    for _ in range(int(len(books_df) * PERCENT_SERIES)):
+        series_name = fake.sentence(nb_words=3)[:-1].title()
+        num_books_in_series = random.randint(2, 10)
+        book_indices = rng.choice(books_df.index, num_books_in_series, replace=False)
+        series_books_mapping[series_name] = book_indices
+
+    books_df['series_name'] = None
+    for series_name, book_indices in series_books_mapping.items():
+        books_df.loc[book_indices, 'series_name'] = series_name
+    return books_df
+
+
+def book_chunk(chunk_index, chunk_size, books_df, author_ids):
+    """
+    Generates book.csv, book_author.csv and book_genre.csv rows for one
+    chunk of the catalog.
+    """
+    chunk_df = books_df.iloc[chunk_index * chunk_size:(chunk_index + 1) * chunk_size].copy()
+    chunk_df['synopsis'] = [fake.paragraph(nb_sentences=5, variable_nb_sentences=True) for _ in range(len(chunk_df))]
+    chunk_df['cover_photo'] = [fake.url() for _ in range(len(chunk_df))]
+
+    # one row per (book, author) pair, with IDs looked up by name
+    book_authors_df = chunk_df[['isbn']].assign(author=split_authors(chunk_df)).explode('author')
+    book_authors_df['author_id'] = book_authors_df['author'].map(author_ids)
+    book_authors_df = book_authors_df[['isbn', 'author_id']].drop_duplicates()  # drop duplicate book authors
+
+    book_genres_data = []
+    for isbn in chunk_df['isbn']:
+        num_genres = random.randint(1, 5)
+        selected_genres = random.sample(genres, num_genres)
+        for genre in selected_genres:
+            book_genres_data.append((isbn, genre))
+    book_genres_df = pd.DataFrame(book_genres_data, columns=['isbn', 'genre_name'])
+
+    return {
+        'book.csv': chunk_df[BOOK_COLUMNS],
+        'book_author.csv': book_authors_df,
+        'book_genre.csv': book_genres_df,
+    }
 
 
 '''
@@ -60,25 +174,32 @@ CREATING AUTHOR.CSV;
     author_name VARCHAR(255)
 =====================================
 '''
-author_list = []
-for index, row in books_df.iterrows():
-    authors = row['author'].split('/')
-    for author in authors:
-        author_list.append(author.strip())
+def split_authors(books_df):
+    """
+    Splits each book's /-separated author string into a list of names.
+    """
+    return books_df['author'].str.split('/').map(lambda authors: [author.strip() for author in authors])
+
+
+def load_authors(books_df):
+    """
+    Collects the distinct authors of the catalog in order of first
+    appearance; an author's ID is its row number in author.csv.
 
-authors_df_init = pd.DataFrame(author_list, columns=['author_name']).drop_duplicates()
-authors_df = authors_df_init.reset_index(drop=True)
+    Returns:
+        (DataFrame, dict): the authors, and a map from author name to ID
+    """
+    _, author_names = pd.factorize(split_authors(books_df).explode())
+    authors_df = pd.DataFrame({'author_name': author_names})
+    author_ids = dict(zip(author_names, range(1, len(author_names) + 1)))
+    return authors_df, author_ids
 
-book_authors_df = pd.DataFrame(columns=['isbn', 'author_id'])
-for i in range(len(books_df)):
-    authors = books_df.at[i, 'author'].split('/')
-    isbn = books_df.at[i, 'isbn']
-    for author in authors:
-        new_row = pd.DataFrame({'isbn': [isbn], 'author_id': authors_df.index[authors_df['author_name'] == author][0] + 1})
-        book_authors_df = pd.concat([book_authors_df, new_row], ignore_index=True)
 
-book_authors_df.drop_duplicates(inplace=True)  # drop duplicate book authors
-books_df.drop(columns=['author'], inplace=True)
+def author_chunk(chunk_index, chunk_size, authors_df):
+    """
+    Returns one chunk of author.csv rows.
+    """
+    return {'author.csv': authors_df.iloc[chunk_index * chunk_size:(chunk_index + 1) * chunk_size]}
 
 
 '''
@@ -93,11 +214,9 @@ CREATING USER_INFO.CSV
     join_date TIMESTAMP
 =====================================
 '''
-NUMBER_USERS = 500
-
 def make_salt(length):
     safe_characters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789!@#$%^&*()-_+=[]{}|;:.<>?'
-    salt = ''.join(secrets.choice(safe_characters) for _ in range(length))
+    salt = ''.join(random.choice(safe_characters) for _ in range(length))
     return salt
 
 def generate_password_hash(password, salt):
@@ -105,7 +224,12 @@ def generate_password_hash(password, salt):
     hashed_password = hashlib.sha256(concatenated.encode()).hexdigest()
     return hashed_password
 
-def generate_email(first, last, domain):
+def generate_email(first, last, domain, user_id):
+    """
+    Generates a random email address. The user ID is added as a
+    "+" sub-address, so emails are unique without remembering the ones
+    already generated.
+    """
     first = first.lower()
     last = last.lower()
     number = str(random.randint(0, 999))[0:random.randint(0, 3)]
@@ -125,23 +249,27 @@ def generate_email(first, last, domain):
     }
     email_format = email_formats[random.randint(1, 12)]
 
-    return f"{email_format}@{domain}"
+    return f"{email_format}+{user_id}@{domain}"
+
 
-users_data = []
-for _ in range(NUMBER_USERS):
-    first_name = fake.first_name()
-    last_name = fake.last_name()
-    domain = random.choice(["gmail.com", "yahoo.com", "hotmail.com", "outlook.com", "aol.com"])
-    email = generate_email(first_name, last_name, domain)
-    while users_data and len(users_data) > 2 and email in users_data[2]:
-        email = generate_email(first_name, last_name, domain)
-    salt = make_salt(8)
-    password = fake.password()
-    password_hash = generate_password_hash(password, salt)
-    join_date = fake.date_time_this_decade()
-    users_data.append((first_name, last_name, email, salt, password_hash, join_date))
+def user_chunk(chunk_index, chunk_size, number_users):
+    """
+    Generates user_info.csv rows for one chunk of users.
+    """
+    users_data = []
+    for user_id in chunk_user_ids(chunk_index, chunk_size, number_users):
+        first_name = fake.first_name()
+        last_name = fake.last_name()
+        domain = random.choice(["gmail.com", "yahoo.com", "hotmail.com", "outlook.com", "aol.com"])
+        email = generate_email(first_name, last_name, domain, user_id)
+        salt = make_salt(8)
+        password = fake.password()
+        password_hash = generate_password_hash(password, salt)
+        users_data.append((first_name, last_name, email, salt, password_hash))
 
-users_df = pd.DataFrame(users_data, columns=['first_name', 'last_name', 'email', 'salt', 'password_hash', 'join_date'])
+    users_df = pd.DataFrame(users_data, columns=['first_name', 'last_name', 'email', 'salt', 'password_hash'])
+    users_df['join_date'] = random_timestamps(len(users_df))
+    return {'user_info.csv': users_df}
 
 
 '''
@@ -151,18 +279,31 @@ CREATING FRIEND.CSV
     friend_id INT
 =====================================
 '''
-MAX_FRIENDS = 50
-
-friend_tuples = set()
-for i in range(1, NUMBER_USERS + 1):
-    num_friends = random.randint(0, MAX_FRIENDS)
-    friends = random.sample(range(1, NUMBER_USERS + 1), num_friends)
-    for friend in friends:
-        if friend != i:
-            friend_tuples.add((i, friend))
-            friend_tuples.add((friend, i))
-
-friends_df = pd.DataFrame(friend_tuples, columns=['user_id', 'friend_id'])
+def friend_chunk(chunk_index, chunk_size, number_users):
+    """
+    Generates friend.csv rows for one chunk of users.
+
+    Users are arranged in a circle and each user befriends users at most
+    half-way around it (clockwise), so every friendship is generated by
+    exactly one of its two users and chunks never produce duplicates.
+    """
+    user_ids = chunk_user_ids(chunk_index, chunk_size, number_users)
+    max_offset = (number_users - 1) // 2
+    if max_offset < 1:
+        return {'friend.csv': pd.DataFrame(columns=['user_id', 'friend_id'])}
+
+    num_friends = rng.integers(0, min(MAX_FRIENDS, max_offset), size=len(user_ids), endpoint=True)
+    friend_user_ids = np.repeat(user_ids, num_friends)
+    offsets = rng.integers(1, max_offset, size=len(friend_user_ids), endpoint=True)
+    pairs_df = pd.DataFrame({
+        'user_id': friend_user_ids,
+        'friend_id': (friend_user_ids - 1 + offsets) % number_users + 1,
+    }).drop_duplicates()
+
+    # store both directions of each friendship
+    reverse_df = pairs_df.rename(columns={'user_id': 'friend_id', 'friend_id': 'user_id'})
+    friends_df = pd.concat([pairs_df, reverse_df[['user_id', 'friend_id']]], ignore_index=True)
+    return {'friend.csv': friends_df}
 
 
 '''
@@ -176,23 +317,30 @@ CREATING REVIEW.CSV
     review_date TIMESTAMP
 =====================================
 '''
-reviews_df = pd.DataFrame(columns=['user_id', 'isbn', 'star_rating', 'review_text', 'review_date'])
-for user_id in range(1, 1 + len(users_df)):
-    num_reviews = random.randint(0, 10)
-    for _ in range(num_reviews):
-        isbn = random.choice(books_df['isbn'])
-        star_rating = round(random.uniform(0.5, 5.0), 1)
-        p_review = random.random()
-        if p_review < PERCENT_REVIEW:
-            review_text = None
-        else:
-            review_text = fake.paragraph(nb_sentences=6, variable_nb_sentences=True)
-        review_date = fake.date_time_this_decade()
-        new_row = pd.DataFrame({'user_id': [user_id], 'isbn': [isbn],
-                                'star_rating': [star_rating],
-                                'review_text': [review_text],
-                                'review_date': [review_date]})
-        reviews_df = pd.concat([reviews_df, new_row], ignore_index=True)
+def review_chunk(chunk_index, chunk_size, number_users, book_isbns):
+    """
+    Generates review.csv rows for one chunk of users.
+    """
+    user_ids = chunk_user_ids(chunk_index, chunk_size, number_users)
+
+    # draw every review at once: how many reviews each user writes, then one
+    # book, rating and date per review
+    num_reviews = rng.integers(0, 10, size=len(user_ids), endpoint=True)
+    review_user_ids = np.repeat(user_ids, num_reviews)
+    num_rows = len(review_user_ids)
+    reviews_df = pd.DataFrame({
+        'user_id': review_user_ids,
+        'isbn': book_isbns[rng.integers(0, len(book_isbns), size=num_rows)],
+        'star_rating': np.round(rng.uniform(0.5, 5.0, size=num_rows), 1),
+        'review_text': pd.Series([None] * num_rows, dtype=object),
+        'review_date': random_timestamps(num_rows),
+    })
+    has_text = rng.random(num_rows) >= PERCENT_REVIEW
+    reviews_df.loc[has_text, 'review_text'] = [
+        fake.paragraph(nb_sentences=6, variable_nb_sentences=True) for _ in range(has_text.sum())]
+    # a user can only review a book once
+    reviews_df = reviews_df.drop_duplicates(subset=['user_id', 'isbn'])
+    return {'review.csv': reviews_df}
 
 
 '''
@@ -202,77 +350,67 @@ CREATING SHELF.CSV
     user_id INT
     shelf_name VARCHAR(255)
     is_private BOOLEAN
-=====================================
-'''
-shelves_df = pd.DataFrame(columns=['user_id', 'shelf_name', 'is_private'])
-
-for user_id in range(1, 1 + len(users_df)):
-    default_shelves = ["Favorites", "Has Read", "Wants to Read", "Currently Reading"]
-    for shelf_name in default_shelves:
-        is_private = random.choice([0, 1])
-        new_row = pd.DataFrame({'user_id': [user_id], 'shelf_name': [shelf_name], 'is_private': [is_private]})
-        shelves_df = pd.concat([shelves_df, new_row], ignore_index=True)
 
-    num_shelves = random.randint(0, 5)
-    for _ in range(num_shelves):
-        shelf_name = fake.sentence(nb_words=5)[:-1].title()
-        is_private = random.choice([0, 1])
-        new_row = pd.DataFrame({'user_id': [user_id], 'shelf_name': [shelf_name], 'is_private': [is_private]})
-        shelves_df = pd.concat([shelves_df, new_row], ignore_index=True)
-
-
-'''
-=====================================
 CREATING ON_SHELF.CSV
     isbn VARCHAR(13)
     shelf_id INT
 =====================================
 '''
-MEAN_BOOKS = 10
-
-on_shelf_df = pd.DataFrame(columns=['isbn', 'shelf_id'])
-
-for shelf_id in range(1, 1 + len(shelves_df)):
-    num_books = max(0, min(int(np.random.normal(MEAN_BOOKS, 3)), len(books_df)))
-    for isbn in random.sample(list(books_df['isbn']), num_books):
-        new_row = pd.DataFrame({'isbn': [isbn], 'shelf_id': [shelf_id]})
-        on_shelf_df = pd.concat([on_shelf_df, new_row], ignore_index=True)
+def shelf_chunk(chunk_index, chunk_size, number_users, book_isbns):
+    """
+    Generates shelf.csv and on_shelf.csv rows for one chunk of users. The
+    on_shelf shelf IDs count from 1 within the chunk; the writer shifts them
+    by the number of shelves already written.
+    """
+    user_ids = chunk_user_ids(chunk_index, chunk_size, number_users)
+
+    # every user gets the default shelves followed by 0-5 custom ones;
+    # `position` is each row's index within its user's shelves
+    num_shelves = len(default_shelves) + rng.integers(0, MAX_CUSTOM_SHELVES, size=len(user_ids), endpoint=True)
+    shelf_user_ids = np.repeat(user_ids, num_shelves)
+    first_row = np.repeat(np.cumsum(num_shelves) - num_shelves, num_shelves)
+    position = np.arange(len(shelf_user_ids)) - first_row
+    is_default = position < len(default_shelves)
+
+    shelf_names = np.empty(len(shelf_user_ids), dtype=object)
+    shelf_names[is_default] = np.array(default_shelves, dtype=object)[position[is_default]]
+    shelf_names[~is_default] = [fake.sentence(nb_words=5)[:-1].title() for _ in range((~is_default).sum())]
+
+    shelves_df = pd.DataFrame({
+        'user_id': shelf_user_ids,
+        'shelf_name': shelf_names,
+        'is_private': rng.integers(0, 2, size=len(shelf_user_ids)),
+    })
+    # shelf names are unique per user
+    shelves_df = shelves_df.drop_duplicates(subset=['user_id', 'shelf_name'])
+
+    shelf_ids = np.arange(1, len(shelves_df) + 1)
+    num_books = np.clip(rng.normal(MEAN_BOOKS, 3, size=len(shelf_ids)).astype(int), 0, len(book_isbns))
+    on_shelf_shelf_ids = np.repeat(shelf_ids, num_books)
+    on_shelf_df = pd.DataFrame({
+        'isbn': book_isbns[rng.integers(0, len(book_isbns), size=len(on_shelf_shelf_ids))],
+        'shelf_id': on_shelf_shelf_ids,
+    })
+    # a book is only on a shelf once
+    on_shelf_df = on_shelf_df.drop_duplicates()
+    return {'shelf.csv': shelves_df, 'on_shelf.csv': on_shelf_df}
 
 
 '''
 =====================================
 CREATING GENRES.CSV
     genre name VARCHAR(50)
-=====================================
-'''
-genres = ["Fiction", "Non-Fiction", "Science Fiction", "Fantasy", "Mystery",
-          "Thriller", "Romance", "Western", "Dystopian", "Historical Fiction",
-          "Horror", "Memoir", "Biography", "Self-Help", "Cooking", "Art", "Travel",
-          "Religion", "Science", "History", "Math", "Poetry", "Philosophy",
-          "Business", "Economics", "Psychology", "Sociology", "Political Science",
-          "Education", "Technology", "Health", "Fitness", "Sports", "Nature",
-          "Animals", "Crafts", "Hobbies", "Music", "Film", "Theatre", "Television",
-          "Gaming", "Comics", "Graphic Novels", "Manga", "Children's", "Young Adult",
-          "Adult", "Elderly", "LGBTQ+", "Feminism"]
-genres_df = pd.DataFrame(genres, columns=['genre_name'])
 
-
-'''
-=====================================
 CREATING BOOK_GENRES.CSV
     isbn VARCHAR(13)
     shelf_id INT
 =====================================
 '''
-
-book_genres_data = []
-for isbn in books_df['isbn']:
-    num_genres = random.randint(1, 5)
-    selected_genres = random.sample(genres, num_genres)
-    for genre in selected_genres:
-        book_genres_data.append((isbn, genre))
-
-book_genres_df = pd.DataFrame(book_genres_data, columns=['isbn', 'genre_name'])
+def genre_chunk(chunk_index):
+    """
+    Returns genre.csv, which always fits in a single chunk.
+    """
+    return {'genre.csv': pd.DataFrame(genres, columns=['genre_name'])}
 
 
 '''
@@ -280,13 +418,235 @@ book_genres_df = pd.DataFrame(book_genres_data, columns=['isbn', 'genre_name'])
 SAVING TO CSV
 =====================================
 '''
-books_df.to_csv("gen_csvs/book.csv", index=False)
-authors_df.to_csv("gen_csvs/author.csv", index=False)
-book_authors_df.to_csv("gen_csvs/book_author.csv", index=False)
-users_df.to_csv("gen_csvs/user_info.csv", index=False)
-friends_df.to_csv("gen_csvs/friend.csv", index=False)
-reviews_df.to_csv("gen_csvs/review.csv", index=False)
-shelves_df.to_csv("gen_csvs/shelf.csv", index=False)
-on_shelf_df.to_csv("gen_csvs/on_shelf.csv", index=False)
-genres_df.to_csv("gen_csvs/genre.csv", index=False)
-book_genres_df.to_csv("gen_csvs/book_genre.csv", index=False)
\ No newline at end of file
+def load_context(number_users, chunk_size, seed):
+    """
+    Loads everything the stages share: the catalog, its authors and the
+    run settings. The catalog is seeded so every process builds the same one.
+    """
+    seed_generators(seed)
+    books_df = load_books()
+    authors_df, author_ids = load_authors(books_df)
+    return {
+        'books_df': books_df,
+        'authors_df': authors_df,
+        'author_ids': author_ids,
+        'number_users': number_users,
+        'chunk_size': chunk_size,
+    }
+
+
+def make_stages(context):
+    """
+    Describes every generation stage in the order they are written.
+
+    Each stage has a name, the CSV files it writes, the number of chunks it
+    is split into, a function generating the frames of one chunk (keyed by
+    file name), and the ID columns to renumber, mapped to the file whose row
+    numbers they refer to.
+    """
+    books_df = context['books_df']
+    authors_df = context['authors_df']
+    author_ids = context['author_ids']
+    number_users = context['number_users']
+    chunk_size = context['chunk_size']
+    book_isbns = books_df['isbn'].to_numpy()
+    num_user_chunks = -(-number_users // chunk_size)
+
+    return [
+        {'name': 'books', 'files': ['book.csv', 'book_author.csv', 'book_genre.csv'],
+         'num_chunks': -(-len(books_df) // chunk_size), 'renumber': {},
+         'make_chunk': lambda i: book_chunk(i, chunk_size, books_df, author_ids)},
+        {'name': 'authors', 'files': ['author.csv'],
+         'num_chunks': -(-len(authors_df) // chunk_size), 'renumber': {},
+         'make_chunk': lambda i: author_chunk(i, chunk_size, authors_df)},
+        {'name': 'genres', 'files': ['genre.csv'],
+         'num_chunks': 1, 'renumber': {},
+         'make_chunk': genre_chunk},
+        {'name': 'users', 'files': ['user_info.csv'],
+         'num_chunks': num_user_chunks, 'renumber': {},
+         'make_chunk': lambda i: user_chunk(i, chunk_size, number_users)},
+        {'name': 'friends', 'files': ['friend.csv'],
+         'num_chunks': num_user_chunks, 'renumber': {},
+         'make_chunk': lambda i: friend_chunk(i, chunk_size, number_users)},
+        {'name': 'reviews', 'files': ['review.csv'],
+         'num_chunks': num_user_chunks, 'renumber': {},
+         'make_chunk': lambda i: review_chunk(i, chunk_size, number_users, book_isbns)},
+        {'name': 'shelves', 'files': ['shelf.csv', 'on_shelf.csv'],
+         'num_chunks': num_user_chunks,
+         'renumber': {'on_shelf.csv': ('shelf_id', 'shelf.csv')},
+         'make_chunk': lambda i: shelf_chunk(i, chunk_size, number_users, book_isbns)},
+    ]
+
+
+# stages and seed of this process, set by init_generator
+_stages = None
+_seed = None
+
+
+def init_generator(context, seed, as_of):
+    """
+    Prepares a process (the main one or a pool worker) to generate chunks.
+    """
+    global _stages, _seed, timestamps_end
+    _stages = make_stages(context)
+    _seed = seed
+    timestamps_end = pd.Timestamp(as_of)
+
+
+def generate_chunk(task):
+    """
+    Generates one chunk, given as (stage index, chunk index), with
+    generators seeded from the run's seed and the chunk's position.
+    """
+    stage_index, chunk_index = task
+    seed_generators(_seed, stage_index, chunk_index)
+    return chunk_index, _stages[stage_index]['make_chunk'](chunk_index)
+
+
+def load_progress(output_dir, config, resume):
+    """
+    Loads the progress of a previous run, or starts a new one. A run can only
+    be resumed with the same settings it was started with; settings that
+    aren't given (None) are taken from the previous run.
+    """
+    path = os.path.join(output_dir, PROGRESS_FILE)
+    if resume and os.path.exists(path):
+        with open(path) as f:
+            progress = json.load(f)
+        if any(value is not None and progress['config'][key] != value
+               for key, value in config.items()):
+            raise SystemExit(f"Cannot resume: the previous run used {progress['config']}.")
+        return progress
+    return {'config': config, 'stages': {}, 'files': {}}
+
+
+def save_progress(output_dir, progress):
+    """
+    Atomically records which chunks have been written.
+    """
+    path = os.path.join(output_dir, PROGRESS_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(progress, f)
+    os.replace(path + '.tmp', path)
+
+
+def chunks(stage_index, start_chunk):
+    """
+    Yields (chunk index, frames) for the chunks of a stage, starting from
+    `start_chunk`, generated in this process.
+    """
+    for chunk_index in range(start_chunk, _stages[stage_index]['num_chunks']):
+        yield generate_chunk((stage_index, chunk_index))
+
+
+def parallel_chunks(pool, workers, stage_index, start_chunk):
+    """
+    Like `chunks`, but generates the chunks in a process pool. Chunks are
+    yielded in order, and only a couple per worker are in flight at once so
+    finished chunks don't pile up in memory.
+    """
+    tasks = ((stage_index, chunk_index)
+             for chunk_index in range(start_chunk, _stages[stage_index]['num_chunks']))
+    pending = deque(pool.apply_async(generate_chunk, (task,))
+                    for task in itertools.islice(tasks, 2 * workers))
+    while pending:
+        result = pending.popleft().get()
+        for task in itertools.islice(tasks, 1):
+            pending.append(pool.apply_async(generate_chunk, (task,)))
+        yield result
+
+
+def write_stage(stage, progress, output_dir, stage_chunks):
+    """
+    Appends the chunks of a stage to their CSVs, recording progress after
+    each one. Output left behind by an unfinished chunk is truncated first.
+    """
+    files = progress['files']
+    for chunk_index, frames in stage_chunks:
+        # row counts before this chunk, used to renumber IDs
+        rows_before = {filename: info['rows'] for filename, info in files.items()}
+        for filename, df in frames.items():
+            info = files.setdefault(filename, {'bytes': 0, 'rows': 0})
+            if filename in stage['renumber']:
+                column, target_file = stage['renumber'][filename]
+                df = df.assign(**{column: df[column] + rows_before.get(target_file, 0)})
+
+            path = os.path.join(output_dir, filename)
+            with open(path, 'a', newline='') as f:
+                df.to_csv(f, index=False, header=info['bytes'] == 0)
+            info['bytes'] = os.path.getsize(path)
+            info['rows'] += len(df)
+
+        progress['stages'][stage['name']] = chunk_index + 1
+        save_progress(output_dir, progress)
+        print(f"Wrote {stage['name']} chunk {chunk_index + 1}/{stage['num_chunks']}.")
+
+
+def truncate_outputs(output_dir, progress, filenames):
+    """
+    Cuts the given CSVs back to the size recorded after their last completed
+    chunk (or empties them for a fresh run).
+    """
+    for filename in filenames:
+        path = os.path.join(output_dir, filename)
+        with open(path, 'a'):
+            pass
+        os.truncate(path, progress['files'].get(filename, {}).get('bytes', 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the Goodreads CSVs in gen_csvs/.")
+    parser.add_argument('--users', type=int, help=f"number of users to generate (default {NUMBER_USERS})")
+    parser.add_argument('--chunk-size', type=int, help=f"books or users generated per chunk (default {CHUNK_SIZE})")
+    parser.add_argument('--workers', type=int, default=1, help="number of processes generating chunks")
+    parser.add_argument('--seed', type=int, help="seed for reproducible output (random by default)")
+    parser.add_argument('--as-of', help="latest generated timestamp, e.g. 2024-03-01 (defaults to now)")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help="directory the CSVs are written to")
+    parser.add_argument('--resume', action='store_true', help="continue a partially written run")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    config = {'users': args.users, 'chunk_size': args.chunk_size,
+              'seed': args.seed, 'as_of': args.as_of}
+    progress = load_progress(args.output_dir, config, args.resume)
+    # fill in the defaults for settings neither given nor resumed
+    config = progress['config']
+    if config['users'] is None:
+        config['users'] = NUMBER_USERS
+    if config['chunk_size'] is None:
+        config['chunk_size'] = CHUNK_SIZE
+    if config['seed'] is None:
+        config['seed'] = random.SystemRandom().getrandbits(64)
+    if config['as_of'] is None:
+        config['as_of'] = datetime.now().isoformat(sep=' ')
+    print(f"Generating with --seed {config['seed']} --as-of '{config['as_of']}'.")
+
+    context = load_context(config['users'], config['chunk_size'], config['seed'])
+    init_generator(context, config['seed'], config['as_of'])
+    pool = None
+    if args.workers > 1:
+        pool = multiprocessing.Pool(args.workers, initializer=init_generator,
+                                    initargs=(context, config['seed'], config['as_of']))
+
+    try:
+        for stage_index, stage in enumerate(_stages):
+            done_chunks = progress['stages'].get(stage['name'], 0)
+            if done_chunks >= stage['num_chunks']:
+                print(f"Skipping {stage['name']} (already written).")
+                continue
+            # a stage's files only ever see its own chunks, so any of their
+            # output beyond the recorded progress is from an unfinished chunk
+            truncate_outputs(args.output_dir, progress, stage['files'])
+            if pool is None:
+                stage_chunks = chunks(stage_index, done_chunks)
+            else:
+                stage_chunks = parallel_chunks(pool, args.workers, stage_index, done_chunks)
+            write_stage(stage, progress, args.output_dir, stage_chunks)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+if __name__ == '__main__':
+    main()
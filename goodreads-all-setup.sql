@@ -3,6 +3,7 @@
 # setup
 source setup.sql;
 source load-data.sql;
+source setup-indexes.sql;
 source setup-passwords.sql;
 source setup-routines.sql;
 source grant-permissions.sql;
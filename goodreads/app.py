@@ -12,14 +12,18 @@ As a user, you can:
 - Create shelves and add books to your shelves
 - Rate books
 - Add friends
+- Get book recommendations
 - View other users' profiles + shelves
+- See your friends' recent activity
 
 As an admin, you can:
 - Modify the book database (add, delete, search)
 - More functionality for admins would be added in the future
 """
 
+import os
 import sys
+from collections import namedtuple
 import mysql.connector
 import mysql.connector.errorcode as errorcode
 import friends
@@ -28,358 +32,312 @@ import books
 import login
 import reviews
 import users
+import bulk_import
+import recommend
+import feed
+import instrument
+import db
 
 current_user_id = None
 
 DEBUG = False
 
+# if set, queries are instrumented and the metrics are written to this file
+# on quit (see instrument.py)
+PROFILE_FILE = os.environ.get('GOODREADS_PROFILE')
+
 
 # ----------------------------------------------------------------------
 # SQL Utility Functions
 # ----------------------------------------------------------------------
 def get_conn():
     """"
-    Returns a connected MySQL connector instance, if connection is successful.
-    If unsuccessful, exits.
-
-    Parameters:
-        is_admin: bool (default False)
+    Returns a connected MySQL connector instance from the shared connection
+    pool, if connection is successful. If unsuccessful, exits.
     """
-    # signing in as admin for permissions; if we expand our grant-permissions
-    # then we can switch between user types here.
-    # user_type = 'appadmin' if is_admin else 'appclient'
-    # user_pwd = 'adminpw' if is_admin else 'clientpw'
     try:
-        # Logging in as admin for permissions
-        conn = mysql.connector.connect(
-          host='localhost',
-          user='appadmin',
-          port='3306',
-          password='adminpw',
-          database='goodreads'
-        )
+        conn = db.get_pool().get_conn()
         print('Successfully connected to the Goodreads database!')
         return conn
     except mysql.connector.Error as err:
-        if err.errno == errorcode.ER_ACCESS_DENIED_ERROR and DEBUG:
-            sys.stderr.write('Incorrect username or password when connecting to DB.')
-        elif err.errno == errorcode.ER_BAD_DB_ERROR and DEBUG:
-            sys.stderr.write('Database does not exist.')
-        elif DEBUG:
-            sys.stderr.write(err.msg)
-        else:
-            sys.stderr.write('An error occurred, please contact the administrator.')
-        sys.exit(1)
+        exit_with_conn_error(err)
 
 
-# ----------------------------------------------------------------------
-# Command-Line Functionality
-# ----------------------------------------------------------------------
-def show_options():
+def check_conn():
     """
-    Displays top-level options for users (main menu).
+    Health-checks the session's connection before running an action,
+    reconnecting if MySQL dropped it (e.g. while the user was idle).
+    If it can't reconnect, exits.
     """
-    print()
-    print('Where would you like to go? ')
-    print('  (1) Go to your profile')
-    print('  (2) Search for books')
-    print('  (q) Quit')
-    option = input('Enter an option: ').lower()
-    print()
-    if option == 'q':
-        quit_ui()
-    elif option == '1':
-        user_profile_menu()
-    elif option == '2':
-        user_books_menu()
-    else:
-        print('Invalid option. Please try again.')
-        show_options()
+    try:
+        db.ensure_connected(conn)
+    except mysql.connector.Error as err:
+        exit_with_conn_error(err)
 
 
-def show_admin_options():
+def exit_with_conn_error(err):
     """
-    Displays top-level options for admin users.
+    Reports a connection error and exits.
+
+    Args:
+        err (mysql.connector.Error): the error
     """
-    print()
-    print('What would you like to do? ')
-    print('  (1) Edit Books')
-    print('  (q) quit')
-    option = input('Enter an option: ').lower()
-    print()
-    if option == 'q':
-        quit_ui()
-    elif option == '1':
-        admin_books_menu()
+    if err.errno == errorcode.ER_ACCESS_DENIED_ERROR and DEBUG:
+        sys.stderr.write('Incorrect username or password when connecting to DB.')
+    elif err.errno == errorcode.ER_BAD_DB_ERROR and DEBUG:
+        sys.stderr.write('Database does not exist.')
+    elif DEBUG:
+        sys.stderr.write(err.msg)
+    else:
+        sys.stderr.write('An error occurred, please contact the administrator.')
+    sys.exit(1)
+
 
+# ----------------------------------------------------------------------
+# Command-Line Functionality
+# ----------------------------------------------------------------------
 def quit_ui():
     """
     Quits the program, printing a good bye message to the user.
     """
+    if PROFILE_FILE:
+        instrument.metrics.write_json(PROFILE_FILE)
     print('Goodbye!')
     exit()
 
 
 # ----------------------------------------------------------------------
-# Define Menus
+# Menu Commands
 # ----------------------------------------------------------------------
-def friends_menu():
+# Each command takes the arguments of the menu it was chosen from, and
+# returns the menu to go to next as a (menu name, arguments) state, QUIT to
+# quit, or None to show the same menu again.
+QUIT = 'quit'
+
+
+def log_in(as_admin):
     """
-    Displays the friends menu, allowing the user to add, remove, or view friends.
+    Logs the user in, then goes to the main menu (or the admin menu).
     """
-    print()
-    print("What would you like to do?")
-    print("  (1) Add a friend")
-    print("  (2) Remove a friend")
-    print("  (3) Search for friends by name")
-    print("  (4) Search for friends by email")
-    print("  (5) View current friends")
-    print("  (6) View a user's profile")
-    print("  (b) Go back")
-    print("  (q) Quit")
-    option = input("Enter an option: ").lower()
-    print()
-
-    if option == "1":
-        friends.add_friend_ui(conn, current_user_id)
-    elif option == "2":
-        friends.delete_friend_ui(conn, current_user_id)
-    elif option == "3":
-        friends.search_friends_by_name_ui(conn)
-    elif option == "4":
-        friends.search_friend_by_email_ui(conn)
-    elif option == "5":
-        friends.view_friends(conn, current_user_id)
-    elif option == "6":
-        friend_id = input("Enter the user ID of the friend to view: ")
-        user_profile_menu(friend_id)
-    elif option == "b":
-        user_profile_menu()
-    elif option == "q":
-        quit_ui()
-    else:
-        print("Invalid choice.")
+    user_id = login.login_loop(conn, as_admin)
+    if user_id is None:
+        return QUIT
+    global current_user_id
+    current_user_id = user_id
+    return ('admin', ()) if as_admin else ('main', ())
 
-    friends_menu()
 
+def open_book_page():
+    """
+    Prompts for a book and opens its page, if it exists.
+    """
+    isbn = input("Enter the ISBN of the book to open: ")
+    if books.get_book_summary(conn, isbn):
+        return ('book', (isbn,))
 
-def shelf_menu():
+
+def view_user_profile():
     """
-    Displays the shelf menu, allowing the user to create, delete, or modify shelves.
+    Prompts for a user and opens their profile.
     """
-    print()
-    print("What would you like to do?")
-    print("  (1) Create a new shelf")
-    print("  (2) Delete a shelf")
-    print("  (3) Add a book to a shelf")
-    print("  (4) Remove a book from a shelf")
-    print("  (5) Display all books on a shelf")
-    print("  (b) Go back")
-    print("  (q) Quit")
-    option = input("Enter an option: ").lower()
-    print()
-
-    if option == "1":
-        shelf.create_shelf_ui(conn, current_user_id)
-    elif option == "2":
-        shelf.delete_shelf_ui(conn, current_user_id)
-    elif option == "3":
-        shelf.add_book_to_shelf_ui(conn, current_user_id)
-    elif option == "4":
-        shelf.delete_book_from_shelf_ui(conn, current_user_id)
-    elif option == "5":
-        shelf.display_shelf_ui(conn)
-    elif option == "b":
-        user_profile_menu()
-    elif option == "q":
-        quit_ui()
+    user_id = input("Enter the user ID of the friend to view: ")
+    if user_id == str(current_user_id):
+        return ('profile', ())
+    return ('user', (user_id,))
 
-    shelf_menu()
+
+def view_user_shelves(user_id=None):
+    """
+    Lists a user's shelves (by default, the current user's) and offers to
+    open one.
+    """
+    shelf.view_shelves(conn, user_id or current_user_id)
+    open_shelf = input("Would you like to open a shelf? (y/n): ").lower()
+    if open_shelf == "y":
+        shelf.display_shelf_ui(conn)
 
 
-def user_profile_menu(user_id=None):
+def view_recommendations():
     """
-    Displays the user profile menu, allowing the user to view a profile.
-    If the user is the current user, they can also access their friends menu.
+    Lists recommended books and offers to open one.
+    """
+    if recommend.view_recommendations(conn, current_user_id):
+        open_book = input("Would you like to open a book? (y/n): ").lower()
+        if open_book == "y":
+            return open_book_page()
 
-    Args:
-        user_id (int, optional): the user ID to view, if not the current user
+
+def show_profile(user_id=None):
+    """
+    Prints a user's profile (by default, the current user's) above their
+    profile menu; goes to the friends menu if there is no such user.
     """
     print()  # for spacing
-    if user_id is None:
-        user_id = current_user_id
-
-    # print user info + check if user exists
-    if not users.print_user_info(conn, user_id):
-        friends_menu()  # if the user doesn't exist, return
-
-    print()
-    print("What would you like to do?")
-    print("  (1) View shelves")
-    if user_id == current_user_id:
-        print("  (2) Open your friends menu")
-        print("  (3) Open your shelf menu")
-    print("  (b) Go back")
-    print("  (q) Quit")
-    option = input("Enter an option: ").lower()
-    print()
-
-    if option == "1":
-        shelf.view_shelves(conn, user_id)
-        open_shelf = input("Would you like to open a shelf? (y/n): ").lower()
-        if open_shelf == "y":
-            shelf.display_shelf_ui(conn)
-    elif option == "2" and user_id == current_user_id:
-        friends_menu()
-    elif option == "3" and user_id == current_user_id:
-        shelf_menu()
-    elif option == "b":
-        if user_id != current_user_id:
-            friends_menu()
-        show_options()
-    elif option == "q":
-        quit_ui()
-    else:
-        print("Invalid choice.")
+    if not users.print_user_info(conn, user_id or current_user_id):
+        return ('friends', ())
 
-    user_profile_menu(user_id)
 
-
-def book_page_menu(isbn):
+def search_books_by_title():
     """
-    Displays the book page menu, allowing the user to take actions related to
-    a specific book (add to shelf, rate, read reviews, & get time estimate)
-
-    Args:
-        isbn (str): The ISBN of the book to view
+    Prompts for a title and lists the books that match it.
     """
-    print()
-    print("What would you like to do?")
-    print("  (1) Add to shelf")
-    print("  (2) Rate book")
-    print("  (3) Read reviews")
-    print("  (4) Get a reading time estimate")
-    print("  (b) Go back")
-    print("  (q) Quit")
-    option = input("Enter an option: ").lower()
-    print()
-
-    if option == "1":
-        shelf.add_book_to_shelf_ui(conn, current_user_id, isbn)
-    elif option == "2":
-        reviews.add_review_ui(conn, current_user_id, isbn)
-    elif option == "3":
-        reviews.get_reviews(conn, isbn)
-    elif option == "4":
-        books.get_book_reading_time(conn, isbn)
-    elif option == "b":
-        user_books_menu()
-    elif option == "q":
-        quit_ui()
-    else:
-        print("Invalid choice.")
+    title = input("Enter the title of the book to search for: ")
+    books.search_book_by_title(conn, title)
 
-    book_page_menu(isbn)
 
-
-def user_books_menu():
+def search_books_by_author():
     """
-    Displays the user books menu, allowing the user to search for books by
-    title or author, and open a book's page.
+    Prompts for an author and lists their books.
     """
-    print()
-    print("What would you like to do?")
-    print("  (1) Search for books by title")
-    print("  (2) Search for books by author")
-    print("  (3) Open a book's page")
-    print("  (b) Go back")
-    print("  (q) Quit")
-    option = input("Enter an option: ").lower()
-    print()
-
-    if option == "1":
-        title = input("Enter the title of the book to search for: ")
-        books.search_book_by_title(conn, title)
-    elif option == "2":
-        author = input("Enter the author of the book to search for: ")
-        books.search_book_by_author(conn, author)
-    elif option == "3":
-        isbn = input("Enter the ISBN of the book to open: ")
-        if books.get_book_summary(conn, isbn):
-            book_page_menu(isbn)
-    elif option == "b":
-        show_options()
-    elif option == "q":
-        quit_ui()
-    else:
-        print("Invalid choice.")
+    author = input("Enter the author of the book to search for: ")
+    books.search_book_by_author(conn, author)
 
-    user_books_menu()
 
-def admin_books_menu():
+def delete_book():
     """
-    Displays the admin books menu, allowing the admin to search for books by
-    title or author, add a book, or delete a book.
+    Prompts an admin for a book to delete.
     """
-    print()
-    print("What would you like to do?")
-    print("  (1) Search for books by title")
-    print("  (2) Search for books by author")
-    print("  (3) Add a book")
-    print("  (4) Delete a book")
-    print("  (b) Go back")
-    print("  (q) Quit")
-    option = input("Enter an option: ").lower()
-    print()
-
-    if option == "1":
-        title = input("Enter the title of the book to search for: ")
-        books.search_book_by_title(conn, title)
-    elif option == "2":
-        author = input("Enter the author of the book to search for: ")
-        books.search_book_by_author(conn, author)
-    elif option == "3":
-        books.add_new_book(conn)
-    elif option == "4":
-        isbn = input("Enter the ISBN of the book to delete: ")
-        books.delete_book(conn, isbn)
-    elif option == "b":
-        show_admin_options()
-    elif option == "q":
-        quit_ui()
-    else:
-        print("Invalid choice.")
+    isbn = input("Enter the ISBN of the book to delete: ")
+    books.delete_book(conn, isbn)
 
-    admin_books_menu()
 
-def login_menu(as_admin=False):
+# ----------------------------------------------------------------------
+# Define Menus
+# ----------------------------------------------------------------------
+# header: prints anything shown above the options, given the menu's
+#         arguments; it can return a state to go elsewhere instead
+# prompt: the question above the options
+# commands: (option, label, command) for each option
+# invalid: what to say when the option isn't one of them; None to just show
+#          the menu again
+Menu = namedtuple('Menu', ['header', 'prompt', 'commands', 'invalid'],
+                  defaults=["Invalid choice."])
+
+MENUS = {
+    # main menu for users
+    'main': Menu(None, 'Where would you like to go? ', [
+        ('1', 'Go to your profile', lambda: ('profile', ())),
+        ('2', 'Search for books', lambda: ('books', ())),
+        ('q', 'Quit', lambda: QUIT),
+    ], 'Invalid option. Please try again.'),
+    # main menu for admins
+    'admin': Menu(None, 'What would you like to do? ', [
+        ('1', 'Edit Books', lambda: ('admin_books', ())),
+        ('q', 'quit', lambda: QUIT),
+    ], None),
+    'login': Menu(None, 'Would you to log in or create an account?', [
+        ('1', 'Log in', log_in),
+        ('2', 'Create an account', lambda as_admin: login.create_user(conn, as_admin)),
+    ], 'Invalid option. Please try again.'),
+    # the current user's profile
+    'profile': Menu(show_profile, "What would you like to do?", [
+        ('1', "View shelves", view_user_shelves),
+        ('2', "Open your friends menu", lambda: ('friends', ())),
+        ('3', "Open your shelf menu", lambda: ('shelves', ())),
+        ('4', "Get book recommendations", view_recommendations),
+        ('5', "View your friends' recent activity", lambda: feed.view_feed(conn, current_user_id)),
+        ('b', "Go back", lambda: ('main', ())),
+        ('q', "Quit", lambda: QUIT),
+    ]),
+    # another user's profile
+    'user': Menu(show_profile, "What would you like to do?", [
+        ('1', "View shelves", view_user_shelves),
+        ('b', "Go back", lambda user_id: ('friends', ())),
+        ('q', "Quit", lambda user_id: QUIT),
+    ]),
+    'friends': Menu(None, "What would you like to do?", [
+        ('1', "Add a friend", lambda: friends.add_friend_ui(conn, current_user_id)),
+        ('2', "Remove a friend", lambda: friends.delete_friend_ui(conn, current_user_id)),
+        ('3', "Search for friends by name", lambda: friends.search_friends_by_name_ui(conn)),
+        ('4', "Search for friends by email", lambda: friends.search_friend_by_email_ui(conn)),
+        ('5', "View current friends", lambda: friends.view_friends(conn, current_user_id)),
+        ('6', "View a user's profile", view_user_profile),
+        ('7', "People you may know", lambda: friends.view_suggestions(conn, current_user_id)),
+        ('8', "Add several friends at once", lambda: friends.add_friends_ui(conn, current_user_id)),
+        ('b', "Go back", lambda: ('profile', ())),
+        ('q', "Quit", lambda: QUIT),
+    ]),
+    'shelves': Menu(None, "What would you like to do?", [
+        ('1', "Create a new shelf", lambda: shelf.create_shelf_ui(conn, current_user_id)),
+        ('2', "Delete a shelf", lambda: shelf.delete_shelf_ui(conn, current_user_id)),
+        ('3', "Add a book to a shelf", lambda: shelf.add_book_to_shelf_ui(conn, current_user_id)),
+        ('4', "Remove a book from a shelf", lambda: shelf.delete_book_from_shelf_ui(conn, current_user_id)),
+        ('5', "Display all books on a shelf", lambda: shelf.display_shelf_ui(conn)),
+        ('6', "Get a reading time estimate for a shelf", lambda: shelf.shelf_reading_time_ui(conn)),
+        ('7', "Add several books to a shelf", lambda: shelf.add_books_to_shelf_ui(conn, current_user_id)),
+        ('b', "Go back", lambda: ('profile', ())),
+        ('q', "Quit", lambda: QUIT),
+    ], None),
+    # a book's page (add to shelf, rate, read reviews, & get time estimate)
+    'book': Menu(None, "What would you like to do?", [
+        ('1', "Add to shelf", lambda isbn: shelf.add_book_to_shelf_ui(conn, current_user_id, isbn)),
+        ('2', "Rate book", lambda isbn: reviews.add_review_ui(conn, current_user_id, isbn)),
+        ('3', "Read reviews", lambda isbn: reviews.get_reviews(conn, isbn)),
+        ('4', "Get a reading time estimate", lambda isbn: books.get_book_reading_time(conn, isbn)),
+        ('b', "Go back", lambda isbn: ('books', ())),
+        ('q', "Quit", lambda isbn: QUIT),
+    ]),
+    'books': Menu(None, "What would you like to do?", [
+        ('1', "Search for books by title", search_books_by_title),
+        ('2', "Search for books by author", search_books_by_author),
+        ('3', "Open a book's page", open_book_page),
+        ('b', "Go back", lambda: ('main', ())),
+        ('q', "Quit", lambda: QUIT),
+    ]),
+    'admin_books': Menu(None, "What would you like to do?", [
+        ('1', "Search for books by title", search_books_by_title),
+        ('2', "Search for books by author", search_books_by_author),
+        ('3', "Add a book", lambda: books.add_new_book(conn)),
+        ('4', "Delete a book", delete_book),
+        ('5', "Import books from a file", lambda: bulk_import.import_books_ui(conn)),
+        ('b', "Go back", lambda: ('admin', ())),
+        ('q', "Quit", lambda: QUIT),
+    ]),
+}
+
+
+def run_menus(state):
     """
-    Login menu which prompts the user to log in or create an account.
+    Runs the menus, starting from the given state, until the user quits (or
+    input runs out, e.g. at the end of a script piped into the app).
+
+    The menus are a state machine: each choice runs a command from the
+    current menu's table, which returns the next state. Moving between
+    menus happens in this loop rather than by menus calling each other, so
+    a session can go on indefinitely without growing the stack.
 
     Args:
-        as_admin (bool, optional): Whether the user is trying to log in as
-                                   an admin. Defaults to False.
+        state (tuple): (menu name, arguments) of the first menu
     """
-    print()
-    print('Would you to log in or create an account?')
-    print('  (1) Log in')
-    print('  (2) Create an account')
-    option = input('Enter an option: ').lower()
-    print()
-
-    if option == '1':
-        user_id = login.login_loop(conn, as_admin)
-        if user_id is None:
-            quit_ui()
-        global current_user_id
-        current_user_id = user_id
-        return
-    elif option == '2':
-        login.create_user(conn, as_admin)
-    else:
-        print('Invalid option. Please try again.')
+    while state != QUIT:
+        name, args = state
+        menu = MENUS[name]
+        if menu.header:
+            redirect = menu.header(*args)
+            if redirect is not None:
+                state = redirect
+                continue
+
+        print()
+        print(menu.prompt)
+        for option, label, command in menu.commands:
+            print(f"  ({option}) {label}")
+        try:
+            option = input("Enter an option: ").lower()
+        except EOFError:
+            break
+        print()
+        check_conn()
+        instrument.set_action(f"{name} {option}")
+
+        commands = {option: command for option, label, command in menu.commands}
+        if option in commands:
+            next_state = commands[option](*args)
+            if next_state is not None:
+                state = next_state
+        elif menu.invalid:
+            print(menu.invalid)
 
-    login_menu(as_admin)
 
 # ----------------------------------------------------------------------
 # Main Program
@@ -391,13 +349,12 @@ if __name__ == '__main__':
     print('  (2) User')
     ans = input('Enter an option: ').lower()
 
+    if PROFILE_FILE:
+        instrument.enable()
     conn = get_conn()
-    if ans == '1':
-        login_menu(as_admin=True)
-        if current_user_id is not None:
-            show_admin_options()
-    elif ans == '2':
-        login_menu()
-        if current_user_id is not None:
-            show_options()
-
+    if ans in ('1', '2'):
+        try:
+            run_menus(('login', (ans == '1',)))
+        except EOFError:
+            pass
+        quit_ui()
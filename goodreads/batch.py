@@ -0,0 +1,364 @@
+"""
+Non-interactive batch mode for the Goodreads database.
+
+Reads commands, one per line, from a file or stdin and runs them on a
+single connection, printing one JSON result per command to stdout. Each
+line is either a JSON object with an "op" key and the command's arguments,
+e.g.
+
+    {"op": "rate", "user_id": 12, "isbn": "9780439064866", "star_rating": 4.5}
+
+or the op followed by its arguments, positionally and then as key=value
+(quote arguments with spaces; unless key=value arguments are given, the
+last argument also takes the rest of the line):
+
+    search_title harry potter
+    search_author "J.K. Rowling"
+    add_to_shelf 12 40 9780439064866
+    rate 12 9780439064866 4.5 Loved it.
+    add_friend 12 57
+    add_book 9780000000001 "A New Book" author="Someone/Someone Else" genre=Fantasy
+
+Blank lines and lines starting with # are skipped.
+
+Writes are grouped: BATCH_SIZE commands run in one transaction, committed
+together, instead of one commit per change as in app.py. Each command runs
+inside a savepoint, so a failing command (e.g. a book already on the shelf)
+is rolled back on its own and reported, without undoing the rest of its
+batch. A command's result is printed once its batch is committed, so
+"ok": true means the change is saved. Caches (feeds, the friend graph, book
+details) are updated after each commit.
+
+Usage:
+    python3 goodreads/batch.py [FILE] [--batch-size N] [--dry-run]
+"""
+
+import argparse
+import json
+import shlex
+import sys
+import time
+import mysql.connector
+import books
+import db
+import feed
+import friend_graph
+from bulk_import import parse_book
+
+# commands per transaction
+BATCH_SIZE = 500
+# results per search
+SEARCH_LIMIT = 10
+# range of star ratings, as in the loaded data (half a star up to five)
+MIN_RATING = 0.5
+MAX_RATING = 5.0
+
+# each command's arguments, in positional order; optional ones end in '?'
+COMMANDS = {
+    'search_title': ['text'],
+    'search_author': ['text'],
+    'add_to_shelf': ['user_id', 'shelf_id', 'isbn'],
+    'rate': ['user_id', 'isbn', 'star_rating', 'review_text?'],
+    'add_friend': ['user_id', 'friend_id'],
+    'add_book': ['isbn', 'title', 'author?', 'genre?', 'publisher?', 'year_published?',
+                 'language_code?', 'num_pages?', 'synopsis?', 'cover_photo_url?',
+                 'series_name?'],
+}
+
+
+# ----------------------------------------------------------------------
+# Reading Commands
+# ----------------------------------------------------------------------
+def parse_command(line):
+    """
+    Parses one line of input into an op and its arguments.
+
+    Returns:
+        (str, dict): the op and its arguments by name
+
+    Raises:
+        ValueError: if the line isn't a valid command
+    """
+    if line.startswith('{'):
+        args = json.loads(line)
+        if not isinstance(args, dict):
+            raise ValueError("expected a JSON object")
+        op = args.pop('op', None)
+    else:
+        words = shlex.split(line)
+        op, words = words[0], words[1:]
+        args = {}
+        positional = []
+        for word in words:
+            name, sep, value = word.partition('=')
+            if sep and name in (param.rstrip('?') for param in COMMANDS.get(op, ())):
+                args[name] = value
+            elif args:
+                # a word after a key=value argument is most likely the rest
+                # of an unquoted value with spaces, so don't guess where it goes
+                raise ValueError(f"unexpected argument {word!r} after key=value arguments "
+                                 f"(quote arguments with spaces)")
+            else:
+                positional.append(word)
+        params = [param.rstrip('?') for param in COMMANDS.get(op, ())
+                  if param.rstrip('?') not in args]
+        if len(positional) > len(params):
+            if args or not params:
+                raise ValueError(f"too many arguments for {op} "
+                                 f"(quote arguments with spaces): {' '.join(positional[len(params):])}")
+            # the last argument takes the rest of the line
+            positional[len(params) - 1:] = [' '.join(positional[len(params) - 1:])]
+        args.update(zip(params, positional))
+
+    if op not in COMMANDS:
+        raise ValueError(f"unknown op {op!r}")
+    params = COMMANDS[op]
+    unknown = set(args) - {param.rstrip('?') for param in params}
+    if unknown:
+        raise ValueError(f"unknown arguments for {op}: {', '.join(sorted(unknown))}")
+    missing = [param for param in params if not param.endswith('?') and args.get(param) is None]
+    if missing:
+        raise ValueError(f"missing arguments for {op}: {', '.join(missing)}")
+    return op, args
+
+
+def read_commands(f):
+    """
+    Yields (line number, op, args, error) for each command in a file; op
+    and args are None for lines that couldn't be parsed.
+    """
+    for line_num, line in enumerate(f, start=1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            op, args = parse_command(line)
+        except ValueError as err:
+            yield line_num, None, None, str(err)
+            continue
+        yield line_num, op, args, None
+
+
+def to_int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number") from None
+
+
+def to_rating(value):
+    try:
+        star_rating = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("star_rating must be a number") from None
+    if not MIN_RATING <= star_rating <= MAX_RATING:
+        raise ValueError(f"star_rating must be between {MIN_RATING} and {MAX_RATING}")
+    return round(star_rating, 1)
+
+
+# ----------------------------------------------------------------------
+# Commands
+# ----------------------------------------------------------------------
+# Each command runs its statements on the batch's connection without
+# committing, and returns (result dict, cache updates to apply after the
+# commit). Invalid arguments raise ValueError, failed statements
+# mysql.connector.Error.
+def search_title(conn, text):
+    page = books.find_books_by_title(conn, str(text), page_size=SEARCH_LIMIT)
+    return {'books': [listing._asdict() for listing in page.items]}, []
+
+
+def search_author(conn, text):
+    page = books.find_books_by_author(conn, str(text), page_size=SEARCH_LIMIT)
+    return {'books': [listing._asdict() for listing in page.items]}, []
+
+
+def add_to_shelf(conn, user_id, shelf_id, isbn):
+    user_id = to_int(user_id, 'user_id')
+    shelf_id = to_int(shelf_id, 'shelf_id')
+    cursor = conn.cursor()
+    # only insert if the shelf belongs to the user
+    sql = """
+        INSERT INTO on_shelf (isbn, shelf_id)
+        SELECT %s, shelf_id FROM shelf WHERE shelf_id = %s AND user_id = %s
+    """
+    cursor.execute(sql, (str(isbn), shelf_id, user_id))
+    if cursor.rowcount == 0:
+        raise ValueError(f"shelf #{shelf_id} doesn't belong to user #{user_id}")
+    return {}, [(feed.activity_changed, (user_id,))]
+
+
+def rate(conn, user_id, isbn, star_rating, review_text=None):
+    user_id = to_int(user_id, 'user_id')
+    star_rating = to_rating(star_rating)
+    cursor = conn.cursor()
+    # rating a book again replaces the earlier review
+    sql = """
+        INSERT INTO review (user_id, isbn, star_rating, review_text)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE star_rating = VALUES(star_rating),
+                                review_text = VALUES(review_text)
+    """
+    cursor.execute(sql, (user_id, str(isbn), star_rating, review_text))
+    return {}, [(feed.activity_changed, (user_id,))]
+
+
+def add_friend(conn, user_id, friend_id):
+    user_id = to_int(user_id, 'user_id')
+    friend_id = to_int(friend_id, 'friend_id')
+    cursor = conn.cursor()
+    sql = "INSERT INTO friend (user_id, friend_id) VALUES (%s, %s), (%s, %s)"
+    cursor.execute(sql, (user_id, friend_id, friend_id, user_id))
+    return {}, [(friend_graph.friendship_added, (user_id, friend_id))]
+
+
+def add_book(conn, **fields):
+    row, authors, genres = parse_book(fields)
+    (isbn, title, publisher, year_published, synopsis, language_code,
+     num_pages, cover_photo_url, series_name) = row
+    cursor = conn.cursor()
+    sql = "CALL add_book(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
+    cursor.execute(sql, (isbn, title, publisher, year_published, language_code,
+                         num_pages, synopsis, cover_photo_url, series_name,
+                         "/".join(authors), "/".join(genres)))
+    return {}, [(books.book_cache.invalidate, (isbn,))]
+
+
+HANDLERS = {
+    'search_title': search_title,
+    'search_author': search_author,
+    'add_to_shelf': add_to_shelf,
+    'rate': rate,
+    'add_friend': add_friend,
+    'add_book': add_book,
+}
+
+
+# ----------------------------------------------------------------------
+# Running Batches
+# ----------------------------------------------------------------------
+def run_batch(conn, commands, dry_run=False):
+    """
+    Runs commands in one transaction, each in its own savepoint, then
+    commits them (or rolls them all back, for a dry run).
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        commands (list): (line number, op, args, error) tuples from
+                         read_commands()
+        dry_run (bool, optional): roll back instead of committing
+
+    Returns:
+        list: a result dict for each command
+    """
+    cursor = conn.cursor()
+    results = []
+    updates = []
+    try:
+        for line_num, op, args, error in commands:
+            result = {'line': line_num, 'op': op}
+            results.append(result)
+            if error is not None:
+                result.update(ok=False, error=error)
+                continue
+            cursor.execute("SAVEPOINT batch_command")
+            try:
+                output, command_updates = HANDLERS[op](conn, **args)
+            except (ValueError, mysql.connector.Error) as err:
+                cursor.execute("ROLLBACK TO SAVEPOINT batch_command")
+                result.update(ok=False, error=str(err))
+                continue
+            cursor.execute("RELEASE SAVEPOINT batch_command")
+            result.update(ok=True, **output)
+            updates.extend(command_updates)
+        if dry_run:
+            conn.rollback()
+            return results
+        conn.commit()
+    except mysql.connector.Error as err:
+        # the transaction itself failed (e.g. the connection was lost), so
+        # nothing in the batch was saved
+        try:
+            conn.rollback()
+        except mysql.connector.Error:
+            pass
+        return [{'line': line_num, 'op': op, 'ok': False,
+                 'error': f"batch not saved: {err}"}
+                for line_num, op, args, error in commands]
+
+    for update, update_args in updates:
+        update(*update_args)
+    return results
+
+
+def run_commands(conn, f, out, batch_size=BATCH_SIZE, dry_run=False):
+    """
+    Runs every command in a file in batches, writing each result to out as
+    a JSON line.
+
+    Returns:
+        (int, int): the number of commands run and of those that failed
+    """
+    num_commands = num_failed = 0
+    batch = []
+
+    def flush():
+        nonlocal num_commands, num_failed
+        db.ensure_connected(conn)
+        for result in run_batch(conn, batch, dry_run):
+            num_commands += 1
+            num_failed += not result['ok']
+            out.write(json.dumps(result, default=str) + '\n')
+        out.flush()
+        batch.clear()
+
+    for command in read_commands(f):
+        batch.append(command)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return num_commands, num_failed
+
+
+# ----------------------------------------------------------------------
+# Command-Line Functionality
+# ----------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a file of commands (one per line) against the Goodreads database, "
+                    "printing one JSON result per command.")
+    parser.add_argument('file', nargs='?', default='-',
+                        help="file of commands (default: stdin)")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f"commands per transaction (default: {BATCH_SIZE})")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="run every command but roll back instead of committing")
+    args = parser.parse_args()
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+
+    start = time.perf_counter()
+    try:
+        f = sys.stdin if args.file == '-' else open(args.file, encoding='utf-8')
+    except OSError as err:
+        print("Error reading command file:", err, file=sys.stderr)
+        sys.exit(1)
+    try:
+        with f, db.connection() as conn:
+            num_commands, num_failed = run_commands(conn, f, sys.stdout,
+                                                    args.batch_size, args.dry_run)
+    except mysql.connector.Error as err:
+        print("Error connecting to the database:", err, file=sys.stderr)
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+
+    rate = num_commands / elapsed * 60 if elapsed > 0 else 0
+    print(f"Ran {num_commands} commands ({num_failed} failed) in {elapsed:.2f}s "
+          f"({rate:.0f} commands/min){' (dry run, nothing saved)' if args.dry_run else ''}.",
+          file=sys.stderr)
+    sys.exit(0 if num_failed == 0 else 1)
+
+
+if __name__ == '__main__':
+    main()
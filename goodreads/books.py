@@ -2,7 +2,13 @@
 Book-related functions for the Goodreads database.
 """
 
+import math
+import re
+from decimal import Decimal, ROUND_HALF_UP
 import mysql.connector
+from cache import LRUCache
+from paging import PAGE_SIZE, fetch_page, make_token, page_through, split_token
+from records import Book, BookListing, BookStats, BookSummary
 
 # ----------------------------------------------------------------------
 # Helper Functions
@@ -14,6 +20,385 @@ def rating_to_stars(rating):
     return "★" * int(rating) + "☆" * (5 - int(rating))
 
 
+# reading time assumptions, as in the calculate_reading_time SQL function
+WORDS_PER_PAGE = 250
+DEFAULT_WPM = 200
+
+def calculate_reading_time(num_pages, wpm=None):
+    """
+    Estimates a book's reading time, exactly like the calculate_reading_time
+    SQL function (so no round trip is needed to compute it).
+
+    MySQL divides integers as decimals rounded (half up) to 4 places, and
+    CEIL rounds that up, so we do the same.
+
+    Args:
+        num_pages (int): the book's number of pages, or None
+        wpm (int, optional): reading speed in words per minute; defaults to 200
+
+    Returns:
+        int: the reading time in minutes, or None if num_pages is None or
+             wpm is 0 (where SQL gives NULL)
+    """
+    if wpm is None:
+        wpm = DEFAULT_WPM
+    if num_pages is None or wpm == 0:
+        return None
+    quotient = (Decimal(num_pages * WORDS_PER_PAGE) / Decimal(wpm)).quantize(
+        Decimal('0.0001'), rounding=ROUND_HALF_UP)
+    return math.ceil(quotient)
+
+
+# Book metadata (book row, authors and genres) rarely changes, so it's kept
+# in a cache by ISBN. Review statistics change with every review and aren't
+# cached.
+BOOK_CACHE_SIZE = 10000
+BOOK_CACHE_TTL = 600
+book_cache = LRUCache(BOOK_CACHE_SIZE, BOOK_CACHE_TTL)
+
+# Columns of a book's metadata, for queries on `book AS b`; authors and
+# genres are /-separated, like add_book takes them.
+BOOK_DETAILS_COLUMNS = """
+    b.isbn, b.title, b.publisher, b.year_published, b.synopsis,
+    b.language_code, b.num_pages, b.cover_photo_url, b.series_name,
+    (SELECT GROUP_CONCAT(author_name ORDER BY author_id SEPARATOR '/')
+     FROM book_author NATURAL JOIN author
+     WHERE isbn = b.isbn) AS authors,
+    (SELECT GROUP_CONCAT(genre_name ORDER BY genre_name SEPARATOR '/')
+     FROM book_genre
+     WHERE isbn = b.isbn) AS genres
+"""
+
+def split_details(row):
+    """
+    Converts the BOOK_DETAILS_COLUMNS at the start of a row to a
+    (Book, authors, genres) tuple, as kept in book_cache.
+    """
+    authors, genres = row[9], row[10]
+    return (Book(*row[:9]),
+            tuple(authors.split("/")) if authors else (),
+            tuple(genres.split("/")) if genres else ())
+
+
+# InnoDB doesn't index words shorter than this (innodb_ft_min_token_size),
+# nor its default stopwords; requiring either would match nothing
+MIN_SEARCH_WORD_LENGTH = 3
+STOPWORDS = {
+    'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en',
+    'for', 'from', 'how', 'i', 'in', 'is', 'it', 'la', 'of', 'on', 'or',
+    'that', 'the', 'this', 'to', 'was', 'what', 'when', 'where', 'who',
+    'will', 'with', 'und', 'www',
+}
+
+def fulltext_query(text):
+    """
+    Converts search text to a boolean-mode FULLTEXT query in which every
+    word must appear, matching words that start with it (so "harr pot"
+    finds "Harry Potter"). Words that aren't indexed are left out.
+
+    Returns:
+        str: the query, or None if no word is long enough to search for
+    """
+    words = [word for word in re.findall(r"\w+", text)
+             if len(word) >= MIN_SEARCH_WORD_LENGTH and word.lower() not in STOPWORDS]
+    if not words:
+        return None
+    return " ".join(f"+{word}*" for word in words)
+
+
+# ----------------------------------------------------------------------
+# Data Access Functions
+# ----------------------------------------------------------------------
+# These run queries and return records without printing anything; database
+# errors are raised to the caller.
+def book_listing(row):
+    """
+    Makes a BookListing from an (isbn, title, ...) row.
+    """
+    return BookListing(row[0], row[1])
+
+def ranked_key(row):
+    """
+    Continuation token of an (isbn, title, score) row of ranked results.
+    """
+    isbn, title, score = row
+    return make_token(score, isbn)
+
+def fetch_ranked_page(cursor, matches_sql, query, page_size, after):
+    """
+    Fetches a page of ranked search results, best matches first.
+
+    Args:
+        cursor (MySQL Cursor object): cursor to run the query on
+        matches_sql (str): query for the (isbn, title, score) of every match,
+                           taking the FULLTEXT query as its parameters
+        query (str): the FULLTEXT query
+        page_size (int): number of results per page
+        after (str): continuation token from the previous page, or None
+
+    Returns:
+        Page: BookListings of the matching books
+    """
+    # scores are rounded so they come back from the token unchanged
+    sql = f"SELECT isbn, title, ROUND(score, 6) AS score FROM ({matches_sql}) AS matches"
+    params = (query,) * matches_sql.count("%s")
+    if after is not None:
+        score, isbn = split_token(after, float, str)
+        sql += " WHERE ROUND(score, 6) < %s OR (ROUND(score, 6) = %s AND isbn > %s)"
+        params += (score, score, isbn)
+    sql += " ORDER BY score DESC, isbn"
+    return fetch_page(cursor, sql, params, page_size, book_listing, ranked_key)
+
+def find_books_by_title(conn, title, page_size=PAGE_SIZE, after=None):
+    """
+    Finds a page of books by title, best matches first.
+
+    Uses the title FULLTEXT index; if that finds nothing (e.g. the search
+    is only short words or stopwords, or part of a word) it falls back to
+    a substring match, listed by ISBN.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        title (str): the words (or beginnings of words) to search for
+        page_size (int, optional): number of results per page
+        after (str, optional): continuation token from the previous page
+
+    Returns:
+        Page: BookListings of the matching books
+    """
+    cursor = conn.cursor()
+    query = fulltext_query(title)
+    # substring-match tokens are bare ISBNs; ranked ones also have a score
+    ranked = query is not None and (after is None or ":" in after)
+    if ranked:
+        matches_sql = """
+            SELECT isbn, title, MATCH (title) AGAINST (%s IN BOOLEAN MODE) AS score
+            FROM book
+            WHERE MATCH (title) AGAINST (%s IN BOOLEAN MODE)
+        """
+        page = fetch_ranked_page(cursor, matches_sql, query, page_size, after)
+        if page.items or after is not None:
+            return page
+        after = None
+
+    sql = "SELECT isbn, title FROM book WHERE title LIKE %s"
+    params = (f"%{title}%",)
+    if after is not None:
+        sql += " AND isbn > %s"
+        params += (after,)
+    sql += " ORDER BY isbn"
+    return fetch_page(cursor, sql, params, page_size, book_listing, lambda row: row[0])
+
+def find_books_by_author(conn, author, page_size=PAGE_SIZE, after=None):
+    """
+    Finds a page of books by author name, best matches first.
+
+    Matching authors are found with the author_name FULLTEXT index and only
+    then joined to their books; like find_books_by_title, it falls back to
+    a substring match if that finds nothing.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        author (str): the words (or beginnings of words) to search for
+        page_size (int, optional): number of results per page
+        after (str, optional): continuation token from the previous page
+
+    Returns:
+        Page: BookListings of the matching books
+    """
+    cursor = conn.cursor()
+    query = fulltext_query(author)
+    ranked = query is not None and (after is None or ":" in after)
+    if ranked:
+        matches_sql = """
+            SELECT isbn, title, MAX(score) AS score
+            FROM (SELECT author_id, MATCH (author_name) AGAINST (%s IN BOOLEAN MODE) AS score
+                  FROM author
+                  WHERE MATCH (author_name) AGAINST (%s IN BOOLEAN MODE)) AS authors
+                NATURAL JOIN book_author NATURAL JOIN book
+            GROUP BY isbn, title
+        """
+        page = fetch_ranked_page(cursor, matches_sql, query, page_size, after)
+        if page.items or after is not None:
+            return page
+        after = None
+
+    sql = """
+        SELECT DISTINCT isbn, title
+        FROM book NATURAL JOIN book_author NATURAL JOIN author
+        WHERE author_name LIKE %s
+    """
+    params = (f"%{author}%",)
+    if after is not None:
+        sql += " AND isbn > %s"
+        params += (after,)
+    sql += " ORDER BY isbn"
+    return fetch_page(cursor, sql, params, page_size, book_listing, lambda row: row[0])
+
+def find_book(conn, isbn):
+    """
+    Finds a book's row.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        isbn (str): ISBN of the book
+
+    Returns:
+        Book: the book, or None if there is no such book
+    """
+    cursor = conn.cursor()
+    sql = "SELECT * FROM book WHERE isbn = %s"
+    cursor.execute(sql, (isbn,))
+    row = cursor.fetchone()
+    return Book(*row) if row else None
+
+def find_book_stats(conn, isbn):
+    """
+    Finds the review statistics of a book.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        isbn (str): ISBN of the book
+
+    Returns:
+        BookStats: the statistics, or None if the book has no ratings
+    """
+    cursor = conn.cursor()
+    sql = "SELECT isbn, average_rating, num_ratings, num_reviews FROM book_review_stats WHERE isbn = %s"
+    cursor.execute(sql, (isbn,))
+    row = cursor.fetchone()
+    return BookStats(*row) if row else None
+
+def find_book_details(conn, isbns):
+    """
+    Finds the metadata of many books, from book_cache where possible and
+    otherwise with one query for all the books that weren't cached.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        isbns (list of str): ISBNs of the books
+
+    Returns:
+        dict: maps the ISBN of each book that exists to a
+              (Book, authors, genres) tuple
+    """
+    details = {}
+    missing = []
+    for isbn in isbns:
+        cached = book_cache.get(isbn)
+        if cached is None:
+            missing.append(isbn)
+        else:
+            details[isbn] = cached
+    if missing:
+        cursor = conn.cursor()
+        placeholders = ", ".join(["%s"] * len(missing))
+        sql = f"SELECT {BOOK_DETAILS_COLUMNS} FROM book AS b WHERE b.isbn IN ({placeholders})"
+        cursor.execute(sql, tuple(missing))
+        for row in cursor.fetchall():
+            book_details = split_details(row)
+            book_cache.put(book_details[0].isbn, book_details)
+            details[book_details[0].isbn] = book_details
+    return details
+
+def find_titles(conn, isbns):
+    """
+    Finds the titles of many books (see find_book_details).
+
+    Returns:
+        dict: maps the ISBN of each book that exists to its title
+    """
+    return {isbn: book.title for isbn, (book, authors, genres)
+            in find_book_details(conn, isbns).items()}
+
+
+def find_book_summary(conn, isbn, wpm=None):
+    """
+    Finds everything shown on a book's page: the book, its authors and
+    genres, its review statistics and its reading time.
+
+    If the book's metadata is cached only its statistics are queried;
+    otherwise everything is fetched in one query.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        isbn (str): ISBN of the book
+        wpm (int, optional): reading speed for the reading time, in words
+                             per minute; defaults to 200
+
+    Returns:
+        BookSummary: the summary, or None if there is no such book
+    """
+    details = book_cache.get(isbn)
+    if details is not None:
+        stats = find_book_stats(conn, isbn)
+    else:
+        cursor = conn.cursor()
+        sql = f"""
+            SELECT {BOOK_DETAILS_COLUMNS}, s.average_rating, s.num_ratings, s.num_reviews
+            FROM book AS b LEFT JOIN book_review_stats AS s ON s.isbn = b.isbn
+            WHERE b.isbn = %s
+        """
+        cursor.execute(sql, (isbn,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        details = split_details(row)
+        book_cache.put(isbn, details)
+        average_rating, num_ratings, num_reviews = row[11:]
+        stats = None
+        if num_ratings is not None:
+            stats = BookStats(isbn, average_rating, num_ratings, num_reviews)
+
+    book, authors, genres = details
+    return BookSummary(book, list(authors), list(genres), stats,
+                       calculate_reading_time(book.num_pages, wpm))
+
+def find_reading_time(conn, isbn, wpm=None):
+    """
+    Estimates how long a book takes to read.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        isbn (str): ISBN of the book
+        wpm (int, optional): reading speed in words per minute; defaults to 200
+
+    Returns:
+        tuple: (num_pages, minutes), or None if the book (or its page
+               count) isn't known
+    """
+    cursor = conn.cursor()
+    sql = "SELECT num_pages FROM book WHERE isbn = %s"
+    cursor.execute(sql, (isbn,))
+    row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return None
+    num_pages = row[0]
+    return num_pages, calculate_reading_time(num_pages, wpm)
+
+def find_reading_times(conn, isbns, wpm=None):
+    """
+    Estimates the reading time of many books (e.g. a page of search
+    results) with one query.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        isbns (list of str): ISBNs of the books
+        wpm (int, optional): reading speed in words per minute; defaults to 200
+
+    Returns:
+        dict: maps the ISBN of each book with a known page count to its
+              reading time in minutes
+    """
+    if not isbns:
+        return {}
+    cursor = conn.cursor()
+    placeholders = ", ".join(["%s"] * len(isbns))
+    sql = f"SELECT isbn, num_pages FROM book WHERE isbn IN ({placeholders}) AND num_pages IS NOT NULL"
+    cursor.execute(sql, tuple(isbns))
+    return {isbn: calculate_reading_time(num_pages, wpm) for isbn, num_pages in cursor.fetchall()}
+
+
 # ----------------------------------------------------------------------
 # Functions for Book Actions
 # ----------------------------------------------------------------------
@@ -56,6 +441,7 @@ def add_new_book(conn):
                              language_code, num_pages, synopsis, cover_url,
                              series_name, all_authors, all_genres))
         conn.commit()
+        book_cache.invalidate(isbn)
         print(f"Book (ISBN #{isbn}) added successfully!")
     except mysql.connector.Error as err:
         print("Error adding book:", err)
@@ -73,59 +459,53 @@ def delete_book(conn, isbn):
         sql = "DELETE FROM book WHERE isbn = %s"
         cursor.execute(sql, (isbn,))
         conn.commit()
+        book_cache.invalidate(isbn)
         print(f"Book (ISBN #{isbn}) deleted successfully!")
     except mysql.connector.Error as err:
         print("Error deleting book:", err)
 
 def search_book_by_title(conn, title):
     """
-    Search for a book by title.
+    Search for a book by title, a page of results at a time.
 
     Args:
         conn (MySQL Connection object): connection to the database
         title (str): the string to search for in the title
     """
-    cursor = conn.cursor()
     try:
-        sql = "SELECT * FROM book WHERE title LIKE %s"
-        cursor.execute(sql, (f"%{title}%",))
-        results = cursor.fetchall()
         print("Search Results:")
-        if not results:
-            print("No books found.")
-        else:
-            for row in results:
-                print(f"ISBN: {row[0]}, Title: {row[1]}")
-            print()
+        page_through(lambda after: find_books_by_title(conn, title, after=after),
+                     lambda listings: print_search_results(conn, listings))
     except mysql.connector.Error as err:
         print("Error searching for book:", err)
 
 def search_book_by_author(conn, author):
     """
-    Search for a book by author.
+    Search for a book by author, a page of results at a time.
 
     Args:
         conn (MySQL Connection object): connection to the database
         author (str): the string to search for in author names
     """
-    cursor = conn.cursor()
     try:
-        sql = "SELECT isbn, title FROM book NATURAL JOIN book_author NATURAL JOIN author WHERE author_name LIKE %s"
-        cursor.execute(sql, (f"%{author}%",))
-        results = cursor.fetchall()
-
         print("Search Results:")
-        if not results:
-            print("No books found.")
-        else:
-            for row in results:
-                isbn, title = row
-                print(f"ISBN: {isbn}, Title: {title}")
-            print()
-
+        page_through(lambda after: find_books_by_author(conn, author, after=after),
+                     lambda listings: print_search_results(conn, listings))
     except mysql.connector.Error as err:
         print("Error searching for book:", err)
 
+def print_search_results(conn, listings):
+    """
+    Prints a page of search results with their reading times, estimated
+    for the whole page with one query.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        listings (list of BookListing): the books to print
+    """
+    reading_times = find_reading_times(conn, [listing.isbn for listing in listings])
+    print_book_list(listings, reading_times)
+
 def get_book_summary(conn, isbn):
     """
     Print a summary of a book, including its title, author(s), genres,
@@ -138,42 +518,13 @@ def get_book_summary(conn, isbn):
     Returns:
         bool: True if the book was found, False otherwise
     """
-    cursor = conn.cursor()
     try:
-        sql = "SELECT * FROM book WHERE isbn = %s"
-        cursor.execute(sql, (isbn,))
-        result = cursor.fetchone()
-        if result is None:
-            print("No book found.")
-            return
-        isbn, title, publisher, year, synopsis, _, _, _, _ = result
-
-        sql = "SELECT author_name FROM book_author NATURAL JOIN author WHERE isbn = %s"
-        cursor.execute(sql, (isbn,))
-        authors = cursor.fetchall()
-
-        sql = "SELECT genre_name FROM book_genre NATURAL JOIN genre WHERE isbn = %s"
-        cursor.execute(sql, (isbn,))
-        genres = cursor.fetchall()
-
-        if isbn is not None:
-            print(f'\n{title}')
-            author_str = ', '.join([author[0] for author in authors])
-            print(f'By {author_str}')
-            print('-' * len(title))
-            get_book_stats(conn, isbn)
-            print()
-
-            if synopsis:
-                print(f'Synopsis: {synopsis}')
-            genre_str = ', '.join([genre[0] for genre in genres])
-            print(f'Genres: {genre_str}\n')
-            print(f'Published {year} by {publisher} | ISBN {isbn}')
-            print('-' * len(title))
-            return True
-        else:
+        summary = find_book_summary(conn, isbn)
+        if summary is None:
             print("No book found.")
             return False
+        print_book_summary(summary)
+        return True
     except mysql.connector.Error as err:
         print("Error getting book summary:", err)
         return False
@@ -186,17 +537,8 @@ def get_book_stats(conn, isbn):
         conn (MySQL Connection object): connection to the database
         isbn (str): ISBN of the book
     """
-    cursor = conn.cursor()
     try:
-        sql = "SELECT * FROM book_review_stats WHERE isbn = %s"
-        cursor.execute(sql, (isbn,))
-        result = cursor.fetchone()
-        if result is None:
-            print("No ratings yet.")
-            return
-        isbn, average_rating, num_ratings, num_reviews = result
-        stars = rating_to_stars(average_rating)
-        print(f'{stars} {average_rating:.2f} | {num_ratings} ratings | {num_reviews} reviews')
+        print_book_stats(find_book_stats(conn, isbn))
     except mysql.connector.Error as err:
         print("Error getting book stats:", err)
 
@@ -209,24 +551,84 @@ def get_book_reading_time(conn, isbn):
         conn (MySQL Connection object): connection to the database
         isbn (str): ISBN of the book
     """
-    cursor = conn.cursor()
     try:
-        sql = "SELECT num_pages FROM book WHERE isbn = %s"
-        cursor.execute(sql, (isbn,))
-        num_pages = cursor.fetchone()[0]
-        if num_pages is not None:
-            wpm = input("What is your reading speed (words per minute)? Press enter if you don't know: ")
-            if not wpm:
-                wpm = 200
-            else:
-                wpm = int(wpm)
-            sql = "SELECT calculate_reading_time(%s, %s) AS minutes"
-            cursor.execute(sql, (num_pages, wpm))
-            minutes = cursor.fetchone()[0]
-            hours = minutes // 60
-            minutes = minutes % 60
-            print(f"It will take you: {hours}h {minutes}m ({num_pages} pages).")
-        else:
+        wpm = input("What is your reading speed (words per minute)? Press enter if you don't know: ")
+        wpm = int(wpm) if wpm else 200
+        result = find_reading_time(conn, isbn, wpm)
+        if result is None:
             print("No book found.")
+            return
+        num_pages, minutes = result
+        print_reading_time(num_pages, minutes)
     except mysql.connector.Error as err:
-        print("Error getting book reading time:", err)
\ No newline at end of file
+        print("Error getting book reading time:", err)
+
+
+# ----------------------------------------------------------------------
+# Display Functions
+# ----------------------------------------------------------------------
+def print_book_list(books, reading_times=None):
+    """
+    Prints a list of books (e.g. a page of search results).
+
+    Args:
+        books (list of BookListing): the books to print
+        reading_times (dict, optional): reading time in minutes by ISBN,
+                                        for the books that have one
+    """
+    if not books:
+        print("No books found.")
+    else:
+        for isbn, title in books:
+            line = f"ISBN: {isbn}, Title: {title}"
+            if reading_times and isbn in reading_times:
+                minutes = reading_times[isbn]
+                line += f", Reading time: {minutes // 60}h {minutes % 60}m"
+            print(line)
+        print()
+
+def print_book_summary(summary):
+    """
+    Prints a book's page: title, authors, statistics, synopsis and genres.
+
+    Args:
+        summary (BookSummary): the book's summary
+    """
+    book = summary.book
+    print(f'\n{book.title}')
+    print(f'By {", ".join(summary.authors)}')
+    print('-' * len(book.title))
+    print_book_stats(summary.stats)
+    if summary.reading_time is not None:
+        print(f'About {summary.reading_time // 60}h {summary.reading_time % 60}m to read '
+              f'({book.num_pages} pages)')
+    print()
+
+    if book.synopsis:
+        print(f'Synopsis: {book.synopsis}')
+    print(f'Genres: {", ".join(summary.genres)}\n')
+    print(f'Published {book.year_published} by {book.publisher} | ISBN {book.isbn}')
+    print('-' * len(book.title))
+
+def print_book_stats(stats):
+    """
+    Prints a book's rating statistics.
+
+    Args:
+        stats (BookStats): the statistics, or None if there are no ratings
+    """
+    if stats is None:
+        print("No ratings yet.")
+        return
+    stars = rating_to_stars(stats.average_rating)
+    print(f'{stars} {stats.average_rating:.2f} | {stats.num_ratings} ratings | {stats.num_reviews} reviews')
+
+def print_reading_time(num_pages, minutes):
+    """
+    Prints a reading time estimate.
+
+    Args:
+        num_pages (int): the book's number of pages
+        minutes (int): the estimated reading time in minutes
+    """
+    print(f"It will take you: {minutes // 60}h {minutes % 60}m ({num_pages} pages).")
@@ -0,0 +1,300 @@
+"""
+Bulk import of books into the Goodreads database.
+
+Reads a CSV file shaped like uncleaned_books.csv (isbn, title, author,
+publisher, year_published, language_code, num_pages, and optionally
+synopsis, cover_photo_url, series_name and genre) or a JSONL file of
+objects with the same keys. Authors and genres are /-separated, as for
+add_book; in JSONL they may also be lists.
+
+Unlike adding books one at a time with the add_book procedure, which looks
+up and inserts each author and genre separately, the whole file is loaded
+in one transaction: books are inserted with multi-row INSERTs, and authors
+and genres are resolved with a few set-based queries over temporary tables.
+Books whose ISBN is already in the database are skipped.
+
+Usage:
+    python3 goodreads/bulk_import.py FILE [--format {csv,jsonl}]
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+import mysql.connector
+import db
+
+# rows per multi-row INSERT
+BATCH_SIZE = 1000
+
+BOOK_COLUMNS = ['isbn', 'title', 'publisher', 'year_published', 'synopsis',
+                'language_code', 'num_pages', 'cover_photo_url', 'series_name']
+
+
+# ----------------------------------------------------------------------
+# Reading Input
+# ----------------------------------------------------------------------
+def read_records(path, file_format):
+    """
+    Yields (line number, record dict) for each book in a CSV or JSONL file.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            # line 1 is the header
+            for line_num, record in enumerate(csv.DictReader(f), start=2):
+                yield line_num, record
+        else:
+            for line_num, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_num, json.loads(line)
+
+
+def split_names(value):
+    """
+    Splits a /-separated string (or a list) of names, dropping blanks.
+    """
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split('/')
+    return [str(name).strip() for name in value if str(name).strip()]
+
+
+def optional(value):
+    """
+    Treats empty fields as missing (NULL).
+    """
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    return value.strip() if isinstance(value, str) else value
+
+
+def parse_book(record):
+    """
+    Converts an input record to (book row, authors, genres).
+
+    Raises:
+        ValueError: if the record isn't a valid book
+    """
+    isbn = optional(record.get('isbn'))
+    title = optional(record.get('title'))
+    if isbn is None or len(str(isbn)) > 13:
+        raise ValueError(f"invalid ISBN {isbn!r}")
+    if title is None:
+        raise ValueError("missing title")
+    num_pages = optional(record.get('num_pages'))
+    year = optional(record.get('year_published'))
+    row = {column: optional(record.get(column)) for column in BOOK_COLUMNS}
+    row['isbn'] = str(isbn)
+    row['num_pages'] = int(num_pages) if num_pages is not None else None
+    row['year_published'] = int(year) if year is not None else None
+    authors = split_names(record.get('author', record.get('authors')))
+    genres = split_names(record.get('genre', record.get('genres')))
+    return tuple(row[column] for column in BOOK_COLUMNS), authors, genres
+
+
+def read_books(path, file_format):
+    """
+    Reads and validates every book in a file, keeping the first of any
+    repeated ISBNs.
+
+    Returns:
+        (list, list): the parsed (book row, authors, genres) tuples, and
+                      (line number, reason) for each rejected record
+    """
+    parsed = {}
+    rejected = []
+    for line_num, record in read_records(path, file_format):
+        try:
+            book = parse_book(record)
+        except (ValueError, AttributeError) as err:
+            rejected.append((line_num, str(err)))
+            continue
+        isbn = book[0][0]
+        if isbn in parsed:
+            rejected.append((line_num, f"repeated ISBN {isbn}"))
+        else:
+            parsed[isbn] = book
+    return list(parsed.values()), rejected
+
+
+# ----------------------------------------------------------------------
+# Loading
+# ----------------------------------------------------------------------
+def batches(rows):
+    """
+    Splits a list of rows into BATCH_SIZE pieces.
+    """
+    for start in range(0, len(rows), BATCH_SIZE):
+        yield rows[start:start + BATCH_SIZE]
+
+
+def existing_isbns(cursor, isbns):
+    """
+    Returns the subset of the given ISBNs that are already in the database.
+    """
+    found = set()
+    for batch in batches(isbns):
+        placeholders = ", ".join(["%s"] * len(batch))
+        cursor.execute(f"SELECT isbn FROM book WHERE isbn IN ({placeholders})", tuple(batch))
+        found.update(isbn for (isbn,) in cursor.fetchall())
+    return found
+
+
+def import_books(conn, books):
+    """
+    Inserts books with their authors and genres in one transaction. New
+    authors and genres are created as needed; names are matched the same
+    way the add_authors and add_genres procedures match them.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        books (list): (book row, authors, genres) tuples from read_books()
+
+    Returns:
+        dict: counts of books inserted and skipped (already in the
+              database), and of authors and genres created
+
+    Raises:
+        mysql.connector.Error: if the import failed; nothing is imported
+    """
+    cursor = conn.cursor()
+    try:
+        present = existing_isbns(cursor, [book[0][0] for book in books])
+        new_books = [book for book in books if book[0][0] not in present]
+
+        sql = (f"INSERT INTO book ({', '.join(BOOK_COLUMNS)}) "
+               f"VALUES ({', '.join(['%s'] * len(BOOK_COLUMNS))})")
+        for batch in batches([row for row, authors, genres in new_books]):
+            # executemany sends each batch as a single multi-row INSERT
+            cursor.executemany(sql, batch)
+
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS import_book_author, import_book_genre")
+        cursor.execute("CREATE TEMPORARY TABLE import_book_author "
+                       "(isbn CHAR(13), author_name VARCHAR(255))")
+        cursor.execute("CREATE TEMPORARY TABLE import_book_genre "
+                       "(isbn CHAR(13), genre_name VARCHAR(50))")
+        book_authors = [(row[0], author) for row, authors, genres in new_books for author in authors]
+        book_genres = [(row[0], genre) for row, authors, genres in new_books for genre in genres]
+        for batch in batches(book_authors):
+            cursor.executemany("INSERT INTO import_book_author (isbn, author_name) VALUES (%s, %s)", batch)
+        for batch in batches(book_genres):
+            cursor.executemany("INSERT INTO import_book_genre (isbn, genre_name) VALUES (%s, %s)", batch)
+
+        # create the authors and genres we don't have yet
+        cursor.execute("""
+            INSERT INTO author (author_name)
+            SELECT DISTINCT author_name FROM import_book_author AS i
+            WHERE NOT EXISTS (SELECT * FROM author AS a WHERE a.author_name = i.author_name)
+        """)
+        num_authors = cursor.rowcount
+        cursor.execute("""
+            INSERT INTO genre (genre_name)
+            SELECT DISTINCT genre_name FROM import_book_genre AS i
+            WHERE NOT EXISTS (SELECT * FROM genre AS g WHERE g.genre_name = i.genre_name)
+        """)
+        num_genres = cursor.rowcount
+
+        # then link the books to them by name
+        cursor.execute("""
+            INSERT INTO book_author (isbn, author_id)
+            SELECT DISTINCT isbn, author_id
+            FROM (SELECT i.isbn, MIN(a.author_id) AS author_id
+                  FROM import_book_author AS i JOIN author AS a ON a.author_name = i.author_name
+                  GROUP BY i.isbn, i.author_name) AS links
+        """)
+        cursor.execute("""
+            INSERT INTO book_genre (isbn, genre_name)
+            SELECT i.isbn, MIN(g.genre_name)
+            FROM import_book_genre AS i JOIN genre AS g ON g.genre_name = i.genre_name
+            GROUP BY i.isbn, g.genre_name
+        """)
+
+        cursor.execute("DROP TEMPORARY TABLE import_book_author, import_book_genre")
+        conn.commit()
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    return {
+        'books': len(new_books),
+        'skipped': len(books) - len(new_books),
+        'authors': num_authors,
+        'genres': num_genres,
+    }
+
+
+def run_import(conn, path, file_format=None):
+    """
+    Imports a file of books and prints a report, including throughput.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        path (str): the CSV or JSONL file
+        file_format (str, optional): 'csv' or 'jsonl'; guessed from the
+                                     file extension if not given
+
+    Returns:
+        bool: True if the import succeeded
+    """
+    if file_format is None:
+        file_format = 'jsonl' if path.lower().endswith(('.jsonl', '.json')) else 'csv'
+
+    start = time.perf_counter()
+    try:
+        books, rejected = read_books(path, file_format)
+    except (OSError, ValueError) as err:
+        print("Error reading import file:", err)
+        return False
+    for line_num, reason in rejected[:10]:
+        print(f"Skipping line {line_num}: {reason}")
+    if len(rejected) > 10:
+        print(f"... and {len(rejected) - 10} more rejected lines.")
+
+    try:
+        counts = import_books(conn, books)
+    except mysql.connector.Error as err:
+        print("Error importing books (nothing was imported):", err)
+        return False
+    elapsed = time.perf_counter() - start
+
+    rate = counts['books'] / elapsed if elapsed > 0 else 0
+    print(f"Imported {counts['books']} books ({counts['authors']} new authors, "
+          f"{counts['genres']} new genres) in {elapsed:.2f}s ({rate:.0f} books/s).")
+    if counts['skipped']:
+        print(f"Skipped {counts['skipped']} books that were already in the database.")
+    return True
+
+
+# ----------------------------------------------------------------------
+# Command-Line Functionality
+# ----------------------------------------------------------------------
+def import_books_ui(conn):
+    """
+    Prompts an admin for a file of books to import.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+    """
+    path = input("Enter the path of the CSV or JSONL file to import: ").strip()
+    run_import(conn, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a CSV or JSONL file of books.")
+    parser.add_argument('file', help="file of books, shaped like uncleaned_books.csv")
+    parser.add_argument('--format', choices=['csv', 'jsonl'],
+                        help="input format (default: from the file extension)")
+    args = parser.parse_args()
+
+    try:
+        with db.connection() as conn:
+            ok = run_import(conn, args.file, args.format)
+    except mysql.connector.Error as err:
+        print("Error connecting to the database:", err)
+        ok = False
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
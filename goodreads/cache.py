@@ -0,0 +1,95 @@
+"""
+An in-process cache for data that rarely changes (e.g. book metadata).
+
+Entries are evicted least-recently-used first once the cache is full, and
+expire after a time-to-live, which bounds how stale an entry can get when
+the database is changed by another process. The cache is thread-safe, so
+the request threads of server.py can share it.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    A size-bounded LRU cache whose entries expire after `ttl` seconds.
+
+    Keeps hit and miss counts, available from stats().
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        """
+        Args:
+            maxsize (int): maximum number of entries
+            ttl (float, optional): seconds an entry stays valid; None for no
+                                   expiry
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # key -> (expiry time or None, value), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value for a key, or `default` if it isn't cached
+        (or has expired).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires is None or time.monotonic() < expires:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """
+        Caches a value, evicting the least recently used entry if full.
+        """
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """
+        Removes a key's entry, if any (e.g. after the underlying row changed).
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """
+        Removes every entry; the hit and miss counts are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns the cache's size and hit/miss counts.
+
+        Returns:
+            dict: size, maxsize, hits, misses and hit_rate (None before the
+                  first lookup)
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+            }
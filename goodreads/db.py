@@ -0,0 +1,233 @@
+"""
+Database connection management for the Goodreads database.
+
+All modules draw their connections from one shared pool, so many sessions
+can run against a single process without sharing a socket, and connections
+that MySQL has dropped (e.g. after sitting idle) are reopened transparently.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+import mysql.connector
+from mysql.connector.errors import PoolError
+
+# Logging in as admin for permissions; if we expand our grant-permissions
+# then we can switch between user types here.
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'appadmin',
+    'port': '3306',
+    'password': 'adminpw',
+    'database': 'goodreads',
+}
+
+POOL_SIZE = 5
+# seconds to wait for a free connection before giving up
+POOL_TIMEOUT = 30
+# how hard to try reconnecting a connection that failed its health check
+RECONNECT_ATTEMPTS = 3
+RECONNECT_DELAY = 1
+
+# applied to every new connection, if set (see set_connection_wrapper)
+_connection_wrapper = None
+
+
+# ----------------------------------------------------------------------
+# Connection Pool
+# ----------------------------------------------------------------------
+def ensure_connected(conn):
+    """
+    Health-checks a connection with a ping, reconnecting if it was dropped.
+
+    Args:
+        conn (MySQL Connection object): connection to check
+
+    Raises:
+        mysql.connector.Error: if the connection could not be re-established
+    """
+    conn.ping(reconnect=True, attempts=RECONNECT_ATTEMPTS, delay=RECONNECT_DELAY)
+
+
+class ConnectionPool:
+    """
+    A fixed-size, thread-safe pool of MySQL connections.
+
+    Connections are opened lazily up to `size`, health-checked every time
+    they are handed out, and rolled back when returned so no transaction
+    leaks from one user of a connection to the next.
+    """
+
+    def __init__(self, size=POOL_SIZE, timeout=POOL_TIMEOUT, **config):
+        """
+        Args:
+            size (int, optional): maximum number of open connections
+            timeout (float, optional): seconds to wait for a free connection
+            **config: arguments for mysql.connector.connect; defaults to DB_CONFIG
+        """
+        self.size = size
+        self.timeout = timeout
+        self.config = config or DB_CONFIG
+        # idle connections, most recently released last
+        self._idle = []
+        self._num_open = 0
+        # guards _idle and _num_open; notified whenever a connection is
+        # released or a slot frees up
+        self._available = threading.Condition()
+
+    def get_conn(self):
+        """
+        Checks out a healthy connection, opening one if the pool isn't full
+        yet and otherwise waiting for one to be released.
+
+        Returns:
+            MySQL Connection object: the connection; give it back with release()
+
+        Raises:
+            mysql.connector.Error: if no connection could be made, or none
+                was released within the timeout (PoolError)
+        """
+        conn = self._take()
+        try:
+            ensure_connected(conn)
+        except mysql.connector.Error:
+            self._discard(conn)
+            raise
+        return conn
+
+    def release(self, conn):
+        """
+        Returns a connection to the pool, rolling back anything uncommitted.
+
+        Args:
+            conn (MySQL Connection object): a connection from get_conn()
+        """
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except mysql.connector.Error:
+            # the connection is broken; don't hand it out again
+            self._discard(conn)
+            return
+        with self._available:
+            self._idle.append(conn)
+            self._available.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager that checks out a connection and releases it on exit.
+        """
+        conn = self.get_conn()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """
+        Closes all idle connections.
+        """
+        with self._available:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+    def _take(self):
+        """
+        Takes an idle connection, or opens a new one if there's room,
+        otherwise waits until either is possible.
+        """
+        deadline = time.monotonic() + self.timeout
+        with self._available:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._num_open < self.size:
+                    self._num_open += 1
+                    break
+                # a released connection or a discarded one (freeing its
+                # slot) both wake us up to check again
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolError(f"No database connection became free within {self.timeout} seconds.")
+                self._available.wait(remaining)
+
+        try:
+            conn = mysql.connector.connect(**self.config)
+        except mysql.connector.Error:
+            self._free_slot()
+            raise
+        return _connection_wrapper(conn) if _connection_wrapper else conn
+
+    def _discard(self, conn):
+        """
+        Closes a connection and frees its slot in the pool.
+        """
+        try:
+            conn.close()
+        except mysql.connector.Error:
+            pass
+        self._free_slot()
+
+    def _free_slot(self):
+        with self._available:
+            self._num_open -= 1
+            self._available.notify()
+
+
+def set_connection_wrapper(wrapper):
+    """
+    Sets a function that wraps every connection pools open from now on,
+    e.g. to instrument them (see instrument.py). The wrapper must return an
+    object that behaves like the connection.
+
+    Args:
+        wrapper (function): takes and returns a connection; None to stop
+                            wrapping new connections
+    """
+    global _connection_wrapper
+    _connection_wrapper = wrapper
+
+
+# ----------------------------------------------------------------------
+# Shared Pool
+# ----------------------------------------------------------------------
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def init_pool(size=POOL_SIZE, timeout=POOL_TIMEOUT, **config):
+    """
+    Creates (or replaces) the shared pool with the given settings.
+
+    Returns:
+        ConnectionPool: the shared pool
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(size, timeout, **config)
+        return _pool
+
+
+def get_pool():
+    """
+    Returns the shared pool, creating it with the default settings if needed.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def connection():
+    """
+    Context manager for a connection from the shared pool, e.g.
+
+        with db.connection() as conn:
+            books.search_book_by_title(conn, title)
+    """
+    return get_pool().connection()
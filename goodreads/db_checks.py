@@ -0,0 +1,248 @@
+"""
+Checks that the app's frequent queries are served by indexes, and that
+the Python versions of SQL routines agree with the database.
+
+Runs each check against the database, EXPLAINs every SELECT it issues and
+reports any query plan that reads a whole table (a plan of type ALL). The
+checks call the modules' own data-access functions, so they follow the SQL
+the app actually runs; queries that only live in triggers or queries.sql
+are checked directly. Exits with status 1 if any check scans a full table
+or a routine disagrees, so it can be run after schema changes (e.g.
+setup-indexes.sql or setup-routines.sql) or in CI.
+
+Usage:
+    python3 goodreads/db_checks.py [--verbose]
+"""
+
+import argparse
+import sys
+import mysql.connector
+import books
+import db
+import feed
+import friends
+import reviews
+import shelf
+import users
+
+
+# ----------------------------------------------------------------------
+# Query Plans
+# ----------------------------------------------------------------------
+class ExplainingCursor:
+    """
+    A cursor that EXPLAINs each SELECT before running it.
+    """
+
+    def __init__(self, conn, plans):
+        self._explain = conn.cursor(buffered=True, dictionary=True)
+        self._cursor = conn.cursor(buffered=True)
+        self._plans = plans
+
+    def execute(self, sql, params=()):
+        if sql.lstrip().upper().startswith("SELECT"):
+            self._explain.execute("EXPLAIN " + sql, params)
+            self._plans.append((sql, self._explain.fetchall()))
+        self._cursor.execute(sql, params)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+
+class ExplainingConnection:
+    """
+    Stands in for a connection, recording the plan of every SELECT run on it.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.plans = []
+
+    def cursor(self, *args, **kwargs):
+        return ExplainingCursor(self._conn, self.plans)
+
+
+def full_scans(plan):
+    """
+    Returns the tables a query plan reads in full. Derived tables (e.g. the
+    ranked matches of a FULLTEXT search) are left out, since they only hold
+    rows already found through an index.
+    """
+    return [row['table'] for row in plan
+            if row['type'] == 'ALL' and row['table'] and not row['table'].startswith('<')]
+
+
+# ----------------------------------------------------------------------
+# Checks
+# ----------------------------------------------------------------------
+def find_samples(conn):
+    """
+    Picks real keys to run the checks with: a reviewed book (with its title
+    and an author), a user who reviewed it and one of their shelves. The
+    title and author have words the FULLTEXT indexes can find, so searches
+    for them don't fall back to (scanning) substring matches. Samples that
+    the database has no rows for (e.g. there are no reviews yet) are None.
+    """
+    samples = dict.fromkeys(['isbn', 'title', 'author', 'user_id', 'shelf_id'])
+    cursor = conn.cursor(buffered=True)
+    cursor.execute("""
+        SELECT isbn, title, author_name, user_id
+        FROM review NATURAL JOIN book NATURAL JOIN book_author NATURAL JOIN author
+        LIMIT 1000
+    """)
+    rows = cursor.fetchall()
+    if rows:
+        isbn, title, author, user_id = next(
+            (row for row in rows if books.fulltext_query(row[1]) and books.fulltext_query(row[2])),
+            rows[-1])
+        samples.update(isbn=isbn, title=title, author=author, user_id=user_id)
+        cursor.execute("SELECT shelf_id FROM shelf WHERE user_id = %s LIMIT 1", (user_id,))
+        row = cursor.fetchone()
+        if row is not None:
+            samples['shelf_id'] = row[0]
+    if samples['shelf_id'] is None:
+        # no reviewer with a shelf; any user with one will do
+        cursor.execute("SELECT user_id, shelf_id FROM shelf LIMIT 1")
+        row = cursor.fetchone()
+        if row is not None:
+            if samples['user_id'] is None:
+                samples['user_id'] = row[0]
+            samples['shelf_id'] = row[1]
+    return samples
+
+
+# (name, function of a connection and the samples, names of the samples it
+# uses)
+APP_CHECKS = [
+    ("search books by title", lambda conn, s: books.find_books_by_title(conn, s['title']), ('title',)),
+    ("search books by author", lambda conn, s: books.find_books_by_author(conn, s['author']),
+     ('author',)),
+    ("book page", lambda conn, s: books.find_book_summary(conn, s['isbn']), ('isbn',)),
+    ("book reviews", lambda conn, s: reviews.find_reviews(conn, s['isbn']), ('isbn',)),
+    ("has reviewed", lambda conn, s: reviews.has_reviewed(conn, s['user_id'], s['isbn']),
+     ('user_id', 'isbn')),
+    ("user profile", lambda conn, s: users.find_user(conn, s['user_id']), ('user_id',)),
+    ("user's shelves", lambda conn, s: shelf.find_shelves(conn, s['user_id']), ('user_id',)),
+    ("books on a shelf", lambda conn, s: shelf.find_shelf_books(conn, s['shelf_id']), ('shelf_id',)),
+    ("friends", lambda conn, s: friends.find_friends(conn, s['user_id']), ('user_id',)),
+    ("user's latest activity (feed)", lambda conn, s: feed.find_outboxes(conn, [s['user_id']]),
+     ('user_id',)),
+]
+
+# (name, query, names of the samples it takes as parameters)
+SQL_CHECKS = [
+    ("'Has Read' shelf lookup (auto_add_to_has_read_shelf)", """
+        SELECT 1 FROM on_shelf NATURAL JOIN shelf
+        WHERE isbn = %s AND user_id = %s AND shelf_name = 'Has Read'
+    """, ('isbn', 'user_id')),
+    ("who has a user as a friend", """
+        SELECT user_id FROM friend WHERE friend_id = %s
+    """, ('user_id',)),
+    ("top rated books (queries.sql)", """
+        SELECT title, average_rating, num_ratings
+        FROM book_review_stats NATURAL JOIN book
+        WHERE num_ratings >= 2
+        ORDER BY average_rating DESC, num_ratings DESC
+        LIMIT 10
+    """, ()),
+]
+
+
+def run_checks(conn, verbose=False):
+    """
+    Runs every check and prints its result.
+
+    Returns:
+        int: the number of checks with a full table scan
+    """
+    samples = find_samples(conn)
+    checks = list(APP_CHECKS)
+    for name, sql, sample_names in SQL_CHECKS:
+        checks.append((name, lambda conn, s, sql=sql, sample_names=sample_names:
+                       conn.cursor().execute(sql, tuple(s[sample] for sample in sample_names)),
+                       sample_names))
+
+    failures = 0
+    for name, check, sample_names in checks:
+        missing = [sample for sample in sample_names if samples[sample] is None]
+        if missing:
+            print(f"SKIPPED    {name} (no sample {', '.join(missing)} in the database)")
+            continue
+        explaining = ExplainingConnection(conn)
+        check(explaining, samples)
+        scanned = sorted({table for sql, plan in explaining.plans
+                          for table in full_scans(plan)})
+        if scanned:
+            failures += 1
+            print(f"FULL SCAN  {name} ({', '.join(scanned)})")
+        else:
+            print(f"OK         {name}")
+        if verbose or scanned:
+            for sql, plan in explaining.plans:
+                print("    " + " ".join(sql.split()))
+                for row in plan:
+                    print(f"        {row['table']}: type={row['type']}, key={row['key']}, rows={row['rows']}")
+    return failures
+
+
+# (num_pages, wpm) pairs to compare, including ones where MySQL's rounding
+# of the division to 4 decimal places decides the result
+READING_TIME_CASES = [
+    (num_pages, wpm)
+    for num_pages in (0, 1, 7, 99, 250, 1001, 4999, 800001)
+    for wpm in (None, 0, 1, 3, 7, 150, 200, 333, 1000, 200000)
+]
+
+
+def check_reading_time(conn):
+    """
+    Compares books.calculate_reading_time with the calculate_reading_time
+    SQL function, printing the result.
+
+    Returns:
+        int: 1 if they disagree on any case, otherwise 0
+    """
+    cursor = conn.cursor()
+    mismatches = []
+    for num_pages, wpm in READING_TIME_CASES:
+        cursor.execute("SELECT calculate_reading_time(%s, %s)", (num_pages, wpm))
+        (expected,) = cursor.fetchone()
+        actual = books.calculate_reading_time(num_pages, wpm)
+        if actual != expected:
+            mismatches.append((num_pages, wpm, expected, actual))
+
+    if not mismatches:
+        print("OK         reading time matches calculate_reading_time")
+        return 0
+    print("MISMATCH   reading time differs from calculate_reading_time")
+    for num_pages, wpm, expected, actual in mismatches:
+        print(f"    num_pages={num_pages}, wpm={wpm}: SQL {expected}, Python {actual}")
+    return 1
+
+
+# ----------------------------------------------------------------------
+# Main Program
+# ----------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Check query plans and SQL routine parity.")
+    parser.add_argument('--verbose', action='store_true', help="print every query plan")
+    args = parser.parse_args()
+
+    try:
+        with db.connection() as conn:
+            failures = run_checks(conn, args.verbose)
+            failures += check_reading_time(conn)
+    except mysql.connector.Error as err:
+        print("Error checking query plans:", err)
+        sys.exit(2)
+    if failures:
+        print(f"\n{failures} check(s) failed.")
+        sys.exit(1)
+    print("\nAll checks passed.")
+
+
+if __name__ == '__main__':
+    main()
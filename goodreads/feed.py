@@ -0,0 +1,177 @@
+"""
+The friends' activity feed: recent reviews by a user's friends and books
+they added to their (public) shelves.
+
+Each user's latest OUTBOX_SIZE activities (their "outbox") are cached in an
+LRU cache. A feed is the merge of the user's friends' outboxes, newest
+first: friends come from the in-memory friend graph, cached outboxes are
+merged with a k-way heap merge, and the outboxes of all friends that
+aren't cached are loaded together in one query. Writes only touch the
+writer's own outbox: reviews.py and shelf.py call activity_changed() after
+each change, so the outbox is reloaded on its next read. This keeps writes
+cheap however many friends the writer has, and once a user's friends'
+outboxes are cached, loading their feed doesn't query the database at all.
+"""
+
+import heapq
+from itertools import islice
+import mysql.connector
+import friend_graph
+from cache import LRUCache
+from records import Activity
+
+# latest activities kept per user; a feed can't go further back than this
+OUTBOX_SIZE = 50
+FEED_SIZE = 30
+
+# outboxes are evicted least-recently-used, and expire to pick up changes
+# made by other processes
+OUTBOX_CACHE_SIZE = 100000
+OUTBOX_CACHE_TTL = 300
+outbox_cache = LRUCache(OUTBOX_CACHE_SIZE, OUTBOX_CACHE_TTL)
+
+# users whose outboxes are loaded per query
+BATCH_SIZE = 500
+
+# each user's latest activities, numbered newest first; books put on Has
+# Read by reviewing them have no added_at, so they only count as the review
+ACTIVITY_SQL = """
+    SELECT latest.user_id, CONCAT(u.first_name, ' ', u.last_name) AS name, kind,
+           latest.isbn, b.title, star_rating, shelf_name, activity_time
+    FROM (
+        SELECT activity.*, ROW_NUMBER() OVER (
+            PARTITION BY user_id ORDER BY activity_time DESC) AS n
+        FROM (
+            SELECT user_id, 'review' AS kind, isbn, star_rating, NULL AS shelf_name,
+                   review_date AS activity_time
+            FROM review
+            WHERE user_id IN ({users}) AND review_date IS NOT NULL
+            UNION ALL
+            SELECT s.user_id, 'shelf', o.isbn, NULL, s.shelf_name, o.added_at
+            FROM shelf AS s JOIN on_shelf AS o ON o.shelf_id = s.shelf_id
+            WHERE s.user_id IN ({users}) AND NOT s.is_private AND o.added_at IS NOT NULL
+        ) AS activity
+    ) AS latest
+    JOIN user_info AS u ON u.user_id = latest.user_id
+    JOIN book AS b ON b.isbn = latest.isbn
+    WHERE n <= %s
+    ORDER BY latest.user_id, activity_time DESC
+"""
+
+
+# ----------------------------------------------------------------------
+# Data Access Functions
+# ----------------------------------------------------------------------
+def find_outboxes(conn, user_ids):
+    """
+    Finds the latest activities of some users.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        user_ids (list): the users' IDs
+
+    Returns:
+        dict: maps each user ID to a list of its latest OUTBOX_SIZE
+              Activity records, newest first
+    """
+    outboxes = {user_id: [] for user_id in user_ids}
+    cursor = conn.cursor()
+    user_ids = list(outboxes)
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        batch = user_ids[start:start + BATCH_SIZE]
+        sql = ACTIVITY_SQL.format(users=", ".join(["%s"] * len(batch)))
+        cursor.execute(sql, (*batch, *batch, OUTBOX_SIZE))
+        for row in cursor.fetchall():
+            outboxes[row[0]].append(Activity(*row))
+    return outboxes
+
+
+def get_outboxes(conn, user_ids):
+    """
+    Returns the latest activities of some users (see find_outboxes), from
+    the cache where possible. The outboxes that aren't cached are loaded
+    in one query, and cached.
+    """
+    outboxes = {}
+    missing = []
+    for user_id in user_ids:
+        outbox = outbox_cache.get(user_id)
+        if outbox is None:
+            missing.append(user_id)
+        else:
+            outboxes[user_id] = outbox
+    if missing:
+        for user_id, outbox in find_outboxes(conn, missing).items():
+            outbox_cache.put(user_id, outbox)
+            outboxes[user_id] = outbox
+    return outboxes
+
+
+def find_feed(conn, user_id, limit=FEED_SIZE):
+    """
+    Finds the latest activities of a user's friends.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        user_id (int): the user's ID
+        limit (int): maximum number of activities
+
+    Returns:
+        list: Activity records, newest first
+    """
+    friend_ids = [int(friend_id) for friend_id in
+                  friend_graph.get_graph(conn).friends_of(int(user_id))]
+    outboxes = get_outboxes(conn, friend_ids).values()
+    # every outbox is sorted newest first, so a k-way merge keeps the order
+    merged = heapq.merge(*outboxes, key=lambda activity: activity.time, reverse=True)
+    return list(islice(merged, limit))
+
+
+def activity_changed(user_id):
+    """
+    Drops a user's cached outbox after they reviewed or shelved a book (or
+    undid it), so their friends' feeds show the change.
+    """
+    outbox_cache.invalidate(int(user_id))
+
+
+# ----------------------------------------------------------------------
+# Functions for Feed Actions
+# ----------------------------------------------------------------------
+def view_feed(conn, user_id):
+    """
+    List the latest activity of your friends.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        user_id (int): the user's ID
+    """
+    try:
+        activities = find_feed(conn, user_id)
+    except mysql.connector.Error as err:
+        print("Error loading your friends' activity:", err)
+        return
+    print("Your friends' recent activity:")
+    print_feed(activities)
+
+
+# ----------------------------------------------------------------------
+# Display Functions
+# ----------------------------------------------------------------------
+def print_feed(activities):
+    """
+    Prints a list of activities.
+
+    Args:
+        activities (list of Activity): the activities to print
+    """
+    if not activities:
+        print("No recent activity.")
+        return
+    for user_id, name, kind, isbn, title, star_rating, shelf_name, time in activities:
+        if kind == 'review':
+            action = f"rated {title} ({star_rating} stars)"
+        else:
+            action = f"added {title} to their shelf {shelf_name}"
+        print(f"{time:%Y-%m-%d %H:%M} | {name} (#{user_id}) {action} | ISBN: {isbn}")
+    print()
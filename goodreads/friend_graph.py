@@ -0,0 +1,251 @@
+"""
+An in-memory index of the friend graph, for "people you may know".
+
+The friend table is loaded once into compressed sparse row (CSR) arrays:
+the friends of user u are indices[indptr[u]:indptr[u + 1]], sorted. Adding
+and removing friends through friends.py updates a small overlay of changes
+instead of the arrays, and the overlay is folded into new arrays once it
+grows. The index is rebuilt from the database in the background after
+GRAPH_TTL seconds, to pick up changes made by other processes.
+
+Counting mutual friends then needs no queries: a user's friends-of-friends
+are gathered from the arrays and counted with numpy.
+"""
+
+import sys
+import threading
+import time
+import numpy as np
+import mysql.connector
+import db
+
+# seconds before the index is rebuilt from the database
+GRAPH_TTL = 300
+# number of changed users in the overlay before it's folded into the arrays
+COMPACT_THRESHOLD = 1000
+
+
+class FriendGraph:
+    """
+    Friend lists of every user, as CSR arrays plus an overlay of changes.
+    """
+
+    def __init__(self, indptr, indices):
+        """
+        Args:
+            indptr (numpy array): offsets into indices, indexed by user ID
+            indices (numpy array): the friends of each user, sorted
+        """
+        # kept as one tuple so compaction swaps both arrays at once
+        self._csr = (indptr, indices)
+        self.built_at = time.monotonic()
+        # user ID -> sorted array of friends, for users changed since built
+        self._changed = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_pairs(cls, user_ids, friend_ids):
+        """
+        Builds the graph from parallel arrays of (user, friend) pairs.
+        """
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        friend_ids = np.asarray(friend_ids, dtype=np.int64)
+        order = np.lexsort((friend_ids, user_ids))
+        num_users = int(max(user_ids.max(initial=0), friend_ids.max(initial=0))) + 1
+        counts = np.bincount(user_ids, minlength=num_users)
+        indptr = np.zeros(num_users + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return cls(indptr, friend_ids[order])
+
+    @classmethod
+    def from_database(cls, conn):
+        """
+        Builds the graph from the friend table.
+        """
+        cursor = conn.cursor()
+        cursor.execute("SELECT user_id, friend_id FROM friend")
+        rows = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+        return cls.from_pairs(rows[:, 0], rows[:, 1])
+
+    def friends_of(self, user_id):
+        """
+        Returns the sorted friend IDs of a user.
+        """
+        changed = self._changed.get(user_id)
+        if changed is not None:
+            return changed
+        indptr, indices = self._csr
+        if user_id + 1 >= len(indptr):
+            return indices[:0]
+        return indices[indptr[user_id]:indptr[user_id + 1]]
+
+    def add(self, user_id, friend_id):
+        """
+        Records a new friendship (in both directions).
+        """
+        with self._lock:
+            for a, b in ((user_id, friend_id), (friend_id, user_id)):
+                self._changed[a] = np.union1d(self.friends_of(a), [b])
+            self._maybe_compact()
+
+    def remove(self, user_id, friend_id):
+        """
+        Records the end of a friendship (in both directions).
+        """
+        with self._lock:
+            for a, b in ((user_id, friend_id), (friend_id, user_id)):
+                self._changed[a] = np.setdiff1d(self.friends_of(a), [b])
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        """
+        Folds the overlay into new CSR arrays once it holds many users.
+
+        Nothing is sorted or visited per user: the new friend lists are the
+        old arrays' runs between changed users (copied as whole slices) with
+        the changed users' lists in between, and the offsets come from the
+        per-user counts.
+        """
+        if len(self._changed) < COMPACT_THRESHOLD:
+            return
+        old_indptr, old_indices = self._csr
+        num_old = len(old_indptr) - 1
+        changed = sorted(self._changed)
+        num_users = max(num_old, changed[-1] + 1)
+
+        counts = np.zeros(num_users, dtype=np.int64)
+        counts[:num_old] = np.diff(old_indptr)
+        counts[changed] = [len(self._changed[user]) for user in changed]
+        indptr = np.zeros(num_users + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        pieces = []
+        start = 0
+        for user in changed:
+            # the unchanged users before this one, then its new list
+            end = old_indptr[min(user, num_old)]
+            pieces.append(old_indices[start:end])
+            pieces.append(self._changed[user])
+            start = old_indptr[min(user + 1, num_old)]
+        pieces.append(old_indices[start:])
+        indices = np.concatenate(pieces).astype(np.int64, copy=False)
+
+        # swap in the new arrays before clearing the overlay, so readers
+        # never see a friend list go missing
+        self._csr = (indptr, indices)
+        self._changed = {}
+
+    def mutual_friend_counts(self, user_id):
+        """
+        Counts, for every friend of a friend of a user, how many friends
+        they have in common with the user.
+
+        Returns:
+            (numpy array, numpy array): user IDs (not the user or their
+                                        current friends) and their mutual
+                                        friend counts
+        """
+        friends = self.friends_of(user_id)
+        if len(friends) == 0:
+            return friends, friends
+        candidates = np.concatenate([self.friends_of(int(friend)) for friend in friends])
+        candidates = candidates[(candidates != user_id) & ~np.isin(candidates, friends)]
+        return np.unique(candidates, return_counts=True)
+
+    def suggestions(self, user_id, limit=10):
+        """
+        Returns the users with the most friends in common with a user.
+
+        Returns:
+            list: (user ID, mutual friend count) tuples, most mutual friends
+                  first (ties by lower user ID)
+        """
+        user_ids, counts = self.mutual_friend_counts(user_id)
+        # stable sort, so ties stay in user ID order
+        order = np.argsort(-counts, kind='stable')[:limit]
+        return [(int(user_ids[i]), int(counts[i])) for i in order]
+
+
+# ----------------------------------------------------------------------
+# Shared Graph
+# ----------------------------------------------------------------------
+_graph = None
+_graph_lock = threading.Lock()
+# True while a background thread rebuilds the graph
+_rebuilding = False
+# friendships added (True) and removed (False) while the graph is being
+# rebuilt, to replay onto the new graph; None when no rebuild is running
+_pending_edits = None
+
+
+def get_graph(conn):
+    """
+    Returns the shared friend graph. The first call builds it from the
+    database; once it is older than GRAPH_TTL, it is rebuilt on a background
+    thread (with its own connection) and the old graph is returned until
+    the new one is ready, so no request waits on a rebuild.
+    """
+    global _graph, _rebuilding, _pending_edits
+    with _graph_lock:
+        if _graph is None:
+            # changes can't be applied to the graph while it's built, since
+            # they wait for this lock
+            _graph = FriendGraph.from_database(conn)
+        elif time.monotonic() - _graph.built_at > GRAPH_TTL and not _rebuilding:
+            _rebuilding = True
+            _pending_edits = []
+            threading.Thread(target=rebuild_graph, daemon=True).start()
+        return _graph
+
+
+def rebuild_graph():
+    """
+    Builds a new graph from the database and swaps it in, after replaying
+    onto it the friendships changed since the rebuild started (which its
+    query may or may not have seen; replaying them is harmless either way).
+    If the rebuild fails, the old graph stays in use and the next request
+    tries again.
+    """
+    global _graph, _rebuilding, _pending_edits
+    try:
+        with db.connection() as conn:
+            graph = FriendGraph.from_database(conn)
+        with _graph_lock:
+            for added, user_id, friend_id in _pending_edits:
+                if added:
+                    graph.add(user_id, friend_id)
+                else:
+                    graph.remove(user_id, friend_id)
+            _graph = graph
+    except mysql.connector.Error as err:
+        print("Error rebuilding the friend graph:", err, file=sys.stderr)
+    finally:
+        with _graph_lock:
+            _rebuilding = False
+            _pending_edits = None
+
+
+def _record_edit(added, user_id, friend_id):
+    with _graph_lock:
+        if _graph is None:
+            return
+        if added:
+            _graph.add(user_id, friend_id)
+        else:
+            _graph.remove(user_id, friend_id)
+        if _pending_edits is not None:
+            _pending_edits.append((added, user_id, friend_id))
+
+
+def friendship_added(user_id, friend_id):
+    """
+    Updates the shared graph (if built) after a friendship is committed.
+    """
+    _record_edit(True, int(user_id), int(friend_id))
+
+
+def friendship_removed(user_id, friend_id):
+    """
+    Updates the shared graph (if built) after a friendship is deleted.
+    """
+    _record_edit(False, int(user_id), int(friend_id))
@@ -3,42 +3,73 @@ Friend-related functions for the Goodreads database.
 """
 
 import mysql.connector
+import friend_graph
+from uow import UnitOfWork
+from records import FriendSuggestion, UserListing
 
 
 # ----------------------------------------------------------------------
-# Functions for Friend Actions
+# Data Access Functions
 # ----------------------------------------------------------------------
+# These run queries and return records without printing anything; database
+# errors are raised to the caller.
 def find_friends_by_name(conn, name):
     """
-    Find friends by name.
+    Find users by name, as a list of UserListing.
     """
     cursor = conn.cursor()
-    try:
-        sql = "SELECT user_id, CONCAT(first_name, ' ', last_name) AS full_name, email FROM user_info WHERE CONCAT(first_name, ' ', last_name) LIKE %s"
-        cursor.execute(sql, ('%' + name + '%',))
-        return cursor.fetchall()
-    except mysql.connector.Error as err:
-        print("Error finding friends by name:", err)
-        return []
+    sql = "SELECT user_id, CONCAT(first_name, ' ', last_name) AS full_name, email FROM user_info WHERE CONCAT(first_name, ' ', last_name) LIKE %s"
+    cursor.execute(sql, ('%' + name + '%',))
+    return [UserListing(*row) for row in cursor.fetchall()]
 
 
 def find_friend_by_email(conn, email):
     """
-    Find a friend by email (must match exactly).
+    Find a user by email (must match exactly), as a UserListing or None.
     """
     cursor = conn.cursor()
-    try:
-        sql = "SELECT user_id, CONCAT(first_name, ' ', last_name) AS full_name, email FROM user_info WHERE email = %s"
-        cursor.execute(sql, (email,))
-        return cursor.fetchone()
-    except mysql.connector.Error as err:
-        print("Error finding friend by email:", err)
-        return None
+    sql = "SELECT user_id, CONCAT(first_name, ' ', last_name) AS full_name, email FROM user_info WHERE email = %s"
+    cursor.execute(sql, (email,))
+    row = cursor.fetchone()
+    return UserListing(*row) if row else None
+
+
+def find_friends(conn, user_id):
+    """
+    Find all friends of a user, as a list of UserListing.
+    """
+    cursor = conn.cursor()
+    sql = "SELECT user_id, CONCAT(first_name, ' ', last_name) AS name, email FROM user_info WHERE user_id IN (SELECT friend_id FROM friend WHERE user_id = %s)"
+    cursor.execute(sql, (user_id,))
+    return [UserListing(*row) for row in cursor.fetchall()]
+
 
+def find_suggestions(conn, user_id, limit=10):
+    """
+    Find the users with the most friends in common with a user (who aren't
+    already their friends), as a list of FriendSuggestion, most mutual
+    friends first. Mutual friends are counted from the in-memory friend
+    graph; only the suggested users' names are queried.
+    """
+    suggestions = friend_graph.get_graph(conn).suggestions(int(user_id), limit)
+    if not suggestions:
+        return []
+    cursor = conn.cursor()
+    placeholders = ", ".join(["%s"] * len(suggestions))
+    sql = f"SELECT user_id, CONCAT(first_name, ' ', last_name) AS name, email FROM user_info WHERE user_id IN ({placeholders})"
+    cursor.execute(sql, tuple(suggested_id for suggested_id, count in suggestions))
+    users = {row[0]: row for row in cursor.fetchall()}
+    # keep the graph's order; skip users deleted since the graph was built
+    return [FriendSuggestion(*users[suggested_id], count)
+            for suggested_id, count in suggestions if suggested_id in users]
 
+
+# ----------------------------------------------------------------------
+# Functions for Friend Actions
+# ----------------------------------------------------------------------
 def add_friend(conn, user_id, friend_id):
     """
-    Add another user to your friends list.
+    Add another user to your friends list. Returns True if successful.
     """
     cursor = conn.cursor()
     try:
@@ -47,53 +78,92 @@ def add_friend(conn, user_id, friend_id):
         sql2 = "INSERT INTO friend (user_id, friend_id) VALUES (%s, %s);"
         cursor.execute(sql2, (friend_id, user_id))
         conn.commit()
+        friend_graph.friendship_added(user_id, friend_id)
         print(f"You are now friends with user #{friend_id}.")
+        return True
     except mysql.connector.Error:
         print("Failed to add friend. Confirm that you have the correct user ID.")
+        return False
+
+
+def add_friends(conn, user_id, friend_ids):
+    """
+    Add many users to your friends list at once (e.g. an imported list of
+    friends), in one transaction. Returns True if successful; if any of
+    them can't be added, none are.
+    """
+    friend_ids = [friend_id for friend_id in dict.fromkeys(friend_ids) if friend_id != user_id]
+    try:
+        with UnitOfWork(conn) as work:
+            for friend_id in friend_ids:
+                work.add_friend(user_id, friend_id)
+    except mysql.connector.Error:
+        print("Failed to add friends (none were added). Confirm that you have the correct "
+              "user IDs and aren't already friends with them.")
+        return False
+    print(f"You are now friends with {len(friend_ids)} more users.")
+    return True
 
 
 def delete_friend(conn, user_id, friend_id):
     """
-    Remove a user from your friends list.
+    Remove a user from your friends list. Returns True if successful.
     """
     cursor = conn.cursor()
     try:
         sql = "DELETE FROM friend WHERE (user_id = %s AND friend_id = %s) OR (user_id = %s AND friend_id = %s)"
         cursor.execute(sql, (user_id, friend_id, friend_id, user_id))
         conn.commit()
+        friend_graph.friendship_removed(user_id, friend_id)
         print(f"You are no longer friends with user #{friend_id}.")
+        return True
 
     except mysql.connector.Error:
         print("Failed to delete friend. Confirm that you have the correct user ID.")
+        return False
 
 
 def view_friends(conn, user_id):
     """
     List all of your friends.
     """
-    cursor = conn.cursor()
     try:
-        sql = "SELECT user_id, CONCAT(first_name, ' ', last_name) AS name, email FROM user_info WHERE user_id IN (SELECT friend_id FROM friend WHERE user_id = %s)"
-        cursor.execute(sql, (user_id,))
-        results = cursor.fetchall()
         print("Your friends:")
-        for row in results:
-            print(f"ID: #{row[0]}, Name: {row[1]}, Email: {row[2]}")
+        print_users(find_friends(conn, user_id))
     except mysql.connector.Error as err:
         print("Error viewing friends:", err)
 
 
+def view_suggestions(conn, user_id):
+    """
+    List people you may know, by the number of friends you have in common.
+    """
+    try:
+        suggestions = find_suggestions(conn, user_id)
+    except mysql.connector.Error as err:
+        print("Error finding people you may know:", err)
+        return
+    print("People you may know:")
+    if not suggestions:
+        print("No suggestions yet. Add some friends first!")
+    else:
+        print_suggestions(suggestions)
+
+
 def search_friends_by_name(conn, name):
     """
     Get search results for friends by name.
     """
-    results = find_friends_by_name(conn, name)
+    try:
+        results = find_friends_by_name(conn, name)
+    except mysql.connector.Error as err:
+        print("Error finding friends by name:", err)
+        results = []
     print("Search Results:")
     if not results:
         print("No friends found.")
     else:
-        for row in results:
-            print(f"ID: #{row[0]}, Name: {row[1]}, Email: {row[2]}")
+        print_users(results)
         print()
 
 
@@ -101,7 +171,11 @@ def search_friend_by_email(conn, email):
     """
     Get search results for a friend by email.
     """
-    result = find_friend_by_email(conn, email)
+    try:
+        result = find_friend_by_email(conn, email)
+    except mysql.connector.Error as err:
+        print("Error finding friend by email:", err)
+        result = None
     if result:
         user_id, full_name, email = result
         print(f"User found | ID: #{user_id}, Name: {full_name}, Email: {email}\n")
@@ -109,6 +183,26 @@ def search_friend_by_email(conn, email):
         print("No users were found with that email.")
 
 
+# ----------------------------------------------------------------------
+# Display Functions
+# ----------------------------------------------------------------------
+def print_users(users):
+    """
+    Print a list of users (friends or search results).
+    """
+    for user_id, name, email in users:
+        print(f"ID: #{user_id}, Name: {name}, Email: {email}")
+
+
+def print_suggestions(suggestions):
+    """
+    Print suggested friends with their number of mutual friends.
+    """
+    for user_id, name, email, mutual_friends in suggestions:
+        plural = "friend" if mutual_friends == 1 else "friends"
+        print(f"ID: #{user_id}, Name: {name}, Email: {email} ({mutual_friends} mutual {plural})")
+
+
 # ----------------------------------------------------------------------
 # Command-Line Functionality
 # ----------------------------------------------------------------------
@@ -132,6 +226,18 @@ def add_friend_ui(conn, user_id, friend_id=None):
         add_friend(conn, user_id, friend_id)
 
 
+def add_friends_ui(conn, user_id):
+    """
+    Prompts a user to add several friends at once.
+    """
+    friend_ids = input("Enter your friends' user IDs, separated by spaces or commas: ")
+    friend_ids = friend_ids.replace(",", " ").split()
+    if not friend_ids or not all(friend_id.isdigit() for friend_id in friend_ids):
+        print("Invalid user IDs.")
+        return
+    add_friends(conn, user_id, [int(friend_id) for friend_id in friend_ids])
+
+
 def delete_friend_ui(conn, user_id, friend_id=None):
     """
     Prompts a user to delete a friend.
@@ -0,0 +1,313 @@
+"""
+Query instrumentation for the Goodreads database.
+
+Once enable() is called, every connection the pools in db.py open is
+wrapped so that each statement run on it is timed. For each statement
+(with whitespace and IN lists normalized, so the same query always counts
+as one) the latency histogram, row counts and errors are recorded; queries
+slower than SLOW_QUERY_MS are kept in a slow query log. Queries are also
+attributed to the user action that ran them (e.g. a menu option in app.py,
+or a request handler in server.py), set with set_action() or action(), so
+the number of round trips and the database time of each action can be
+compared.
+
+The metrics can be exported as JSON (to_dict) or in the Prometheus text
+format (to_prometheus).
+"""
+
+import datetime
+import json
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import mysql.connector
+import db
+
+# upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# queries at least this slow go to the slow query log
+SLOW_QUERY_MS = 100
+# number of slow queries kept
+SLOW_LOG_SIZE = 100
+
+# action of queries run outside any action
+NO_ACTION = '(none)'
+
+
+def normalize(sql):
+    """
+    Normalizes a statement so the same query always has the same text:
+    whitespace is collapsed and lists of placeholders are shortened.
+    """
+    sql = re.sub(r'\s+', ' ', sql).strip()
+    return re.sub(r'%s(?:\s*,\s*%s)+', '%s, ...', sql)
+
+
+class Metrics:
+    """
+    Thread-safe statistics of the statements run and the actions that ran
+    them.
+    """
+
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS, slow_log_path=None):
+        """
+        Args:
+            slow_query_ms (float, optional): threshold of the slow query log
+            slow_log_path (str, optional): file to also append slow queries
+                                           to, as JSON lines
+        """
+        self.slow_query_ms = slow_query_ms
+        self.slow_log_path = slow_log_path
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Clears every statistic.
+        """
+        with self._lock:
+            # statement -> count, errors, rows, total_ms and bucket counts
+            self.statements = {}
+            # action -> count, queries, rows and total_ms
+            self.actions = {}
+            self.slow_queries = deque(maxlen=SLOW_LOG_SIZE)
+
+    def action_started(self, action):
+        with self._lock:
+            self._action_stats(action)['count'] += 1
+
+    def record(self, statement, action, ms, rows, error=None):
+        """
+        Records one run of a statement.
+
+        Args:
+            statement (str): the normalized statement
+            action (str): the action that ran it
+            ms (float): how long it took, in milliseconds
+            rows (int): rows returned or affected
+            error (str, optional): the error, if it failed
+        """
+        bucket = next((i for i, bound in enumerate(BUCKETS_MS) if ms <= bound), len(BUCKETS_MS))
+        with self._lock:
+            stats = self.statements.get(statement)
+            if stats is None:
+                stats = self.statements[statement] = {
+                    'count': 0, 'errors': 0, 'rows': 0, 'total_ms': 0.0,
+                    'buckets': [0] * (len(BUCKETS_MS) + 1),
+                }
+            stats['count'] += 1
+            stats['rows'] += rows
+            stats['total_ms'] += ms
+            stats['buckets'][bucket] += 1
+            if error is not None:
+                stats['errors'] += 1
+
+            action_stats = self._action_stats(action)
+            action_stats['queries'] += 1
+            action_stats['rows'] += rows
+            action_stats['total_ms'] += ms
+
+            if ms >= self.slow_query_ms:
+                entry = {
+                    'time': datetime.datetime.now().isoformat(timespec='seconds'),
+                    'statement': statement,
+                    'action': action,
+                    'ms': round(ms, 3),
+                    'rows': rows,
+                    'error': error,
+                }
+                self.slow_queries.append(entry)
+                if self.slow_log_path:
+                    with open(self.slow_log_path, 'a') as f:
+                        f.write(json.dumps(entry) + '\n')
+
+    def _action_stats(self, action):
+        stats = self.actions.get(action)
+        if stats is None:
+            stats = self.actions[action] = {'count': 0, 'queries': 0, 'rows': 0, 'total_ms': 0.0}
+        return stats
+
+    # ------------------------------------------------------------------
+    # Exports
+    # ------------------------------------------------------------------
+    def to_dict(self):
+        """
+        Returns the metrics as a JSON-serializable dict, with statements and
+        actions sorted by total database time (most first).
+        """
+        with self._lock:
+            statements = [dict(stats, statement=statement, buckets_ms=list(BUCKETS_MS),
+                               mean_ms=stats['total_ms'] / stats['count'])
+                          for statement, stats in self.statements.items()]
+            actions = [dict(stats, action=action,
+                            queries_per_action=stats['queries'] / stats['count'] if stats['count'] else None)
+                       for action, stats in self.actions.items()]
+            slow_queries = list(self.slow_queries)
+        return {
+            'statements': sorted(statements, key=lambda s: -s['total_ms']),
+            'actions': sorted(actions, key=lambda a: -a['total_ms']),
+            'slow_queries': slow_queries,
+        }
+
+    def to_prometheus(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            statements = {statement: dict(stats) for statement, stats in self.statements.items()}
+            actions = {action: dict(stats) for action, stats in self.actions.items()}
+
+        lines = [
+            "# HELP goodreads_query_duration_seconds Latency of each SQL statement.",
+            "# TYPE goodreads_query_duration_seconds histogram",
+        ]
+        for statement, stats in statements.items():
+            label = f'statement="{escape(statement)}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS_MS + ('+Inf',), stats['buckets']):
+                cumulative += count
+                le = bound if bound == '+Inf' else bound / 1000
+                lines.append(f'goodreads_query_duration_seconds_bucket{{{label},le="{le}"}} {cumulative}')
+            lines.append(f"goodreads_query_duration_seconds_sum{{{label}}} {stats['total_ms'] / 1000}")
+            lines.append(f"goodreads_query_duration_seconds_count{{{label}}} {stats['count']}")
+        for name, key, help_text in (
+                ('goodreads_query_rows_total', 'rows', "Rows returned or affected by each SQL statement."),
+                ('goodreads_query_errors_total', 'errors', "Failed runs of each SQL statement.")):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for statement, stats in statements.items():
+                lines.append(f'{name}{{statement="{escape(statement)}"}} {stats[key]}')
+        for name, key, scale, help_text in (
+                ('goodreads_actions_total', 'count', 1, "Times each user action was run."),
+                ('goodreads_action_queries_total', 'queries', 1, "SQL round trips made by each user action."),
+                ('goodreads_action_query_seconds_total', 'total_ms', 1000,
+                 "Database time spent by each user action.")):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for action, stats in actions.items():
+                lines.append(f'{name}{{action="{escape(action)}"}} {stats[key] / scale}')
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path):
+        """
+        Writes the metrics (see to_dict) to a file.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+def escape(value):
+    """
+    Escapes a Prometheus label value.
+    """
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# the metrics of this process
+metrics = Metrics()
+
+
+# ----------------------------------------------------------------------
+# User Actions
+# ----------------------------------------------------------------------
+_local = threading.local()
+
+
+def current_action():
+    """
+    Returns the action this thread's queries are attributed to.
+    """
+    return getattr(_local, 'action', NO_ACTION)
+
+
+def set_action(name):
+    """
+    Attributes this thread's queries to an action from now on, e.g. when a
+    user picks a menu option.
+    """
+    _local.action = name
+    metrics.action_started(name)
+
+
+@contextmanager
+def action(name):
+    """
+    Context manager that attributes this thread's queries to an action
+    until it exits, e.g. for the handling of one request.
+    """
+    previous = current_action()
+    set_action(name)
+    try:
+        yield
+    finally:
+        _local.action = previous
+
+
+# ----------------------------------------------------------------------
+# Connection Wrappers
+# ----------------------------------------------------------------------
+class InstrumentedCursor:
+    """
+    A cursor that times every statement it runs. Cursors are buffered, so
+    a statement's time includes fetching its rows.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=(), *args, **kwargs):
+        return self._timed(sql, self._cursor.execute, sql, params, *args, **kwargs)
+
+    def executemany(self, sql, seq_params, *args, **kwargs):
+        return self._timed(sql, self._cursor.executemany, sql, seq_params, *args, **kwargs)
+
+    def _timed(self, sql, function, *args, **kwargs):
+        start = time.perf_counter()
+        error = None
+        try:
+            return function(*args, **kwargs)
+        except mysql.connector.Error as err:
+            error = str(err)
+            raise
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            rows = max(self._cursor.rowcount or 0, 0) if error is None else 0
+            metrics.record(normalize(sql), current_action(), ms, rows, error)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """
+    Stands in for a connection, handing out InstrumentedCursors.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        kwargs.setdefault('buffered', True)
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def enable(slow_query_ms=SLOW_QUERY_MS, slow_log_path=None):
+    """
+    Instruments every connection db.py opens from now on (so call it before
+    the first connection is made).
+
+    Args:
+        slow_query_ms (float, optional): threshold of the slow query log
+        slow_log_path (str, optional): file to also append slow queries to
+    """
+    metrics.slow_query_ms = slow_query_ms
+    metrics.slow_log_path = slow_log_path
+    db.set_connection_wrapper(InstrumentedConnection)
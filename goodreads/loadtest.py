@@ -0,0 +1,537 @@
+"""
+Load-testing harness for the Goodreads database, driven by app transcripts.
+
+Transcripts of app.py sessions (like example_client_flow.txt and
+example_admin_flow.txt) are turned into scripts of operations: each menu
+choice and answer to a prompt becomes the data-access call the app makes
+for it (a book search, a book page, a shelf listing, ...). The scripts are
+then replayed as many concurrent sessions, each as a synthetic user picked
+from gen_csvs/user_info.csv, over a shared connection pool. The users,
+shelves and friends in a transcript are mapped onto the synthetic user's
+own (shelves by name) and onto other random users.
+
+Reports the latency percentiles (p50/p95/p99) and throughput of each
+operation. Use --save to keep a report and --baseline to compare against
+a saved one: the run fails if any operation's p95 got more than
+REGRESSION_TOLERANCE times slower. With --profile, queries are
+instrumented (see instrument.py) and the database time and round trips of
+each operation are reported too.
+
+Only reads are replayed unless --writes is given; then reviews, shelf
+changes and friends are replayed too (on the synthetic users' data).
+Creating accounts and the admin's catalog changes are never replayed.
+
+Usage:
+    python3 goodreads/loadtest.py [TRANSCRIPT ...] [--sessions N] [--workers N]
+                                  [--writes] [--save FILE] [--baseline FILE]
+                                  [--profile FILE]
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import mysql.connector
+import books
+import db
+import friends
+import instrument
+import reviews
+import shelf
+import users
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TRANSCRIPTS = [os.path.join(REPO_DIR, 'example_client_flow.txt'),
+                       os.path.join(REPO_DIR, 'example_admin_flow.txt')]
+USERS_CSV = os.path.join(REPO_DIR, 'gen_csvs', 'user_info.csv')
+
+DEFAULT_SESSIONS = 1000
+DEFAULT_WORKERS = 16
+# a p95 more than this many times the baseline's is a regression
+REGRESSION_TOLERANCE = 1.2
+
+# prompts of app.py whose answers the scripts need, and what they answer
+PROMPTS = [
+    ("What is your email? ", 'email'),
+    ("What is your password? ", 'password'),
+    ("Enter the title of the book to search for: ", 'title'),
+    ("Enter the author of the book to search for: ", 'author'),
+    ("Enter the ISBN of the book to open: ", 'isbn'),
+    ("Enter the ISBN of the book to add: ", 'isbn'),
+    ("Enter the ISBN of the book to remove: ", 'isbn'),
+    ("Enter the ISBN of the book to delete: ", 'isbn'),
+    ("Enter your star rating (1-5): ", 'star_rating'),
+    ("Enter your review: ", 'review_text'),
+    ("What is your reading speed (words per minute)? Press enter if you don't know:", 'wpm'),
+    ("Enter the ID of the shelf to add the book to: ", 'shelf_id'),
+    ("Enter the id of the shelf to display: ", 'shelf_id'),
+    ("Enter the id of the shelf to remove the book from: ", 'shelf_id'),
+    ("Enter the id of the shelf to delete: ", 'shelf_id'),
+    ("Enter the id of the shelf: ", 'shelf_id'),
+    ("Enter the name of the new shelf: ", 'shelf_name'),
+    ("Enter the name of the friend to search for: ", 'name'),
+    ("Enter the email of the friend to search for: ", 'search_email'),
+    ("What is your friend's user ID? ", 'friend_id'),
+    ("Enter the user ID of the friend to view: ", 'user_id'),
+]
+
+MENU_OPTION = re.compile(r'^\s*\((\w)\) (.+)$')
+SHELF_LINE = re.compile(r'^Shelf ID: (\d+) \| Shelf Name: (.+)$')
+PROFILE_LINE = re.compile(r'^ID: #(\d+) \| Joined')
+
+# operations that change the database, only replayed with --writes
+WRITE_OPERATIONS = {'add friend', 'remove friend', 'rate book', 'add to shelf',
+                    'remove from shelf', 'create shelf', 'delete shelf'}
+# operations that are never replayed
+SKIPPED_OPERATIONS = {'create account', 'add book', 'delete book'}
+
+
+# ----------------------------------------------------------------------
+# Transcripts
+# ----------------------------------------------------------------------
+def read_events(path):
+    """
+    Reads a transcript as a list of events: ('option', label) for each menu
+    choice, ('answer', key, value) for each answer to a prompt in PROMPTS,
+    ('profile', user ID) for each profile page shown and ('shelf', shelf
+    ID, name) for each shelf listed.
+    """
+    events = []
+    options = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            match = MENU_OPTION.match(line)
+            if match:
+                options[match.group(1)] = match.group(2)
+                continue
+            if line.startswith("Enter an option: "):
+                choice = line[len("Enter an option: "):].strip().lower()
+                events.append(('option', options.get(choice)))
+                options = {}
+                continue
+            match = PROFILE_LINE.match(line)
+            if match:
+                events.append(('profile', int(match.group(1))))
+                continue
+            match = SHELF_LINE.match(line)
+            if match:
+                events.append(('shelf', int(match.group(1)), match.group(2)))
+                continue
+            for prompt, key in PROMPTS:
+                if line.startswith(prompt.rstrip()):
+                    events.append(('answer', key, line[len(prompt.rstrip()):].strip()))
+                    break
+    return events
+
+
+def build_script(events):
+    """
+    Turns the events of a transcript into the operations the app ran.
+
+    Users are given as 'self' (the transcript's logged-in user) or 'other',
+    and shelves as (owner, shelf name), so they can be mapped onto the
+    synthetic users of a replay.
+
+    Returns:
+        list: (operation name, dict of arguments) tuples
+    """
+    script = []
+    label = None
+    own_id = None
+    page_user = None
+    isbn = None
+    answers = {}
+    # shelf ID -> (owner, name), from the shelves listed so far
+    shelves = {}
+
+    def role(user_id):
+        return 'self' if user_id == own_id else 'other'
+
+    def shelf_ref(shelf_id):
+        return shelves.get(int(shelf_id), ('self', None)) if shelf_id.isdigit() else ('self', None)
+
+    def add(operation, **args):
+        script.append((operation, args))
+
+    for event in events:
+        kind = event[0]
+        if kind == 'option':
+            label = event[1]
+            if label == "Go to your profile":
+                own_id = None
+                add('profile', user='self')
+            elif label == "View shelves":
+                add('view shelves', user=role(page_user))
+            elif label == "View current friends":
+                add('view friends')
+            elif label == "Read reviews":
+                add('read reviews', isbn=isbn)
+            elif label == "Create an account":
+                add('create account')
+            elif label == "Add a book":
+                add('add book')
+        elif kind == 'profile':
+            page_user = event[1]
+            if own_id is None:
+                own_id = page_user
+        elif kind == 'shelf':
+            owner = 'self' if page_user is None or label != "View shelves" else role(page_user)
+            shelves[event[1]] = (owner, event[2])
+        else:
+            key, value = event[1], event[2]
+            answers[key] = value
+            if key == 'password':
+                add('log in')
+            elif key == 'title':
+                add('search books by title', title=value)
+            elif key == 'author':
+                add('search books by author', author=value)
+            elif key == 'isbn':
+                isbn = value
+                if label == "Open a book's page":
+                    add('book page', isbn=isbn)
+                elif label == "Remove a book from a shelf":
+                    add('remove from shelf', isbn=isbn, shelf=shelf_ref(answers.get('shelf_id', '')))
+                elif label == "Delete a book":
+                    add('delete book')
+            elif key == 'review_text':
+                add('rate book', isbn=isbn, star_rating=answers.get('star_rating'))
+            elif key == 'wpm':
+                wpm = int(value) if value.isdigit() else None
+                if label == "Get a reading time estimate":
+                    add('reading time', isbn=isbn, wpm=wpm)
+                else:
+                    add('shelf reading time', shelf=shelf_ref(answers.get('shelf_id', '')), wpm=wpm)
+            elif key == 'shelf_id':
+                if label in ("Add to shelf", "Add a book to a shelf"):
+                    add('add to shelf', isbn=isbn, shelf=shelf_ref(value))
+                elif label in ("View shelves", "Display all books on a shelf"):
+                    add('books on a shelf', shelf=shelf_ref(value))
+                elif label == "Delete a shelf":
+                    add('delete shelf', shelf=shelf_ref(value))
+            elif key == 'shelf_name':
+                add('create shelf', name=value)
+            elif key == 'name':
+                add('search users by name', name=value)
+            elif key == 'search_email':
+                add('search users by email')
+            elif key == 'friend_id':
+                if label == "Add a friend":
+                    add('add friend')
+                elif label == "Remove a friend":
+                    add('remove friend')
+            elif key == 'user_id':
+                add('profile', user='other')
+    return script
+
+
+# ----------------------------------------------------------------------
+# Replaying Sessions
+# ----------------------------------------------------------------------
+def read_users(path=USERS_CSV):
+    """
+    Returns the emails of the synthetic users in user_info.csv.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        return [row['email'] for row in csv.DictReader(f)]
+
+
+class Session:
+    """
+    One replay of a script, as a synthetic user.
+    """
+
+    def __init__(self, conn, email, other_email, writes):
+        self.conn = conn
+        self.email = email
+        self.writes = writes
+        self.user_id = None
+        self.other_email = other_email
+        self.other_id = None
+        # (owner, shelf name) -> shelf ID
+        self.shelves = {}
+
+    def user(self, who):
+        return self.user_id if who == 'self' else self.other_id
+
+    def shelf(self, ref):
+        """
+        Maps a transcript's shelf onto the owner's shelf of the same name
+        (or any of their shelves, for names they don't have).
+        """
+        owner, name = ref
+        if (owner, name) not in self.shelves:
+            found = shelf.find_shelves(self.conn, self.user(owner))
+            for shelf_id, shelf_name in found:
+                self.shelves[(owner, shelf_name)] = shelf_id
+            if (owner, name) not in self.shelves:
+                self.shelves[(owner, name)] = found[0].shelf_id if found else 0
+        return self.shelves[(owner, name)]
+
+    def run(self, operation, args):
+        """
+        Runs one operation of a script, the way the app does.
+        """
+        conn = self.conn
+        if operation == 'log in':
+            cursor = conn.cursor()
+            cursor.execute("SELECT authenticate(%s, %s)", (self.email, 'password'))
+            cursor.fetchone()
+            cursor.execute("SELECT user_id, is_admin FROM user_info WHERE email = %s", (self.email,))
+            cursor.fetchone()
+        elif operation == 'profile':
+            users.find_user(conn, self.user(args['user']))
+        elif operation == 'view shelves':
+            shelf.find_shelves(conn, self.user(args['user']))
+        elif operation == 'books on a shelf':
+            shelf.find_shelf_books(conn, self.shelf(args['shelf']))
+        elif operation == 'shelf reading time':
+            shelf.find_shelf_reading_time(conn, self.shelf(args['shelf']), args['wpm'])
+        elif operation == 'view friends':
+            friends.find_friends(conn, self.user_id)
+        elif operation == 'search users by name':
+            friends.find_friends_by_name(conn, args['name'])
+        elif operation == 'search users by email':
+            friends.find_friend_by_email(conn, self.other_email)
+        elif operation == 'search books by title':
+            books.find_books_by_title(conn, args['title'])
+        elif operation == 'search books by author':
+            books.find_books_by_author(conn, args['author'])
+        elif operation == 'book page':
+            books.find_book_summary(conn, args['isbn'])
+        elif operation == 'read reviews':
+            reviews.find_reviews(conn, args['isbn'])
+        elif operation == 'reading time':
+            books.find_reading_time(conn, args['isbn'], args['wpm'])
+        elif operation == 'add friend':
+            friends.add_friend(conn, self.user_id, self.other_id)
+        elif operation == 'remove friend':
+            friends.delete_friend(conn, self.user_id, self.other_id)
+        elif operation == 'rate book':
+            # sessions can share a user, so don't check-then-insert (and
+            # never hit add_review's prompt)
+            reviews.save_review(conn, self.user_id, args['isbn'], args['star_rating'] or '5', None)
+        elif operation == 'add to shelf':
+            shelf.add_book_to_shelf(conn, args['isbn'], self.user_id, self.shelf(args['shelf']))
+        elif operation == 'remove from shelf':
+            shelf.delete_book_from_shelf(conn, args['isbn'], self.user_id, self.shelf(args['shelf']))
+        elif operation == 'create shelf':
+            shelf.create_shelf(conn, self.user_id, args['name'])
+            self.shelves = {}
+        elif operation == 'delete shelf':
+            shelf.delete_shelf(conn, self.user_id, self.shelf(args['shelf']))
+            self.shelves = {}
+
+    def replay(self, script, results):
+        """
+        Runs a script, recording (operation, seconds, error or None) for
+        each operation in results.
+        """
+        for email, attribute in ((self.email, 'user_id'), (self.other_email, 'other_id')):
+            user = friends.find_friend_by_email(self.conn, email)
+            setattr(self, attribute, user.user_id if user else None)
+        for operation, args in script:
+            if operation in SKIPPED_OPERATIONS or (operation in WRITE_OPERATIONS and not self.writes):
+                continue
+            start = time.perf_counter()
+            try:
+                with instrument.action(operation):
+                    self.run(operation, args)
+                error = None
+            except mysql.connector.Error as err:
+                error = str(err)
+            except Exception as err:
+                # a bug in one operation shouldn't end the whole run
+                error = f"{type(err).__name__}: {err}"
+            results.append((operation, time.perf_counter() - start, error))
+
+
+def run_sessions(scripts, emails, num_sessions, workers, writes, seed=None):
+    """
+    Replays scripts as concurrent sessions of random synthetic users.
+
+    Returns:
+        (list, float): (operation, seconds, error) for every operation run,
+                       and the wall-clock seconds of the whole run
+    """
+    rng = random.Random(seed)
+    plans = [(rng.choice(scripts), rng.choice(emails), rng.choice(emails))
+             for _ in range(num_sessions)]
+    pool = db.ConnectionPool(size=workers, **db.DB_CONFIG)
+    results = []
+    lock = threading.Lock()
+
+    def replay(plan):
+        script, email, other_email = plan
+        session_results = []
+        start = time.perf_counter()
+        try:
+            with pool.connection() as conn:
+                Session(conn, email, other_email, writes).replay(script, session_results)
+        except Exception as err:
+            # e.g. no connection became free; keep what the session did
+            session_results.append(('start session', time.perf_counter() - start,
+                                    f"{type(err).__name__}: {err}"))
+        with lock:
+            results.extend(session_results)
+
+    start = time.perf_counter()
+    try:
+        # the modules print status messages, which would drown the report
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for future in [executor.submit(replay, plan) for plan in plans]:
+                    future.result()
+    finally:
+        pool.close()
+    return results, time.perf_counter() - start
+
+
+# ----------------------------------------------------------------------
+# Reports
+# ----------------------------------------------------------------------
+def percentile(sorted_values, p):
+    """
+    Returns the p-th percentile (nearest rank) of a sorted list.
+    """
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(results, elapsed):
+    """
+    Computes each operation's latency percentiles and throughput.
+
+    Returns:
+        dict: maps each operation to its count, errors, p50/p95/p99 (in
+              milliseconds) and ops_per_sec, with the totals under 'all'
+    """
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    for operation, seconds, error in results:
+        latencies[operation].append(seconds * 1000)
+        latencies['all'].append(seconds * 1000)
+        if error:
+            errors[operation] += 1
+            errors['all'] += 1
+    summary = {}
+    for operation, values in latencies.items():
+        values.sort()
+        summary[operation] = {
+            'count': len(values),
+            'errors': errors[operation],
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'p99': percentile(values, 99),
+            'ops_per_sec': len(values) / elapsed if elapsed > 0 else 0,
+        }
+    return summary
+
+
+def print_summary(summary, elapsed, num_sessions):
+    """
+    Prints a table of each operation's latencies and throughput.
+    """
+    print(f"{num_sessions} sessions in {elapsed:.2f}s ({num_sessions / elapsed:.1f} sessions/s)\n")
+    print(f"{'operation':<24} {'count':>7} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'ops/s':>8}")
+    for operation in sorted(summary, key=lambda op: (op == 'all', op)):
+        s = summary[operation]
+        print(f"{operation:<24} {s['count']:>7} {s['errors']:>6} {s['p50']:>8.2f} "
+              f"{s['p95']:>8.2f} {s['p99']:>8.2f} {s['ops_per_sec']:>8.1f}")
+
+
+def print_profile(profile):
+    """
+    Prints each operation's queries and database time, most time first.
+    """
+    print(f"\n{'operation':<24} {'queries/op':>10} {'db ms total':>12} {'db ms/op':>9}")
+    for stats in profile['actions']:
+        if stats['count']:
+            print(f"{stats['action']:<24} {stats['queries_per_action']:>10.1f} "
+                  f"{stats['total_ms']:>12.1f} {stats['total_ms'] / stats['count']:>9.2f}")
+
+
+def find_regressions(summary, baseline):
+    """
+    Compares a run's p95 latencies with a saved baseline.
+
+    Returns:
+        list: (operation, baseline p95, new p95) of each operation more than
+              REGRESSION_TOLERANCE times slower than the baseline
+    """
+    return [(operation, baseline[operation]['p95'], s['p95'])
+            for operation, s in summary.items()
+            if operation in baseline
+            and s['p95'] > baseline[operation]['p95'] * REGRESSION_TOLERANCE]
+
+
+# ----------------------------------------------------------------------
+# Main Program
+# ----------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Replay app transcripts as concurrent sessions.")
+    parser.add_argument('transcripts', nargs='*', default=DEFAULT_TRANSCRIPTS,
+                        help="app transcripts to replay (default: the example flows)")
+    parser.add_argument('--sessions', type=int, default=DEFAULT_SESSIONS,
+                        help="number of sessions to replay")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="number of sessions to run at once")
+    parser.add_argument('--writes', action='store_true',
+                        help="also replay reviews, shelf changes and friends")
+    parser.add_argument('--seed', type=int, help="seed for picking scripts and users")
+    parser.add_argument('--save', help="save the report as JSON to this file")
+    parser.add_argument('--baseline', help="fail if slower than this saved report")
+    parser.add_argument('--profile', help="instrument queries and save their metrics to this file")
+    args = parser.parse_args()
+
+    try:
+        scripts = [build_script(read_events(path)) for path in args.transcripts]
+        emails = read_users()
+        baseline = None
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+    except (OSError, ValueError) as err:
+        print("Error reading input:", err)
+        sys.exit(1)
+
+    if args.profile:
+        instrument.enable()
+    try:
+        results, elapsed = run_sessions(scripts, emails, max(1, args.sessions),
+                                        max(1, args.workers), args.writes, args.seed)
+    except mysql.connector.Error as err:
+        print("Error connecting to the database:", err)
+        sys.exit(1)
+
+    summary = summarize(results, elapsed)
+    print_summary(summary, elapsed, max(1, args.sessions))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if args.profile:
+        profile = instrument.metrics.to_dict()
+        print_profile(profile)
+        with open(args.profile, 'w') as f:
+            json.dump(profile, f, indent=2)
+
+    if baseline is not None:
+        regressions = find_regressions(summary, baseline)
+        for operation, before, after in regressions:
+            print(f"Regression: {operation} p95 went from {before:.2f} ms to {after:.2f} ms.")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
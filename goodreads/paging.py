@@ -0,0 +1,111 @@
+"""
+Keyset pagination for the Goodreads modules.
+
+Long listings (search results, shelves, reviews) are fetched a page at a
+time. Each page query is ordered by a unique key and returns one row more
+than the page size; if that extra row is there, the key of the page's last
+row becomes the page's continuation token, and the next page is the rows
+that sort after it. Unlike OFFSET, this reads only the rows it returns, no
+matter how deep into the results the page is.
+
+Tokens are strings so they can be handed to clients (e.g. by server.py)
+and passed back unchanged.
+"""
+
+from collections import namedtuple
+
+# number of results per page unless asked otherwise
+PAGE_SIZE = 20
+
+# A page of results; next is the continuation token for the following
+# page, or None if this is the last one.
+Page = namedtuple('Page', ['items', 'next'])
+
+
+class TokenError(ValueError):
+    """
+    A continuation token that wasn't made by this module.
+    """
+
+
+# ----------------------------------------------------------------------
+# Tokens
+# ----------------------------------------------------------------------
+def make_token(*key):
+    """
+    Makes a continuation token from the sort key of a row.
+    """
+    return ":".join(str(part) for part in key)
+
+
+def split_token(token, *types):
+    """
+    Splits a continuation token back into its sort key.
+
+    Args:
+        token (str): the token
+        *types: the type of each part of the key (e.g. float, str)
+
+    Returns:
+        tuple: the parts of the key
+
+    Raises:
+        TokenError: if the token doesn't have that form
+    """
+    parts = token.split(":", len(types) - 1)
+    if len(parts) != len(types):
+        raise TokenError(f"Invalid continuation token: {token!r}")
+    try:
+        return tuple(type_(part) for type_, part in zip(types, parts))
+    except ValueError:
+        raise TokenError(f"Invalid continuation token: {token!r}") from None
+
+
+# ----------------------------------------------------------------------
+# Fetching Pages
+# ----------------------------------------------------------------------
+def fetch_page(cursor, sql, params, page_size, make_record, key):
+    """
+    Runs a page query and builds its Page.
+
+    Args:
+        cursor (MySQL Cursor object): cursor to run the query on
+        sql (str): the query, ordered by its key and without a LIMIT
+        params (tuple): the query's parameters
+        page_size (int): number of rows per page
+        make_record (function): turns a row into a result record
+        key (function): gives a row's continuation token
+
+    Returns:
+        Page: the page
+    """
+    cursor.execute(sql + " LIMIT %s", (*params, page_size + 1))
+    rows = cursor.fetchall()
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_token = key(rows[-1])
+    else:
+        next_token = None
+    return Page([make_record(row) for row in rows], next_token)
+
+
+# ----------------------------------------------------------------------
+# Command-Line Functionality
+# ----------------------------------------------------------------------
+def page_through(fetch, show):
+    """
+    Shows results a page at a time, asking before fetching the next page.
+
+    Args:
+        fetch (function): takes a continuation token (None for the first
+                          page) and returns a Page
+        show (function): prints a list of results
+    """
+    page = fetch(None)
+    show(page.items)
+    while page.next is not None:
+        more = input("Show more results? (y/n) ").strip().lower()
+        if more != "y":
+            break
+        page = fetch(page.next)
+        show(page.items)
@@ -0,0 +1,361 @@
+"""
+Parallel bulk loader for the Goodreads database.
+
+A faster alternative to `source load-data.sql;` for loading gen_csvs/ into
+freshly created tables (after setup.sql). It runs the same LOAD DATA
+statements as load-data.sql, but:
+
+  1. drops the secondary indexes (the FULLTEXT ones, the indexes of
+     foreign keys and the other non-unique ones) and the foreign keys, so
+     rows are loaded without maintaining indexes or checking references;
+  2. loads the tables nothing refers to first (book, user_info, genre,
+     author) and then the rest, each wave concurrently over several
+     connections;
+  3. rebuilds the dropped indexes and foreign keys (without rechecking
+     them) and runs setup-indexes.sql, building each index once over all
+     the rows;
+  4. validates every foreign key by looking for orphaned rows, since they
+     weren't checked while loading.
+
+Primary keys and unique indexes are kept, since they decide which rows are
+loaded. Each phase is timed. Afterwards, continue with setup-passwords.sql,
+setup-routines.sql and grant-permissions.sql as usual. The MySQL server
+needs local_infile enabled, as for load-data.sql.
+
+The app's appadmin login only exists once grant-permissions.sql has run, so
+on a fresh database log in with an account that can alter the tables, e.g.
+--user root (the password is asked for if not given).
+
+Usage:
+    python3 goodreads/parallel_load.py [--workers N] [--user USER] [--password PASSWORD]
+"""
+
+import argparse
+import getpass
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import mysql.connector
+import db
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOAD_SCRIPT = os.path.join(REPO_DIR, 'load-data.sql')
+INDEX_SCRIPT = os.path.join(REPO_DIR, 'setup-indexes.sql')
+
+# tables loaded in the first wave; every other table refers to them
+PARENT_TABLES = ['book', 'user_info', 'genre', 'author']
+
+DEFAULT_WORKERS = 4
+
+
+# ----------------------------------------------------------------------
+# SQL Scripts
+# ----------------------------------------------------------------------
+def read_statements(path):
+    """
+    Splits a SQL script into statements, following DELIMITER lines the way
+    the mysql client does. Comment-only statements are left out.
+    """
+    statements = []
+    delimiter = ';'
+    lines = []
+    with open(path) as f:
+        for line in f:
+            if line.strip().upper().startswith('DELIMITER '):
+                delimiter = line.split()[1]
+                continue
+            lines.append(line)
+            if line.rstrip().endswith(delimiter):
+                statement = ''.join(lines).rstrip()[:-len(delimiter)]
+                lines = []
+                code = [l for l in statement.splitlines()
+                        if l.strip() and not l.strip().startswith(('--', '#'))]
+                if code:
+                    statements.append(statement)
+    return statements
+
+
+def load_statements():
+    """
+    Reads the LOAD DATA statements of load-data.sql, with the CSV paths made
+    absolute.
+
+    Returns:
+        dict: maps each table name to its LOAD DATA statement
+    """
+    csv_dir = os.path.join(REPO_DIR, 'gen_csvs') + '/'
+    statements = {}
+    for statement in read_statements(LOAD_SCRIPT):
+        match = re.search(r'INTO TABLE (\w+)', statement)
+        if match:
+            statements[match.group(1)] = statement.replace("'gen_csvs/", f"'{csv_dir}")
+    return statements
+
+
+# ----------------------------------------------------------------------
+# Phases
+# ----------------------------------------------------------------------
+def index_exists(cursor, table, index):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+    """, (table, index))
+    return cursor.fetchone()[0] > 0
+
+
+def find_deferred_indexes(cursor):
+    """
+    Finds the indexes that are dropped for the load: every index that isn't
+    the primary key or unique.
+
+    Returns:
+        list: (table, index name, definition) for each index
+    """
+    cursor.execute("""
+        SELECT table_name, index_name, index_type, column_name, sub_part
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND non_unique = 1
+        ORDER BY table_name, index_name, seq_in_index
+    """)
+    indexes = {}
+    for table, index, index_type, column, sub_part in cursor.fetchall():
+        kind = 'FULLTEXT INDEX' if index_type == 'FULLTEXT' else 'INDEX'
+        columns = indexes.setdefault((table, index, kind), [])
+        columns.append(f"{column}({sub_part})" if sub_part else column)
+    return [(table, index, f"{kind} {index} ({', '.join(columns)})")
+            for (table, index, kind), columns in indexes.items()]
+
+
+def find_foreign_keys(cursor):
+    """
+    Finds every foreign key of the database.
+
+    Returns:
+        list: (table, constraint name, definition) for each foreign key
+    """
+    cursor.execute("""
+        SELECT k.table_name, k.constraint_name, k.column_name, k.referenced_table_name,
+               k.referenced_column_name, r.update_rule, r.delete_rule
+        FROM information_schema.key_column_usage AS k
+        JOIN information_schema.referential_constraints AS r
+            ON r.constraint_schema = k.constraint_schema
+            AND r.constraint_name = k.constraint_name
+        WHERE k.table_schema = DATABASE() AND k.referenced_table_name IS NOT NULL
+        ORDER BY k.table_name, k.constraint_name, k.ordinal_position
+    """)
+    keys = {}
+    for table, name, column, ref_table, ref_column, on_update, on_delete in cursor.fetchall():
+        key = keys.setdefault((table, name), {'columns': [], 'ref_table': ref_table,
+                                              'ref_columns': [], 'on_update': on_update,
+                                              'on_delete': on_delete})
+        key['columns'].append(column)
+        key['ref_columns'].append(ref_column)
+    return [(table, name,
+             f"CONSTRAINT {name} FOREIGN KEY ({', '.join(key['columns'])}) "
+             f"REFERENCES {key['ref_table']} ({', '.join(key['ref_columns'])}) "
+             f"ON DELETE {key['on_delete']} ON UPDATE {key['on_update']}")
+            for (table, name), key in keys.items()]
+
+
+def by_table(definitions):
+    """
+    Groups (table, name, definition) tuples by table.
+    """
+    tables = {}
+    for table, name, definition in definitions:
+        tables.setdefault(table, []).append((name, definition))
+    return tables
+
+
+def drop_deferred(conn, indexes, foreign_keys):
+    """
+    Drops the foreign keys and then the indexes (some of which the foreign
+    keys need), one ALTER TABLE per table.
+    """
+    cursor = conn.cursor()
+    for table, keys in by_table(foreign_keys).items():
+        cursor.execute(f"ALTER TABLE {table} "
+                       + ", ".join(f"DROP FOREIGN KEY {name}" for name, definition in keys))
+    for table, table_indexes in by_table(indexes).items():
+        cursor.execute(f"ALTER TABLE {table} "
+                       + ", ".join(f"DROP INDEX {name}" for name, definition in table_indexes))
+
+
+def load_table(pool, table, statement):
+    """
+    Loads one table on its own connection, with foreign key checks off.
+
+    Returns:
+        (str, int, float): the table, the number of rows loaded, and seconds
+    """
+    start = time.perf_counter()
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SET SESSION foreign_key_checks = 0")
+        try:
+            cursor.execute(statement)
+            rows = cursor.rowcount
+            conn.commit()
+        finally:
+            cursor.execute("SET SESSION foreign_key_checks = 1")
+    return table, rows, time.perf_counter() - start
+
+
+def load_wave(pool, statements, tables):
+    """
+    Loads some tables concurrently, printing each table's row count and time.
+    """
+    with ThreadPoolExecutor(max_workers=pool.size) as executor:
+        futures = [executor.submit(load_table, pool, table, statements[table])
+                   for table in tables]
+        for future in futures:
+            table, rows, seconds = future.result()
+            print(f"    {table}: {rows} rows in {seconds:.2f}s")
+
+
+def build_deferred(conn, indexes, foreign_keys):
+    """
+    Rebuilds the dropped indexes, then the foreign keys. Foreign key checks
+    are off, so adding a key doesn't scan for orphans; find_orphans() checks
+    them all afterwards.
+    """
+    cursor = conn.cursor()
+    for table, table_indexes in by_table(indexes).items():
+        missing = [(name, definition) for name, definition in table_indexes
+                   if not index_exists(cursor, table, name)]
+        # InnoDB builds one FULLTEXT index per ALTER TABLE
+        plain = [definition for name, definition in missing if not definition.startswith('FULLTEXT')]
+        if plain:
+            cursor.execute(f"ALTER TABLE {table} " + ", ".join(f"ADD {d}" for d in plain))
+        for name, definition in missing:
+            if definition.startswith('FULLTEXT'):
+                cursor.execute(f"ALTER TABLE {table} ADD {definition}")
+    cursor.execute("SET SESSION foreign_key_checks = 0")
+    try:
+        for table, keys in by_table(foreign_keys).items():
+            cursor.execute(f"ALTER TABLE {table} "
+                           + ", ".join(f"ADD {definition}" for name, definition in keys))
+    finally:
+        cursor.execute("SET SESSION foreign_key_checks = 1")
+
+
+def build_indexes(conn):
+    cursor = conn.cursor()
+    for statement in read_statements(INDEX_SCRIPT):
+        cursor.execute(statement)
+
+
+def find_orphans(conn):
+    """
+    Checks every foreign key of the database for rows whose reference
+    doesn't exist.
+
+    Returns:
+        list: (table, column, referenced table, number of orphans) for each
+              foreign key that has orphaned rows
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT table_name, column_name, referenced_table_name, referenced_column_name
+        FROM information_schema.key_column_usage
+        WHERE table_schema = DATABASE() AND referenced_table_name IS NOT NULL
+    """)
+    orphans = []
+    for table, column, ref_table, ref_column in cursor.fetchall():
+        cursor.execute(f"""
+            SELECT COUNT(*) FROM {table} AS child
+            WHERE child.{column} IS NOT NULL
+            AND NOT EXISTS (SELECT * FROM {ref_table} AS parent
+                            WHERE parent.{ref_column} = child.{column})
+        """)
+        (count,) = cursor.fetchone()
+        if count:
+            orphans.append((table, column, ref_table, count))
+    return orphans
+
+
+# ----------------------------------------------------------------------
+# Main Program
+# ----------------------------------------------------------------------
+def run_load(workers, user=None, password=None):
+    """
+    Runs every phase of the load, printing the time each takes.
+
+    Args:
+        workers (int): number of tables to load at once
+        user (str, optional): MySQL user to log in as, instead of the app's
+        password (str, optional): that user's password
+
+    Returns:
+        bool: True if the data loaded and every foreign key is satisfied
+    """
+    statements = load_statements()
+    child_tables = [table for table in statements if table not in PARENT_TABLES]
+    config = dict(db.DB_CONFIG, allow_local_infile=True)
+    if user is not None:
+        config.update(user=user, password=password)
+    pool = db.ConnectionPool(size=workers, **config)
+    timings = []
+
+    def phase(name, function, *args):
+        print(f"{name}...")
+        start = time.perf_counter()
+        result = function(*args)
+        timings.append((name, time.perf_counter() - start))
+        return result
+
+    try:
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            indexes = find_deferred_indexes(cursor)
+            foreign_keys = find_foreign_keys(cursor)
+            phase("Dropping secondary indexes and foreign keys", drop_deferred,
+                  conn, indexes, foreign_keys)
+        try:
+            phase("Loading " + ", ".join(PARENT_TABLES), load_wave, pool, statements, PARENT_TABLES)
+            phase("Loading " + ", ".join(child_tables), load_wave, pool, statements, child_tables)
+        finally:
+            # put the schema back even if the load failed
+            with pool.connection() as conn:
+                phase("Rebuilding secondary indexes and foreign keys", build_deferred,
+                      conn, indexes, foreign_keys)
+        with pool.connection() as conn:
+            phase("Building indexes", build_indexes, conn)
+            orphans = phase("Validating foreign keys", find_orphans, conn)
+    finally:
+        pool.close()
+
+    print("\nPhase timings:")
+    for name, seconds in timings:
+        print(f"    {seconds:8.2f}s  {name}")
+    print(f"    {sum(seconds for name, seconds in timings):8.2f}s  total")
+
+    for table, column, ref_table, count in orphans:
+        print(f"{count} row(s) of {table} refer to a missing {ref_table} ({column}).")
+    return not orphans
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load gen_csvs/ into the database in parallel.")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="number of tables to load at once")
+    parser.add_argument('--user', help="MySQL user to log in as (default: the app's appadmin, "
+                                       "which exists only after grant-permissions.sql)")
+    parser.add_argument('--password', help="the user's password (asked for if --user is given)")
+    args = parser.parse_args()
+    password = args.password
+    if args.user is not None and password is None:
+        password = getpass.getpass(f"MySQL password for {args.user}: ")
+
+    try:
+        ok = run_load(max(1, args.workers), args.user, password)
+    except (OSError, mysql.connector.Error) as err:
+        print("Error loading data:", err)
+        ok = False
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+"""
+Book recommendations ("readers who liked this also liked") for the Goodreads
+database, by item-item collaborative filtering.
+
+Every user's ratings (review) and shelved books (on_shelf) form a sparse
+user x book matrix of interaction weights. Books are similar when the same
+users interact with them: the similarity of two books is the cosine of
+their columns of the matrix. For each book, its NUM_NEIGHBORS most similar
+books are precomputed into an index, which is rebuilt from the database
+in the background after INDEX_TTL seconds.
+
+A user's recommendations are then the books most similar to the ones they
+have rated and shelved, weighted by how much they liked them, leaving out
+the books they already have. Only the user's own books are queried for
+this; the index is only built from reviews and public shelves, so no one's
+private shelves affect what other users are recommended.
+"""
+
+import sys
+import threading
+import time
+import numpy as np
+import mysql.connector
+import books
+import db
+from records import Recommendation
+
+# seconds before the index is rebuilt from the database
+INDEX_TTL = 3600
+# similar books kept per book in the index
+NUM_NEIGHBORS = 50
+# interaction weight of a book on a shelf (a rating r counts r / 5)
+SHELF_WEIGHT = 0.6
+# ratings below this are dislikes: the book isn't recommended back, but
+# doesn't count towards similar books either
+MIN_LIKED_RATING = 3.0
+
+
+def gather(indptr, rows):
+    """
+    Returns the positions of the entries of some rows of a CSR matrix, i.e.
+    the concatenation of range(indptr[r], indptr[r + 1]) for each row r,
+    along with the index (into rows) of the row of each position.
+    """
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    row_of = np.repeat(np.arange(len(rows)), lengths)
+    # offset of each position within its row
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + offsets, row_of
+
+
+class RecommendationIndex:
+    """
+    The most similar books of every book, as CSR arrays: the neighbors of
+    book b are neighbors[indptr[b]:indptr[b + 1]], with similarities in the
+    same positions of similarities. Books are numbered by their position in
+    isbns.
+    """
+
+    def __init__(self, isbns, indptr, neighbors, similarities):
+        self.isbns = isbns
+        self.indptr = indptr
+        self.neighbors = neighbors
+        self.similarities = similarities
+        self.book_index = {isbn: b for b, isbn in enumerate(isbns)}
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def from_interactions(cls, user_ids, isbns, weights, num_neighbors=NUM_NEIGHBORS):
+        """
+        Builds the index from parallel arrays of (user, book, weight)
+        interactions. A repeated (user, book) pair counts once, with its
+        highest weight.
+        """
+        book_isbns, books_of = np.unique(np.asarray(isbns, dtype=str), return_inverse=True)
+        users_of = np.unique(np.asarray(user_ids, dtype=np.int64), return_inverse=True)[1]
+        weights = np.asarray(weights, dtype=np.float64)
+        num_books = len(book_isbns)
+        num_users = int(users_of.max(initial=-1)) + 1
+
+        # sort by (user, book, weight), keeping the last (highest) weight of
+        # each (user, book)
+        order = np.lexsort((weights, books_of, users_of))
+        users_of, books_of, weights = users_of[order], books_of[order], weights[order]
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = (users_of[1:] != users_of[:-1]) | (books_of[1:] != books_of[:-1])
+        users_of, books_of, weights = users_of[last], books_of[last], weights[last]
+
+        # the matrix by user (rows already sorted by user)...
+        user_indptr = np.zeros(num_users + 1, dtype=np.int64)
+        np.cumsum(np.bincount(users_of, minlength=num_users), out=user_indptr[1:])
+        user_books, user_weights = books_of, weights
+        # ...and by book
+        order = np.argsort(books_of, kind='stable')
+        book_indptr = np.zeros(num_books + 1, dtype=np.int64)
+        np.cumsum(np.bincount(books_of, minlength=num_books), out=book_indptr[1:])
+        book_users, book_weights = users_of[order], weights[order]
+        norms = np.sqrt(np.bincount(books_of, weights=weights ** 2, minlength=num_books))
+
+        indptr = np.zeros(num_books + 1, dtype=np.int64)
+        neighbor_lists = []
+        similarity_lists = []
+        for b in range(num_books):
+            start, end = book_indptr[b], book_indptr[b + 1]
+            # every (user, other book) interaction of b's users, weighted by
+            # the user's weight for b; summing them per book gives the dot
+            # products of b's column with the other columns
+            positions, row_of = gather(user_indptr, book_users[start:end])
+            products = book_weights[start:end][row_of] * user_weights[positions]
+            others, inverse = np.unique(user_books[positions], return_inverse=True)
+            dots = np.bincount(inverse, weights=products)
+            keep = (others != b) & (dots > 0)
+            others, dots = others[keep], dots[keep]
+            similarities = dots / (norms[b] * norms[others])
+            top = np.argsort(-similarities, kind='stable')[:num_neighbors]
+            neighbor_lists.append(others[top])
+            similarity_lists.append(similarities[top])
+            indptr[b + 1] = indptr[b] + len(top)
+
+        if neighbor_lists:
+            neighbors = np.concatenate(neighbor_lists)
+            similarities = np.concatenate(similarity_lists)
+        else:
+            neighbors = np.zeros(0, dtype=np.int64)
+            similarities = np.zeros(0)
+        return cls(book_isbns, indptr, neighbors, similarities)
+
+    @classmethod
+    def from_database(cls, conn):
+        """
+        Builds the index from every review and every public shelf.
+        """
+        user_ids, isbns, weights = load_interactions(conn)
+        return cls.from_interactions(user_ids, isbns, weights)
+
+    def recommend(self, liked, exclude=(), limit=10):
+        """
+        Scores books by their similarity to books a user likes.
+
+        Args:
+            liked (dict): maps the ISBNs the user likes to how much (weight)
+            exclude (iterable): ISBNs not to recommend (e.g. the user's books)
+            limit (int): maximum number of recommendations
+
+        Returns:
+            list: (ISBN, score) tuples, best first
+        """
+        liked = [(self.book_index[isbn], weight) for isbn, weight in liked.items()
+                 if isbn in self.book_index]
+        if not liked:
+            return []
+        rows = np.array([b for b, weight in liked], dtype=np.int64)
+        row_weights = np.array([weight for b, weight in liked], dtype=np.float64)
+        positions, row_of = gather(self.indptr, rows)
+        candidates, inverse = np.unique(self.neighbors[positions], return_inverse=True)
+        scores = np.bincount(inverse, weights=row_weights[row_of] * self.similarities[positions])
+
+        excluded = [self.book_index[isbn] for isbn in exclude if isbn in self.book_index]
+        keep = ~np.isin(candidates, np.array(excluded, dtype=np.int64))
+        candidates, scores = candidates[keep], scores[keep]
+        top = np.argsort(-scores, kind='stable')[:limit]
+        return [(str(self.isbns[candidates[i]]), float(scores[i])) for i in top]
+
+
+# ----------------------------------------------------------------------
+# Data Access Functions
+# ----------------------------------------------------------------------
+def interaction_weight(star_rating):
+    """
+    Returns how much a rating says a user liked a book: 0 for dislikes,
+    otherwise the rating out of 5.
+    """
+    star_rating = float(star_rating)
+    return star_rating / 5 if star_rating >= MIN_LIKED_RATING else 0.0
+
+
+def load_interactions(conn):
+    """
+    Reads every rating and every book on a public shelf.
+
+    Returns:
+        (list, list, list): parallel lists of user IDs, ISBNs and weights
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT user_id, isbn, star_rating FROM review")
+    user_ids, isbns, weights = [], [], []
+    for user_id, isbn, star_rating in cursor.fetchall():
+        weight = interaction_weight(star_rating)
+        if weight > 0:
+            user_ids.append(user_id)
+            isbns.append(isbn)
+            weights.append(weight)
+    cursor.execute("""
+        SELECT s.user_id, o.isbn FROM on_shelf AS o JOIN shelf AS s ON s.shelf_id = o.shelf_id
+        WHERE NOT s.is_private
+    """)
+    for user_id, isbn in cursor.fetchall():
+        user_ids.append(user_id)
+        isbns.append(isbn)
+        weights.append(SHELF_WEIGHT)
+    return user_ids, isbns, weights
+
+
+def find_user_books(conn, user_id):
+    """
+    Finds the books a user has rated or shelved (on any shelf, including
+    private ones).
+
+    Returns:
+        (dict, set): maps each book the user likes to how much, and the
+                     ISBNs of all of the user's books
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT isbn, star_rating FROM review WHERE user_id = %s", (user_id,))
+    liked = {}
+    seen = set()
+    for isbn, star_rating in cursor.fetchall():
+        seen.add(isbn)
+        weight = interaction_weight(star_rating)
+        if weight > 0:
+            liked[isbn] = weight
+    cursor.execute("""
+        SELECT DISTINCT o.isbn FROM on_shelf AS o JOIN shelf AS s ON s.shelf_id = o.shelf_id
+        WHERE s.user_id = %s
+    """, (user_id,))
+    for (isbn,) in cursor.fetchall():
+        # a rating says more than a shelf, in either direction
+        if isbn not in seen:
+            liked[isbn] = SHELF_WEIGHT
+            seen.add(isbn)
+    return liked, seen
+
+
+_index = None
+_index_lock = threading.Lock()
+# True while a background thread rebuilds the index
+_rebuilding = False
+
+
+def get_index(conn):
+    """
+    Returns the shared recommendation index. The first call builds it from
+    the database; once it is older than INDEX_TTL, it is rebuilt on a
+    background thread (with its own connection) and the old index is
+    returned until the new one is ready, so no request waits on a rebuild.
+    """
+    global _index, _rebuilding
+    with _index_lock:
+        if _index is None:
+            _index = RecommendationIndex.from_database(conn)
+        elif time.monotonic() - _index.built_at > INDEX_TTL and not _rebuilding:
+            _rebuilding = True
+            threading.Thread(target=rebuild_index, daemon=True).start()
+        return _index
+
+
+def rebuild_index():
+    """
+    Builds a new index from the database and swaps it in. If that fails,
+    the old index stays in use and the next request tries again.
+    """
+    global _index, _rebuilding
+    try:
+        with db.connection() as conn:
+            index = RecommendationIndex.from_database(conn)
+        with _index_lock:
+            _index = index
+    except mysql.connector.Error as err:
+        print("Error rebuilding the recommendation index:", err, file=sys.stderr)
+    finally:
+        with _index_lock:
+            _rebuilding = False
+
+
+def find_recommendations(conn, user_id, limit=10):
+    """
+    Finds the books most similar to the ones a user has liked, leaving out
+    books they have already rated or shelved.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        user_id (int): the user's ID
+        limit (int): maximum number of recommendations
+
+    Returns:
+        list: Recommendation records, best first
+    """
+    liked, seen = find_user_books(conn, user_id)
+    scored = get_index(conn).recommend(liked, exclude=seen, limit=limit)
+    titles = books.find_titles(conn, [isbn for isbn, score in scored])
+    # skip books deleted since the index was built
+    return [Recommendation(isbn, titles[isbn], round(score, 4))
+            for isbn, score in scored if isbn in titles]
+
+
+# ----------------------------------------------------------------------
+# Functions for Recommendation Actions
+# ----------------------------------------------------------------------
+def view_recommendations(conn, user_id):
+    """
+    List books a user might like to read next.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        user_id (int): the user's ID
+
+    Returns:
+        bool: True if any books were recommended
+    """
+    try:
+        recommendations = find_recommendations(conn, user_id)
+    except mysql.connector.Error as err:
+        print("Error finding recommendations:", err)
+        return False
+    if not recommendations:
+        print("No recommendations yet. Rate or shelve some books first!")
+        return False
+    print("Recommended for you:")
+    print_recommendations(recommendations)
+    return True
+
+
+# ----------------------------------------------------------------------
+# Display Functions
+# ----------------------------------------------------------------------
+def print_recommendations(recommendations):
+    """
+    Print recommended books.
+    """
+    for isbn, title, score in recommendations:
+        print(f"{isbn} | {title}")
@@ -0,0 +1,49 @@
+"""
+Lightweight result records returned by the data-access functions of the
+Goodreads modules.
+
+Records are named tuples, so they unpack like the rows they are built
+from, cost no more memory than a tuple, and convert to dictionaries with
+`_asdict()` (e.g. for JSON).
+"""
+
+from collections import namedtuple
+
+# Something a user did, for their friends' feeds: a review (kind 'review',
+# with star_rating) or a book added to a public shelf (kind 'shelf', with
+# shelf_name).
+Activity = namedtuple('Activity', ['user_id', 'name', 'kind', 'isbn', 'title',
+                                   'star_rating', 'shelf_name', 'time'])
+
+# A book in a list of results (search results, books on a shelf).
+BookListing = namedtuple('BookListing', ['isbn', 'title'])
+
+# A full row of the book table.
+Book = namedtuple('Book', ['isbn', 'title', 'publisher', 'year_published',
+                           'synopsis', 'language_code', 'num_pages',
+                           'cover_photo_url', 'series_name'])
+
+# Review statistics of a book, from book_review_stats.
+BookStats = namedtuple('BookStats', ['isbn', 'average_rating', 'num_ratings', 'num_reviews'])
+
+# Everything shown on a book's page; stats is None if the book has no ratings,
+# and reading_time (in minutes) is None if its page count isn't known.
+BookSummary = namedtuple('BookSummary', ['book', 'authors', 'genres', 'stats', 'reading_time'])
+
+# A review of a book.
+Review = namedtuple('Review', ['user_id', 'star_rating', 'review_text'])
+
+# A recommended book; score ranks recommendations (higher is better).
+Recommendation = namedtuple('Recommendation', ['isbn', 'title', 'score'])
+
+# A user's shelf.
+Shelf = namedtuple('Shelf', ['shelf_id', 'shelf_name'])
+
+# A user in a list of results (user search, friends).
+UserListing = namedtuple('UserListing', ['user_id', 'name', 'email'])
+
+# A suggested friend, with the number of friends they have in common with you.
+FriendSuggestion = namedtuple('FriendSuggestion', ['user_id', 'name', 'email', 'mutual_friends'])
+
+# A user's public profile.
+User = namedtuple('User', ['user_id', 'first_name', 'last_name', 'join_date'])
@@ -3,6 +3,81 @@ Review-related functions for the Goodreads database.
 """
 
 import mysql.connector
+import feed
+from paging import PAGE_SIZE, fetch_page, make_token, page_through, split_token
+from records import Review
+
+# ----------------------------------------------------------------------
+# Data Access Functions
+# ----------------------------------------------------------------------
+# These run queries and return records without printing anything; database
+# errors are raised to the caller.
+def has_reviewed(conn, user_id, isbn):
+    """
+    Checks whether a user has already reviewed a book.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        user_id (int): the user's ID
+        isbn (str): the ISBN of the book
+
+    Returns:
+        bool: True if the user has a review of the book
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM review WHERE user_id = %s AND isbn = %s", (user_id, isbn))
+    return cursor.fetchone()[0] > 0
+
+
+def find_reviews(conn, isbn, page_size=PAGE_SIZE, after=None):
+    """
+    Finds a page of the reviews of a book, oldest first.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        isbn (str): the ISBN of the book
+        page_size (int, optional): number of reviews per page
+        after (str, optional): continuation token from the previous page
+
+    Returns:
+        Page: Reviews of the book
+    """
+    cursor = conn.cursor()
+    sql = "SELECT user_id, star_rating, review_text, review_id FROM review WHERE isbn = %s"
+    params = (isbn,)
+    if after is not None:
+        (review_id,) = split_token(after, int)
+        sql += " AND review_id > %s"
+        params += (review_id,)
+    sql += " ORDER BY review_id"
+    return fetch_page(cursor, sql, params, page_size,
+                      lambda row: Review(*row[:3]), lambda row: make_token(row[3]))
+
+
+def save_review(conn, user_id, isbn, star_rating, review_text):
+    """
+    Adds a user's review of a book, or replaces it if they already have
+    one, in a single statement (so without asking, and without racing
+    another save of the same review). Commits the change.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        user_id (int): the user's ID
+        isbn (str): the ISBN of the book
+        star_rating (float): the star rating
+        review_text (str): the review text, or None
+    """
+    cursor = conn.cursor()
+    sql = """
+        INSERT INTO review (user_id, isbn, star_rating, review_text)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE star_rating = VALUES(star_rating),
+                                review_text = VALUES(review_text)
+    """
+    cursor.execute(sql, (user_id, isbn, star_rating, review_text))
+    conn.commit()
+    feed.activity_changed(user_id)
+
 
 # ----------------------------------------------------------------------
 # Functions for Review Operations
@@ -17,28 +92,33 @@ def add_review(conn, user_id, isbn, star_rating, review_text):
         isbn (str): the ISBN of the book to review
         star_rating (float): the star rating (1-5)
         review_text (str): the review text
+
+    Returns:
+        bool: True if a review was added or modified, False otherwise
     """
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT COUNT(*) FROM review WHERE user_id = %s AND isbn = %s", (user_id, isbn))
-        count = cursor.fetchone()[0]
-        if count > 0:
+        if has_reviewed(conn, user_id, isbn):
             modify = input("You have already reviewed this book. Do you want to modify your review? (y/n): ").strip().lower()
             if modify == "y":
                 sql = "UPDATE review SET star_rating = %s, review_text = %s WHERE user_id = %s AND isbn = %s"
                 cursor.execute(sql, (star_rating, review_text, user_id, isbn))
                 conn.commit()
+                feed.activity_changed(user_id)
                 print("Review modified successfully!")
-                return
+                return True
             else:
                 print("Review not modified.")
-                return
+                return False
         sql = "INSERT INTO review (user_id, isbn, star_rating, review_text) VALUES (%s, %s, %s, %s)"
         cursor.execute(sql, (user_id, isbn, star_rating, review_text))
         conn.commit()
+        feed.activity_changed(user_id)
         print("Review added successfully!")
+        return True
     except mysql.connector.Error as err:
         print("Error adding review:", err)
+        return False
 
 
 def delete_review(conn, user_id, isbn):
@@ -57,6 +137,7 @@ def delete_review(conn, user_id, isbn):
         sql = "DELETE FROM review WHERE user_id = %s AND isbn = %s"
         cursor.execute(sql, (user_id, isbn))
         conn.commit()
+        feed.activity_changed(user_id)
         print("Review(s) deleted successfully!")
     except mysql.connector.Error as err:
         print("Error deleting review:", err)
@@ -76,40 +157,56 @@ def modify_review(conn, user_id, isbn, star_rating, review_text):
     NOTE: This function is not currently used in app.py
     But a user can modify their review by adding a new review with the same ISBN
     (they will be prompted to modify their review if it already exists)
+
+    Returns:
+        bool: True if the review was modified, False otherwise
     """
     cursor = conn.cursor()
     try:
         sql = "UPDATE review SET star_rating = %s, review_text = %s WHERE user_id = %s AND isbn = %s"
         cursor.execute(sql, (star_rating, review_text, user_id, isbn))
         conn.commit()
+        feed.activity_changed(user_id)
         print("Review modified successfully!")
+        return True
     except mysql.connector.Error:
         print("Error modifying review. Make sure you have reviewed this book before.")
+        return False
 
 
 def get_reviews(conn, isbn):
     """
-    Get all reviews for a book.
+    Get the reviews for a book, a page at a time.
 
     Args:
         conn (MySQL Connection object): connection to the database
         isbn (str): the ISBN of the book
     """
-    cursor = conn.cursor()
     try:
-        sql = "SELECT user_id, star_rating, review_text FROM review WHERE isbn = %s"
-        cursor.execute(sql, (isbn,))
-        results = cursor.fetchall()
-        if not results:
-            print("No reviews found.")
-        else:
-            for row in results:
-                print(f"User ID: {row[0]} | Star Rating: {row[1]}\nReview: {row[2]}")
-            print()
+        page_through(lambda after: find_reviews(conn, isbn, after=after),
+                     print_reviews)
     except mysql.connector.Error as err:
         print("Error getting reviews:", err)
 
 
+# ----------------------------------------------------------------------
+# Display Functions
+# ----------------------------------------------------------------------
+def print_reviews(reviews):
+    """
+    Prints a list of reviews.
+
+    Args:
+        reviews (list of Review): the reviews to print
+    """
+    if not reviews:
+        print("No reviews found.")
+    else:
+        for user_id, star_rating, review_text in reviews:
+            print(f"User ID: {user_id} | Star Rating: {star_rating}\nReview: {review_text}")
+        print()
+
+
 # ----------------------------------------------------------------------
 # Command-Line Functionality
 # ----------------------------------------------------------------------
@@ -0,0 +1,443 @@
+"""
+A headless HTTP/JSON service for the Goodreads database.
+
+Exposes the same functionality as the interactive app (searching books,
+book pages, shelves, reviews and friends) as JSON endpoints, so it can be
+used by other programs and by many users at once. Each request is handled
+on its own thread with a connection drawn from the shared pool in db.py.
+
+Endpoints:
+    GET    /books?title=...            search books by title (with reading times)
+    GET    /books?author=...           search books by author (with reading times)
+    GET    /books/<isbn>               book summary, review statistics and reading time
+    GET    /books/<isbn>/reviews       reviews of a book
+    POST   /books/<isbn>/reviews       rate/review a book
+                                       {"user_id", "star_rating", "review_text"}
+    GET    /users?name=...             search users by name
+    GET    /users?email=...            find a user by email
+    GET    /users/<id>                 a user's profile
+    GET    /users/<id>/shelves         a user's shelves
+    GET    /shelves/<id>/books         books on a shelf
+    POST   /shelves/<id>/books         add a book to a shelf {"user_id", "isbn"}
+    GET    /users/<id>/friends         a user's friends
+    POST   /users/<id>/friends         add a friend {"friend_id"}
+    DELETE /users/<id>/friends/<id>    remove a friend
+    GET    /users/<id>/suggestions     people a user may know (?limit=N)
+    GET    /users/<id>/recommendations books a user may like (?limit=N)
+    GET    /users/<id>/feed            a user's friends' recent activity (?limit=N)
+    GET    /cache                      book cache size and hit/miss counts
+    GET    /metrics                    query metrics, in the Prometheus text format
+                                       (?format=json for JSON)
+
+Listings (book searches, reviews, shelf books) are paginated: they return
+{"items": [...], "next": token}, and passing ?after=<token> (with the same
+search) gets the next page. ?page_size=N sets the page size, up to
+MAX_PAGE_SIZE.
+
+The module functions still print their status messages, which end up in
+the server's output.
+
+NOTE: requests are not authenticated; the service trusts the user IDs it is
+given, so only expose it to trusted clients (it listens on localhost by
+default).
+
+Usage:
+    python3 goodreads/server.py [--host HOST] [--port PORT] [--pool-size N]
+"""
+
+import argparse
+import datetime
+import decimal
+import json
+import re
+import traceback
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import mysql.connector
+import books
+import db
+import feed
+import friends
+import instrument
+import paging
+import recommend
+import reviews
+import shelf
+import users
+
+DEFAULT_HOST = 'localhost'
+DEFAULT_PORT = 8080
+MAX_PAGE_SIZE = 100
+
+
+class RequestError(Exception):
+    """
+    An error caused by the request, reported to the client with a status.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# ----------------------------------------------------------------------
+# Helper Functions
+# ----------------------------------------------------------------------
+def to_json(value):
+    """
+    JSON encoder hook for the types MySQL returns.
+    """
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def require(body, *fields):
+    """
+    Returns the given fields of a request body, failing if any is missing.
+    """
+    missing = [field for field in fields if body.get(field) in (None, '')]
+    if missing:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"Missing field(s): {', '.join(missing)}")
+    return [body[field] for field in fields]
+
+
+def page_args(query):
+    """
+    Returns the page size and continuation token given in the query string.
+    """
+    page_size = query.get('page_size', str(paging.PAGE_SIZE))
+    if not page_size.isdigit() or not 1 <= int(page_size) <= MAX_PAGE_SIZE:
+        raise RequestError(HTTPStatus.BAD_REQUEST,
+                           f"page_size must be between 1 and {MAX_PAGE_SIZE}.")
+    return int(page_size), query.get('after')
+
+
+def limit_arg(query, default=10):
+    """
+    Returns the number of results asked for with ?limit=.
+    """
+    limit = query.get('limit', str(default))
+    if not limit.isdigit() or not 1 <= int(limit) <= MAX_PAGE_SIZE:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+    return int(limit)
+
+
+def page_to_json(page):
+    """
+    Converts a Page of records to a JSON-serializable result.
+    """
+    return {'items': [item._asdict() for item in page.items], 'next': page.next}
+
+
+# ----------------------------------------------------------------------
+# Request Handlers
+# ----------------------------------------------------------------------
+# Each handler takes a connection, the query string parameters, the JSON
+# body and the URL parameters, and returns a JSON-serializable result.
+def search_books(conn, query, body):
+    """
+    Searches books by title or author.
+    """
+    page_size, after = page_args(query)
+    if 'title' in query:
+        page = books.find_books_by_title(conn, query['title'], page_size, after)
+    elif 'author' in query:
+        page = books.find_books_by_author(conn, query['author'], page_size, after)
+    else:
+        raise RequestError(HTTPStatus.BAD_REQUEST, "Search by title or author.")
+    result = page_to_json(page)
+    reading_times = books.find_reading_times(conn, [listing.isbn for listing in page.items])
+    for item in result['items']:
+        item['reading_minutes'] = reading_times.get(item['isbn'])
+    return result
+
+
+def get_book(conn, query, body, isbn):
+    """
+    Returns a book's summary and review statistics.
+    """
+    summary = books.find_book_summary(conn, isbn)
+    if summary is None:
+        raise RequestError(HTTPStatus.NOT_FOUND, "No book found.")
+    result = summary.book._asdict()
+    result['authors'] = summary.authors
+    result['genres'] = summary.genres
+    stats = summary.stats
+    result['average_rating'] = stats.average_rating if stats else None
+    result['num_ratings'] = stats.num_ratings if stats else 0
+    result['num_reviews'] = stats.num_reviews if stats else 0
+    result['reading_time'] = summary.reading_time
+    return result
+
+
+def get_reviews(conn, query, body, isbn):
+    """
+    Returns the reviews of a book.
+    """
+    page_size, after = page_args(query)
+    return page_to_json(reviews.find_reviews(conn, isbn, page_size, after))
+
+
+def post_review(conn, query, body, isbn):
+    """
+    Adds a user's review of a book, or modifies it if one exists.
+    """
+    user_id, star_rating = require(body, 'user_id', 'star_rating')
+    review_text = body.get('review_text')
+    try:
+        reviews.save_review(conn, user_id, isbn, star_rating, review_text)
+    except mysql.connector.Error as err:
+        raise RequestError(HTTPStatus.CONFLICT, f"Could not save the review: {err.msg}")
+    return {'user_id': user_id, 'isbn': isbn, 'star_rating': star_rating}
+
+
+def search_users(conn, query, body):
+    """
+    Searches users by name or email.
+    """
+    if 'name' in query:
+        rows = friends.find_friends_by_name(conn, query['name'])
+    elif 'email' in query:
+        row = friends.find_friend_by_email(conn, query['email'])
+        rows = [row] if row else []
+    else:
+        raise RequestError(HTTPStatus.BAD_REQUEST, "Search by name or email.")
+    return [row._asdict() for row in rows]
+
+
+def get_user(conn, query, body, user_id):
+    """
+    Returns a user's profile.
+    """
+    user = users.find_user(conn, user_id)
+    if user is None:
+        raise RequestError(HTTPStatus.NOT_FOUND, "User not found.")
+    return user._asdict()
+
+
+def get_shelves(conn, query, body, user_id):
+    """
+    Returns a user's shelves.
+    """
+    return [row._asdict() for row in shelf.find_shelves(conn, user_id)]
+
+
+def get_shelf_books(conn, query, body, shelf_id):
+    """
+    Returns the books on a shelf.
+    """
+    page_size, after = page_args(query)
+    return page_to_json(shelf.find_shelf_books(conn, shelf_id, page_size, after))
+
+
+def post_shelf_book(conn, query, body, shelf_id):
+    """
+    Adds a book to one of the user's shelves.
+    """
+    user_id, isbn = require(body, 'user_id', 'isbn')
+    if not shelf.add_book_to_shelf(conn, isbn, user_id, shelf_id):
+        raise RequestError(HTTPStatus.CONFLICT, "Could not add the book to the shelf.")
+    return {'shelf_id': int(shelf_id), 'isbn': isbn}
+
+
+def get_friends(conn, query, body, user_id):
+    """
+    Returns a user's friends.
+    """
+    return [row._asdict() for row in friends.find_friends(conn, user_id)]
+
+
+def post_friend(conn, query, body, user_id):
+    """
+    Adds a friend.
+    """
+    (friend_id,) = require(body, 'friend_id')
+    if not friends.add_friend(conn, user_id, friend_id):
+        raise RequestError(HTTPStatus.CONFLICT, "Could not add the friend.")
+    return {'user_id': int(user_id), 'friend_id': friend_id}
+
+
+def delete_friend(conn, query, body, user_id, friend_id):
+    """
+    Removes a friend.
+    """
+    if not friends.delete_friend(conn, user_id, friend_id):
+        raise RequestError(HTTPStatus.CONFLICT, "Could not remove the friend.")
+    return {'user_id': int(user_id), 'friend_id': int(friend_id)}
+
+
+def get_suggestions(conn, query, body, user_id):
+    """
+    Returns the users with the most friends in common with a user.
+    """
+    return [row._asdict() for row in friends.find_suggestions(conn, user_id, limit_arg(query))]
+
+
+def get_recommendations(conn, query, body, user_id):
+    """
+    Returns the books a user may like, best first.
+    """
+    return [row._asdict() for row in
+            recommend.find_recommendations(conn, user_id, limit_arg(query))]
+
+
+def get_feed(conn, query, body, user_id):
+    """
+    Returns the latest activity of a user's friends, newest first.
+    """
+    return [row._asdict() for row in feed.find_feed(conn, user_id, limit_arg(query, feed.FEED_SIZE))]
+
+
+def get_cache_stats(conn, query, body):
+    """
+    Returns the book cache's size and hit/miss counts.
+    """
+    return books.book_cache.stats()
+
+
+def get_metrics(conn, query, body):
+    """
+    Returns the query metrics of each statement and request handler.
+    """
+    if query.get('format') == 'json':
+        return instrument.metrics.to_dict()
+    return instrument.metrics.to_prometheus()
+
+
+# (method, path pattern, handler); patterns capture the URL parameters
+ROUTES = [
+    ('GET', r'/books', search_books),
+    ('GET', r'/books/(\d{13})', get_book),
+    ('GET', r'/books/(\d{13})/reviews', get_reviews),
+    ('POST', r'/books/(\d{13})/reviews', post_review),
+    ('GET', r'/users', search_users),
+    ('GET', r'/users/(\d+)', get_user),
+    ('GET', r'/users/(\d+)/shelves', get_shelves),
+    ('GET', r'/shelves/(\d+)/books', get_shelf_books),
+    ('POST', r'/shelves/(\d+)/books', post_shelf_book),
+    ('GET', r'/users/(\d+)/friends', get_friends),
+    ('POST', r'/users/(\d+)/friends', post_friend),
+    ('DELETE', r'/users/(\d+)/friends/(\d+)', delete_friend),
+    ('GET', r'/users/(\d+)/suggestions', get_suggestions),
+    ('GET', r'/users/(\d+)/recommendations', get_recommendations),
+    ('GET', r'/users/(\d+)/feed', get_feed),
+    ('GET', r'/cache', get_cache_stats),
+    ('GET', r'/metrics', get_metrics),
+]
+
+
+def route(method, path):
+    """
+    Finds the handler and URL parameters for a request.
+    """
+    path_matched = False
+    for route_method, pattern, handler in ROUTES:
+        match = re.fullmatch(pattern, path.rstrip('/') or '/')
+        if match:
+            path_matched = True
+            if route_method == method:
+                return handler, match.groups()
+    if path_matched:
+        raise RequestError(HTTPStatus.METHOD_NOT_ALLOWED, "Method not allowed.")
+    raise RequestError(HTTPStatus.NOT_FOUND, "Not found.")
+
+
+class GoodreadsHandler(BaseHTTPRequestHandler):
+    """
+    Dispatches requests to the handlers in ROUTES.
+    """
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+    def handle_request(self, method):
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            handler, params = route(method, url.path)
+            body = self.read_body()
+            with db.connection() as conn, instrument.action(handler.__name__):
+                result = handler(conn, query, body, *params)
+            if isinstance(result, str):
+                self.send_text(HTTPStatus.OK, result)
+            else:
+                self.send_json(HTTPStatus.OK, result)
+        except RequestError as err:
+            self.send_json(err.status, {'error': err.message})
+        except paging.TokenError as err:
+            self.send_json(HTTPStatus.BAD_REQUEST, {'error': str(err)})
+        except mysql.connector.Error as err:
+            self.log_error("Database error: %s", err)
+            self.send_json(HTTPStatus.SERVICE_UNAVAILABLE, {'error': "Database error."})
+        except Exception:
+            # a bug in a handler shouldn't leave the client without a response
+            self.log_error("Error handling %s %s:\n%s", method, self.path, traceback.format_exc())
+            self.send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': "Internal server error."})
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "Body must be JSON.")
+        if not isinstance(body, dict):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object.")
+        return body
+
+    def send_json(self, status, result):
+        data = json.dumps(result, default=to_json).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_text(self, status, text):
+        data = text.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+# ----------------------------------------------------------------------
+# Main Program
+# ----------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Goodreads database over HTTP/JSON.")
+    parser.add_argument('--host', default=DEFAULT_HOST, help="address to listen on")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="port to listen on")
+    parser.add_argument('--pool-size', type=int, default=db.POOL_SIZE,
+                        help="number of database connections shared by request threads")
+    args = parser.parse_args()
+
+    instrument.enable()
+    db.init_pool(size=args.pool_size)
+    server = ThreadingHTTPServer((args.host, args.port), GoodreadsHandler)
+    server.daemon_threads = True
+    print(f"Serving the Goodreads database on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('Goodbye!')
+    finally:
+        server.server_close()
+        db.get_pool().close()
+
+
+if __name__ == '__main__':
+    main()
@@ -3,9 +3,85 @@ Shelf-related functions for the Goodreads database.
 """
 
 import mysql.connector
+import feed
+from uow import UnitOfWork
+from books import calculate_reading_time, find_titles
+from paging import PAGE_SIZE, fetch_page, page_through
+from records import BookListing, Shelf
 
 default_shelves = ["Favorites", "Has Read", "Wants to Read", "Currently Reading"]
 
+# ----------------------------------------------------------------------
+# Data Access Functions
+# ----------------------------------------------------------------------
+# These run queries and return records without printing anything; database
+# errors are raised to the caller.
+def find_shelves(conn, user_id):
+    """
+    Finds a user's shelves.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        user_id (int): the user's ID
+
+    Returns:
+        list of Shelf: the user's shelves
+    """
+    cursor = conn.cursor()
+    sql = "SELECT shelf_id, shelf_name FROM shelf WHERE user_id = %s"
+    cursor.execute(sql, (user_id,))
+    return [Shelf(*row) for row in cursor.fetchall()]
+
+
+def find_shelf_books(conn, shelf_id, page_size=PAGE_SIZE, after=None):
+    """
+    Finds a page of the books on a shelf, in ISBN order. Only the shelf's
+    ISBNs are queried; titles come from the book cache where possible.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        shelf_id (int): the shelf's ID
+        page_size (int, optional): number of books per page
+        after (str, optional): continuation token from the previous page
+
+    Returns:
+        Page: BookListings of the books on the shelf
+    """
+    cursor = conn.cursor()
+    sql = "SELECT isbn FROM on_shelf WHERE shelf_id = %s"
+    params = (shelf_id,)
+    if after is not None:
+        sql += " AND isbn > %s"
+        params += (after,)
+    sql += " ORDER BY isbn"
+    page = fetch_page(cursor, sql, params, page_size, lambda row: row[0], lambda row: row[0])
+    titles = find_titles(conn, page.items)
+    return page._replace(items=[BookListing(isbn, titles[isbn])
+                                for isbn in page.items if isbn in titles])
+
+
+def find_shelf_reading_time(conn, shelf_id, wpm=None):
+    """
+    Estimates how long it takes to read every book on a shelf, with one
+    query for the whole shelf.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        shelf_id (int): the shelf's ID
+        wpm (int, optional): reading speed in words per minute; defaults to 200
+
+    Returns:
+        tuple: (num_books, num_pages, minutes) over the books on the shelf
+               whose page count is known
+    """
+    cursor = conn.cursor()
+    sql = "SELECT num_pages FROM on_shelf NATURAL JOIN book WHERE shelf_id = %s AND num_pages IS NOT NULL"
+    cursor.execute(sql, (shelf_id,))
+    pages = [num_pages for (num_pages,) in cursor.fetchall()]
+    minutes = sum(calculate_reading_time(num_pages, wpm) or 0 for num_pages in pages)
+    return len(pages), sum(pages), minutes
+
+
 # ----------------------------------------------------------------------
 # Functions for Shelf Actions
 # ----------------------------------------------------------------------
@@ -17,18 +93,8 @@ def view_shelves(conn, user_id):
         conn (MySQL Connection object): connection to the database
         user_id (int): the user's ID
     """
-    cursor = conn.cursor()
     try:
-        sql = "SELECT shelf_id, shelf_name FROM shelf WHERE user_id = %s"
-        cursor.execute(sql, (user_id,))
-        results = cursor.fetchall()
-        if not results:
-            print("No shelves found.")
-        else:
-            for row in results:
-                shelf_id, shelf_name = row
-                print(f"Shelf ID: {shelf_id} | Shelf Name: {shelf_name}")
-            print()
+        print_shelves(find_shelves(conn, user_id))
     except mysql.connector.Error as err:
         print("Error getting user shelves:", err)
 
@@ -67,6 +133,7 @@ def delete_shelf(conn, user_id, shelf_id):
         sql = "DELETE FROM shelf WHERE user_id = %s AND shelf_id = %s"
         cursor.execute(sql, (user_id, shelf_id))
         conn.commit()
+        feed.activity_changed(user_id)
 
         print("Shelf deleted successfully!")
     except mysql.connector.Error as err:
@@ -78,10 +145,13 @@ def add_book_to_shelf(conn, isbn, user_id, shelf_id):
     Adds a book to a shelf.
 
     Args:
-        cconn (MySQL Connection object): connection to the database
+        conn (MySQL Connection object): connection to the database
         isbn (str): the ISBN of the book to add
         user_id (int): the user's ID
         shelf_id (int): the shelf's ID
+
+    Returns:
+        bool: True if the book was added, False otherwise
     """
     cursor = conn.cursor()
     try:
@@ -90,16 +160,19 @@ def add_book_to_shelf(conn, isbn, user_id, shelf_id):
         cursor.execute(sql, (user_id, shelf_id))
         if not cursor.fetchone():
             print("Double-check this shelf belongs to you.")
-            return
+            return False
 
         # add the book to the shelf
         sql = "INSERT INTO on_shelf (isbn, shelf_id) VALUES (%s, %s)"
         cursor.execute(sql, (isbn, shelf_id))
         conn.commit()
+        feed.activity_changed(user_id)
 
         print("Book added to shelf successfully!")
+        return True
     except mysql.connector.Error as err:
         print("Error adding book to shelf:", err)
+        return False
 
 
 def delete_book_from_shelf(conn, isbn, user_id, shelf_id):
@@ -125,35 +198,108 @@ def delete_book_from_shelf(conn, isbn, user_id, shelf_id):
         sql = "DELETE FROM on_shelf WHERE isbn = %s AND shelf_id = %s"
         cursor.execute(sql, (isbn, shelf_id))
         conn.commit()
+        feed.activity_changed(user_id)
         print("Book removed from shelf successfully!")
     except mysql.connector.Error as err:
         print("Error removing book from shelf:", err)
 
 
+def add_books_to_shelf(conn, isbns, user_id, shelf_id):
+    """
+    Adds many books to a shelf at once, in one transaction: either every
+    book is added or, if any of them can't be, none are.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        isbns (list of str): the ISBNs of the books to add
+        user_id (int): the user's ID
+        shelf_id (int): the shelf's ID
+
+    Returns:
+        bool: True if the books were added, False otherwise
+    """
+    try:
+        with UnitOfWork(conn) as work:
+            for isbn in dict.fromkeys(isbns):
+                work.add_book_to_shelf(user_id, shelf_id, isbn)
+    except ValueError as err:
+        print("Error adding books to shelf:", err)
+        return False
+    except mysql.connector.Error as err:
+        print("Error adding books to shelf (none were added):", err)
+        return False
+    print(f"{len(set(isbns))} books added to shelf successfully!")
+    return True
+
+
 def display_shelf(conn, shelf_id):
     """
-    Displays the books on a shelf.
+    Displays the books on a shelf, a page at a time.
 
     Args:
         conn (MySQL Connection object): connection to the database
         shelf_id (int): the shelf's ID
     """
-    cursor = conn.cursor()
     try:
-        # get the books on the shelf
-        sql = "SELECT isbn, title FROM on_shelf NATURAL JOIN book WHERE shelf_id = %s"
-        cursor.execute(sql, (shelf_id,))
-        results = cursor.fetchall()
-        if not results:
-            print("No books found on this shelf.")
-        else:
-            print("Books on this shelf:")
-            for row in results:
-                print(f"ISBN: {row[0]} | Title: {row[1]}")
+        page_through(lambda after: find_shelf_books(conn, shelf_id, after=after),
+                     print_shelf_books)
     except mysql.connector.Error as err:
         print("Error displaying shelf:", err)
 
 
+def get_shelf_reading_time(conn, shelf_id, wpm=None):
+    """
+    Prints how long it takes to read every book on a shelf.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        shelf_id (int): the shelf's ID
+        wpm (int, optional): reading speed in words per minute; defaults to 200
+    """
+    try:
+        num_books, num_pages, minutes = find_shelf_reading_time(conn, shelf_id, wpm)
+        if num_books == 0:
+            print("No books with a known length on this shelf.")
+        else:
+            print(f"It will take you: {minutes // 60}h {minutes % 60}m "
+                  f"to read this shelf ({num_books} books, {num_pages} pages).")
+    except mysql.connector.Error as err:
+        print("Error getting shelf reading time:", err)
+
+
+# ----------------------------------------------------------------------
+# Display Functions
+# ----------------------------------------------------------------------
+def print_shelves(shelves):
+    """
+    Prints a list of shelves.
+
+    Args:
+        shelves (list of Shelf): the shelves to print
+    """
+    if not shelves:
+        print("No shelves found.")
+    else:
+        for shelf_id, shelf_name in shelves:
+            print(f"Shelf ID: {shelf_id} | Shelf Name: {shelf_name}")
+        print()
+
+
+def print_shelf_books(books):
+    """
+    Prints the books on a shelf.
+
+    Args:
+        books (list of BookListing): the books on the shelf
+    """
+    if not books:
+        print("No books found on this shelf.")
+    else:
+        print("Books on this shelf:")
+        for isbn, title in books:
+            print(f"ISBN: {isbn} | Title: {title}")
+
+
 # ----------------------------------------------------------------------
 # Command-Line Functionality
 # ----------------------------------------------------------------------
@@ -218,6 +364,29 @@ def add_book_to_shelf_ui(conn, user_id, isbn=None):
     add_book_to_shelf(conn, isbn, user_id, shelf_name)
 
 
+def add_books_to_shelf_ui(conn, user_id):
+    """
+    Prompts a user to add several books to a shelf at once.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        user_id (int): the user's ID
+    """
+    isbns = input("Enter the ISBNs of the books to add, separated by spaces or commas: ")
+    isbns = isbns.replace(",", " ").split()
+    if not isbns:
+        print("No ISBNs entered.")
+        return
+    print("\nHere are your shelves:")
+    view_shelves(conn, user_id)
+    print()
+    shelf_id = input("Enter the ID of the shelf to add the books to: ")
+    if not shelf_id.isdigit():
+        print("Invalid shelf ID.")
+        return
+    add_books_to_shelf(conn, isbns, user_id, int(shelf_id))
+
+
 def delete_book_from_shelf_ui(conn, user_id):
     """
     Prompts a user to remove a book from a shelf.
@@ -249,3 +418,19 @@ def display_shelf_ui(conn):
     """
     shelf_id = input("Enter the id of the shelf to display: ")
     display_shelf(conn, shelf_id)
+
+
+def shelf_reading_time_ui(conn):
+    """
+    Prompts a user for a shelf and their reading speed, and prints how long
+    the shelf takes to read.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+    """
+    shelf_id = input("Enter the id of the shelf: ")
+    wpm = input("What is your reading speed (words per minute)? Press enter if you don't know: ")
+    if wpm and not wpm.isdigit():
+        print("Invalid reading speed.")
+        return
+    get_shelf_reading_time(conn, shelf_id, int(wpm) if wpm else None)
@@ -0,0 +1,178 @@
+"""
+A unit of work: many writes to the Goodreads database in one transaction.
+
+The write functions in shelf.py, reviews.py, friends.py and users.py each
+commit after a single change, which is right for one user action but makes
+every change wait for its own commit. A UnitOfWork instead collects
+changes (new shelves, books on shelves, reviews, friendships and users),
+then writes each table's rows with multi-row INSERTs of up to BATCH_SIZE
+rows and commits them all at once. If anything fails, the whole unit is
+rolled back, so a unit is saved entirely or not at all.
+
+    with UnitOfWork(conn) as work:
+        for isbn in isbns:
+            work.add_book_to_shelf(user_id, shelf_id, isbn)
+
+Leaving the with block commits (or rolls back, if it raised). Caches that
+depend on the changes (feeds, the friend graph) are only updated once the
+unit is committed.
+"""
+
+import mysql.connector
+import feed
+import friend_graph
+
+# rows per multi-row INSERT
+BATCH_SIZE = 1000
+
+# tables in the order they're written, so rows are inserted after the rows
+# they refer to (e.g. users before their shelves)
+INSERTS = {
+    'shelf': "INSERT INTO shelf (user_id, shelf_name, is_private) VALUES (%s, %s, %s)",
+    'on_shelf': "INSERT INTO on_shelf (isbn, shelf_id) VALUES (%s, %s)",
+    'review': "INSERT INTO review (user_id, isbn, star_rating, review_text) VALUES (%s, %s, %s, %s)",
+    'friend': "INSERT INTO friend (user_id, friend_id) VALUES (%s, %s)",
+}
+
+
+def batches(rows):
+    """
+    Splits a list of rows into BATCH_SIZE pieces.
+    """
+    for start in range(0, len(rows), BATCH_SIZE):
+        yield rows[start:start + BATCH_SIZE]
+
+
+class UnitOfWork:
+    """
+    Collects writes and runs them in one transaction on commit().
+    """
+
+    def __init__(self, conn):
+        """
+        Args:
+            conn (MySQL Connection object): connection to the database
+        """
+        self.conn = conn
+        self._users = []
+        self._rows = {table: [] for table in INSERTS}
+        # (user ID, shelf ID) of every book added to a shelf, to check the
+        # shelves belong to the users
+        self._shelf_owners = set()
+        # functions (and their arguments) to call once committed
+        self._after_commit = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    # ------------------------------------------------------------------
+    # Changes
+    # ------------------------------------------------------------------
+    def add_user(self, email, password, first_name, last_name, as_admin=False):
+        self._users.append((email, password, first_name, last_name, as_admin))
+
+    def create_shelf(self, user_id, shelf_name, is_private=False):
+        self._rows['shelf'].append((user_id, shelf_name, is_private))
+
+    def add_book_to_shelf(self, user_id, shelf_id, isbn):
+        """
+        Adds a book to one of a user's existing shelves (so not one created
+        in this unit).
+        """
+        self._rows['on_shelf'].append((isbn, shelf_id))
+        self._shelf_owners.add((int(user_id), int(shelf_id)))
+        self.after_commit(feed.activity_changed, user_id)
+
+    def add_review(self, user_id, isbn, star_rating, review_text):
+        self._rows['review'].append((user_id, isbn, star_rating, review_text))
+        self.after_commit(feed.activity_changed, user_id)
+
+    def add_friend(self, user_id, friend_id):
+        self._rows['friend'].append((user_id, friend_id))
+        self._rows['friend'].append((friend_id, user_id))
+        self.after_commit(friend_graph.friendship_added, user_id, friend_id)
+
+    def after_commit(self, function, *args):
+        """
+        Calls a function once the unit is committed (e.g. to update a cache).
+        """
+        self._after_commit.append((function, args))
+
+    def __len__(self):
+        return len(self._users) + sum(len(rows) for rows in self._rows.values())
+
+    # ------------------------------------------------------------------
+    # Committing
+    # ------------------------------------------------------------------
+    def commit(self):
+        """
+        Writes every change and commits them together.
+
+        Returns:
+            dict: the number of rows written to each table
+
+        Raises:
+            mysql.connector.Error: if a write failed; nothing is saved
+            ValueError: if a book was added to another user's shelf;
+                        nothing is saved
+        """
+        cursor = self.conn.cursor()
+        counts = {}
+        try:
+            for user in self._users:
+                cursor.execute("CALL sp_add_user(%s, %s, %s, %s, %s)", user)
+            counts['user_info'] = len(self._users)
+            self._check_shelf_owners(cursor)
+            for table, sql in INSERTS.items():
+                for batch in batches(self._rows[table]):
+                    # executemany sends each batch as a single multi-row INSERT
+                    cursor.executemany(sql, batch)
+                counts[table] = len(self._rows[table])
+            self.conn.commit()
+        except (mysql.connector.Error, ValueError):
+            self.rollback()
+            raise
+
+        after_commit = list(self._after_commit)
+        self._clear()
+        # each cache only needs updating once per unit
+        for function, args in dict.fromkeys(after_commit):
+            function(*args)
+        return counts
+
+    def rollback(self):
+        """
+        Discards every change.
+        """
+        self._clear()
+        try:
+            self.conn.rollback()
+        except mysql.connector.Error:
+            # the connection is broken, so nothing was saved anyway
+            pass
+
+    def _check_shelf_owners(self, cursor):
+        shelf_ids = sorted({shelf_id for user_id, shelf_id in self._shelf_owners})
+        owners = {}
+        for batch in batches(shelf_ids):
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(f"SELECT shelf_id, user_id FROM shelf WHERE shelf_id IN ({placeholders})",
+                           tuple(batch))
+            owners.update(cursor.fetchall())
+        for user_id, shelf_id in sorted(self._shelf_owners):
+            if owners.get(shelf_id) != user_id:
+                raise ValueError(f"shelf #{shelf_id} doesn't belong to user #{user_id}")
+
+    def _clear(self):
+        self._users.clear()
+        for rows in self._rows.values():
+            rows.clear()
+        self._shelf_owners.clear()
+        self._after_commit.clear()
@@ -3,6 +3,7 @@ User-related functions for the Goodreads database.
 """
 
 import mysql.connector
+from records import User
 
 # ----------------------------------------------------------------------
 # Functions for User Actions
@@ -50,6 +51,24 @@ def delete_user(conn, user_id):
         print("Error deleting user:", err)
 
 
+def find_user(conn, user_id):
+    """
+    Finds a user's public information.
+
+    Args:
+        conn (MySQL Connection object): connection to the database
+        user_id (int): the user's ID
+
+    Returns:
+        User: the user, or None if not found
+    """
+    cursor = conn.cursor()
+    sql = "SELECT user_id, first_name, last_name, join_date FROM user_info WHERE user_id = %s"
+    cursor.execute(sql, (user_id,))
+    row = cursor.fetchone()
+    return User(*row) if row else None
+
+
 def print_user_info(conn, user_id):
     """
     Prints user information.
@@ -61,19 +80,28 @@ def print_user_info(conn, user_id):
     Returns:
         bool: True if the user was found, False otherwise
     """
-    cursor = conn.cursor()
     try:
-        sql = "SELECT first_name, last_name, join_date FROM user_info WHERE user_id = %s"
-        cursor.execute(sql, (user_id,))
-        result = cursor.fetchone()
-        if result:
-            first_name, last_name, join_date = result
-            print(f"{first_name} {last_name}'s Page:")
-            print(f"ID: #{user_id} | Joined: {join_date}")
+        user = find_user(conn, user_id)
+        if user:
+            print_user(user)
             return True
         else:
             print("User not found.")
             return False
     except mysql.connector.Error as err:
         print("Error printing user info:", err)
-        return False
\ No newline at end of file
+        return False
+
+
+# ----------------------------------------------------------------------
+# Display Functions
+# ----------------------------------------------------------------------
+def print_user(user):
+    """
+    Prints a user's page header.
+
+    Args:
+        user (User): the user
+    """
+    print(f"{user.first_name} {user.last_name}'s Page:")
+    print(f"ID: #{user.user_id} | Joined: {user.join_date}")
@@ -0,0 +1,316 @@
+-- This script refreshes a loaded Goodreads DB from a new drop of gen_csvs/
+-- without dropping anything, so the app can stay online while it runs.
+
+-- Run it in the mysql> prompt, from the same directory as gen_csvs/ (with
+-- --local-infile=1, as for load-data.sql):
+-- USE goodreads;
+-- source incremental-load.sql;
+
+-- Each CSV is loaded into a staging table first, then compared with the
+-- live table, and only the differences are applied:
+--   * The catalog (book, author, book_author, genre, book_genre) follows
+--     the drop exactly: new rows are inserted, changed books are updated,
+--     and rows no longer in the drop are deleted (books added through the
+--     app but not in the drop are deleted too).
+--   * User data (user_info, friend, shelf, on_shelf, review) is only added
+--     to: users are matched by email, shelves by (user, name) and reviews
+--     by (user, book), and anything already there is kept as is, since
+--     users change it through the app.
+-- The CSVs refer to users, authors and shelves by row number, so the
+-- staging tables number their rows, and map tables translate row numbers
+-- to the live IDs.
+-- Like load-data.sql, rows that repeat a unique key (e.g. the same email
+-- twice) are skipped, hence the INSERT IGNOREs.
+-- Running it again with the same drop changes nothing.
+
+DROP TABLE IF EXISTS stage_book, stage_author, stage_author_map,
+    stage_book_author, stage_genre, stage_book_genre, stage_user,
+    stage_user_map, stage_friend, stage_shelf, stage_shelf_map,
+    stage_on_shelf, stage_review;
+
+
+-- ----------------------------------------------------------------------
+-- Books
+-- ----------------------------------------------------------------------
+CREATE TABLE stage_book (
+    isbn CHAR(13),
+    title VARCHAR(255) NOT NULL,
+    publisher VARCHAR(100),
+    year_published YEAR,
+    synopsis TEXT,
+    language_code CHAR(3),
+    num_pages INT,
+    cover_photo_url VARCHAR(255),
+    series_name VARCHAR(255) DEFAULT NULL,
+    PRIMARY KEY (isbn)
+);
+
+LOAD DATA LOCAL INFILE 'gen_csvs/book.csv' INTO TABLE stage_book
+FIELDS TERMINATED BY ',' ENCLOSED BY '"' LINES TERMINATED BY '\n' IGNORE 1 ROWS
+(isbn,title,publisher,year_published,language_code,num_pages,synopsis,cover_photo_url,series_name);
+
+-- Update books that changed
+UPDATE book AS b JOIN stage_book AS s ON s.isbn = b.isbn
+SET b.title = s.title, b.publisher = s.publisher,
+    b.year_published = s.year_published, b.synopsis = s.synopsis,
+    b.language_code = s.language_code, b.num_pages = s.num_pages,
+    b.cover_photo_url = s.cover_photo_url, b.series_name = s.series_name
+WHERE NOT (b.title <=> s.title AND b.publisher <=> s.publisher
+           AND b.year_published <=> s.year_published
+           AND b.synopsis <=> s.synopsis
+           AND b.language_code <=> s.language_code
+           AND b.num_pages <=> s.num_pages
+           AND b.cover_photo_url <=> s.cover_photo_url
+           AND b.series_name <=> s.series_name);
+
+-- Insert new books
+INSERT INTO book (isbn, title, publisher, year_published, synopsis,
+                  language_code, num_pages, cover_photo_url, series_name)
+SELECT isbn, title, publisher, year_published, synopsis,
+       language_code, num_pages, cover_photo_url, series_name
+FROM stage_book AS s
+WHERE NOT EXISTS (SELECT * FROM book AS b WHERE b.isbn = s.isbn);
+
+-- Delete books no longer in the catalog (their authors, genres, reviews,
+-- shelf entries and review statistics cascade)
+DELETE b FROM book AS b LEFT JOIN stage_book AS s ON s.isbn = b.isbn
+WHERE s.isbn IS NULL;
+
+
+-- ----------------------------------------------------------------------
+-- Authors
+-- ----------------------------------------------------------------------
+CREATE TABLE stage_author (
+    -- Row number in author.csv, which book_author.csv refers to
+    row_num INT AUTO_INCREMENT,
+    author_name VARCHAR(255) NOT NULL,
+    PRIMARY KEY (row_num)
+);
+
+LOAD DATA LOCAL INFILE 'gen_csvs/author.csv' INTO TABLE stage_author
+FIELDS TERMINATED BY ',' ENCLOSED BY '"' LINES TERMINATED BY '\n' IGNORE 1 ROWS
+(author_name);
+
+-- Insert new authors (matched by name, like add_authors)
+INSERT INTO author (author_name)
+SELECT DISTINCT author_name FROM stage_author AS s
+WHERE NOT EXISTS (SELECT * FROM author AS a WHERE a.author_name = s.author_name);
+
+CREATE TABLE stage_author_map (
+    row_num INT,
+    author_id INT,
+    PRIMARY KEY (row_num)
+);
+INSERT INTO stage_author_map (row_num, author_id)
+SELECT s.row_num, MIN(a.author_id)
+FROM stage_author AS s JOIN author AS a ON a.author_name = s.author_name
+GROUP BY s.row_num;
+
+CREATE TABLE stage_book_author (
+    isbn CHAR(13),
+    author_id INT,
+    PRIMARY KEY (isbn, author_id)
+);
+-- Loaded with the CSV's author row numbers, then translated to author IDs
+CREATE TEMPORARY TABLE stage_book_author_rows (
+    isbn CHAR(13),
+    author_row INT
+);
+LOAD DATA LOCAL INFILE 'gen_csvs/book_author.csv' INTO TABLE stage_book_author_rows
+FIELDS TERMINATED BY ',' ENCLOSED BY '"' LINES TERMINATED BY '\n' IGNORE 1 ROWS;
+INSERT IGNORE INTO stage_book_author (isbn, author_id)
+SELECT r.isbn, m.author_id
+FROM stage_book_author_rows AS r JOIN stage_author_map AS m ON m.row_num = r.author_row;
+DROP TEMPORARY TABLE stage_book_author_rows;
+
+-- Link books to their new authors
+INSERT INTO book_author (isbn, author_id)
+SELECT isbn, author_id FROM stage_book_author AS s
+WHERE NOT EXISTS (SELECT * FROM book_author AS ba
+                  WHERE ba.isbn = s.isbn AND ba.author_id = s.author_id);
+
+-- Unlink authors no longer credited
+DELETE ba FROM book_author AS ba
+LEFT JOIN stage_book_author AS s ON s.isbn = ba.isbn AND s.author_id = ba.author_id
+WHERE s.isbn IS NULL;
+
+-- Delete authors who are neither in the catalog nor credited on a book
+DELETE a FROM author AS a
+LEFT JOIN stage_author_map AS m ON m.author_id = a.author_id
+WHERE m.author_id IS NULL
+AND NOT EXISTS (SELECT * FROM book_author AS ba WHERE ba.author_id = a.author_id);
+
+
+-- ----------------------------------------------------------------------
+-- Genres
+-- ----------------------------------------------------------------------
+CREATE TABLE stage_genre (
+    genre_name VARCHAR(50),
+    PRIMARY KEY (genre_name)
+);
+LOAD DATA LOCAL INFILE 'gen_csvs/genre.csv' INTO TABLE stage_genre
+FIELDS TERMINATED BY ',' ENCLOSED BY '"' LINES TERMINATED BY '\n' IGNORE 1 ROWS
+(genre_name);
+
+CREATE TABLE stage_book_genre (
+    isbn CHAR(13),
+    genre_name VARCHAR(50),
+    PRIMARY KEY (isbn, genre_name)
+);
+LOAD DATA LOCAL INFILE 'gen_csvs/book_genre.csv' INTO TABLE stage_book_genre
+FIELDS TERMINATED BY ',' ENCLOSED BY '"' LINES TERMINATED BY '\n' IGNORE 1 ROWS;
+
+-- Insert new genres
+INSERT INTO genre (genre_name)
+SELECT genre_name FROM stage_genre AS s
+WHERE NOT EXISTS (SELECT * FROM genre AS g WHERE g.genre_name = s.genre_name);
+
+-- Link books to their new genres
+INSERT INTO book_genre (isbn, genre_name)
+SELECT isbn, genre_name FROM stage_book_genre AS s
+WHERE NOT EXISTS (SELECT * FROM book_genre AS bg
+                  WHERE bg.isbn = s.isbn AND bg.genre_name = s.genre_name);
+
+-- Unlink genres no longer listed, and delete genres no longer in the catalog
+DELETE bg FROM book_genre AS bg
+LEFT JOIN stage_book_genre AS s ON s.isbn = bg.isbn AND s.genre_name = bg.genre_name
+WHERE s.isbn IS NULL;
+
+DELETE g FROM genre AS g LEFT JOIN stage_genre AS s ON s.genre_name = g.genre_name
+WHERE s.genre_name IS NULL;
+
+
+-- ----------------------------------------------------------------------
+-- Users and Friends
+-- ----------------------------------------------------------------------
+CREATE TABLE stage_user (
+    -- Row number in user_info.csv, which the other user CSVs refer to
+    row_num INT AUTO_INCREMENT,
+    first_name VARCHAR(30) NOT NULL,
+    last_name VARCHAR(30),
+    email VARCHAR(320) NOT NULL,
+    salt CHAR(8) NOT NULL,
+    password_hash BINARY(64) NOT NULL,
+    join_date TIMESTAMP,
+    PRIMARY KEY (row_num)
+);
+LOAD DATA LOCAL INFILE 'gen_csvs/user_info.csv' INTO TABLE stage_user
+FIELDS TERMINATED BY ',' ENCLOSED BY '"' LINES TERMINATED BY '\n' IGNORE 1 ROWS
+(first_name, last_name, email, salt, password_hash, join_date);
+
+-- Insert new users
+INSERT IGNORE INTO user_info (first_name, last_name, email, salt, password_hash, join_date)
+SELECT first_name, last_name, email, salt, password_hash, join_date
+FROM stage_user AS s
+WHERE NOT EXISTS (SELECT * FROM user_info AS u WHERE u.email = s.email)
+ORDER BY row_num;
+
+CREATE TABLE stage_user_map (
+    row_num INT,
+    user_id INT,
+    PRIMARY KEY (row_num)
+);
+INSERT INTO stage_user_map (row_num, user_id)
+SELECT s.row_num, u.user_id
+FROM stage_user AS s JOIN user_info AS u ON u.email = s.email;
+
+CREATE TABLE stage_friend (
+    user_row INT,
+    friend_row INT
+);
+LOAD DATA LOCAL INFILE 'gen_csvs/friend.csv' INTO TABLE stage_friend
+FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' LINES TERMINATED BY '\n' IGNORE 1 ROWS;
+
+-- Insert new friendships
+INSERT INTO friend (user_id, friend_id)
+SELECT DISTINCT mu.user_id, mf.user_id
+FROM stage_friend AS s
+    JOIN stage_user_map AS mu ON mu.row_num = s.user_row
+    JOIN stage_user_map AS mf ON mf.row_num = s.friend_row
+WHERE mu.user_id != mf.user_id
+AND NOT EXISTS (SELECT * FROM friend AS f
+                WHERE f.user_id = mu.user_id AND f.friend_id = mf.user_id);
+
+
+-- ----------------------------------------------------------------------
+-- Shelves
+-- ----------------------------------------------------------------------
+CREATE TABLE stage_shelf (
+    -- Row number in shelf.csv, which on_shelf.csv refers to
+    row_num INT AUTO_INCREMENT,
+    user_row INT,
+    shelf_name VARCHAR(255) NOT NULL,
+    is_private BOOLEAN NOT NULL DEFAULT FALSE,
+    PRIMARY KEY (row_num)
+);
+LOAD DATA LOCAL INFILE 'gen_csvs/shelf.csv' INTO TABLE stage_shelf
+FIELDS TERMINATED BY ',' ENCLOSED BY '"' LINES TERMINATED BY '\n' IGNORE 1 ROWS
+(user_row, shelf_name, is_private);
+
+-- Insert new shelves (a user's shelf names are unique)
+INSERT IGNORE INTO shelf (user_id, shelf_name, is_private)
+SELECT m.user_id, s.shelf_name, s.is_private
+FROM stage_shelf AS s JOIN stage_user_map AS m ON m.row_num = s.user_row
+WHERE NOT EXISTS (SELECT * FROM shelf AS sh
+                  WHERE sh.user_id = m.user_id AND sh.shelf_name = s.shelf_name)
+ORDER BY s.row_num;
+
+CREATE TABLE stage_shelf_map (
+    row_num INT,
+    shelf_id INT,
+    PRIMARY KEY (row_num)
+);
+INSERT INTO stage_shelf_map (row_num, shelf_id)
+SELECT s.row_num, sh.shelf_id
+FROM stage_shelf AS s
+    JOIN stage_user_map AS m ON m.row_num = s.user_row
+    JOIN shelf AS sh ON sh.user_id = m.user_id AND sh.shelf_name = s.shelf_name;
+
+CREATE TABLE stage_on_shelf (
+    isbn CHAR(13),
+    shelf_row INT
+);
+LOAD DATA LOCAL INFILE 'gen_csvs/on_shelf.csv' INTO TABLE stage_on_shelf
+FIELDS TERMINATED BY ',' ENCLOSED BY '"' LINES TERMINATED BY '\n' IGNORE 1 ROWS;
+
+-- Insert new shelf entries (for books still in the catalog); as in
+-- load-data.sql, when they were shelved isn't known
+INSERT INTO on_shelf (isbn, shelf_id, added_at)
+SELECT DISTINCT s.isbn, m.shelf_id, NULL
+FROM stage_on_shelf AS s
+    JOIN stage_shelf_map AS m ON m.row_num = s.shelf_row
+    JOIN book AS b ON b.isbn = s.isbn
+WHERE NOT EXISTS (SELECT * FROM on_shelf AS os
+                  WHERE os.isbn = s.isbn AND os.shelf_id = m.shelf_id);
+
+
+-- ----------------------------------------------------------------------
+-- Reviews
+-- ----------------------------------------------------------------------
+CREATE TABLE stage_review (
+    user_row INT,
+    isbn CHAR(13),
+    star_rating DECIMAL(2, 1) NOT NULL,
+    review_text TEXT,
+    review_date TIMESTAMP
+);
+LOAD DATA LOCAL INFILE 'gen_csvs/review.csv' INTO TABLE stage_review
+FIELDS TERMINATED BY ',' ENCLOSED BY '"' LINES TERMINATED BY '\n' IGNORE 1 ROWS
+(user_row,isbn,star_rating,@text,review_date)
+SET review_text = NULLIF(@text,'');
+
+-- Insert new reviews (one per user and book); the review triggers update
+-- book_review_stats and the reviewers' "Has Read" shelves
+INSERT IGNORE INTO review (user_id, isbn, star_rating, review_text, review_date)
+SELECT m.user_id, s.isbn, s.star_rating, s.review_text, s.review_date
+FROM stage_review AS s
+    JOIN stage_user_map AS m ON m.row_num = s.user_row
+    JOIN book AS b ON b.isbn = s.isbn
+WHERE NOT EXISTS (SELECT * FROM review AS r
+                  WHERE r.user_id = m.user_id AND r.isbn = s.isbn);
+
+
+-- Clean up
+DROP TABLE stage_book, stage_author, stage_author_map, stage_book_author,
+    stage_genre, stage_book_genre, stage_user, stage_user_map, stage_friend,
+    stage_shelf, stage_shelf_map, stage_on_shelf, stage_review;
@@ -29,7 +29,8 @@ FIELDS TERMINATED BY ',' ENCLOSED BY '"' LINES TERMINATED BY '\n' IGNORE 1 ROWS
 (user_id,shelf_name,is_private);
 
 LOAD DATA LOCAL INFILE 'gen_csvs/on_shelf.csv' INTO TABLE on_shelf
-FIELDS TERMINATED BY ',' ENCLOSED BY '"' LINES TERMINATED BY '\n' IGNORE 1 ROWS;
+FIELDS TERMINATED BY ',' ENCLOSED BY '"' LINES TERMINATED BY '\n' IGNORE 1 ROWS
+(isbn,shelf_id) SET added_at = NULL;
 
 LOAD DATA LOCAL INFILE 'gen_csvs/genre.csv' INTO TABLE genre
 FIELDS TERMINATED BY ',' ENCLOSED BY '"' LINES TERMINATED BY '\n' IGNORE 1 ROWS
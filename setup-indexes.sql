@@ -0,0 +1,60 @@
+-- Secondary indexes for the app's lookups
+
+-- Run this after load-data.sql: building each index once over the loaded
+-- rows is much faster than updating it row by row during the load. It only
+-- adds indexes that are missing, so it can also be run on an existing
+-- database to bring it up to date.
+
+-- Already covered by setup.sql: lookups by primary key, shelves by
+-- (user_id, shelf_name), a user's review of a book by (user_id, isbn), and
+-- the authors and genres of a book (primary keys of book_author and
+-- book_genre start with isbn).
+
+DROP PROCEDURE IF EXISTS add_index;
+
+-- Procedure to create an index unless the table already has one by that name
+DELIMITER !
+CREATE PROCEDURE add_index(
+    table_name_ VARCHAR(64),
+    index_name_ VARCHAR(64),
+    -- Comma-separated columns of the index
+    columns_ VARCHAR(255)
+)
+BEGIN
+    IF NOT EXISTS (
+        SELECT * FROM information_schema.statistics
+        WHERE table_schema = DATABASE()
+        AND table_name = table_name_
+        AND index_name = index_name_
+    ) THEN
+        SET @create_index = CONCAT('CREATE INDEX ', index_name_, ' ON ',
+                                   table_name_, ' (', columns_, ')');
+        PREPARE stmt FROM @create_index;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END !
+DELIMITER ;
+
+-- Reviews of a book in review_id order, for paging through them.
+CALL add_index('review', 'idx_review_isbn', 'isbn, review_id');
+-- Ratings of a book, so rating aggregates (refresh_book_review_stats) are
+-- read from the index alone.
+CALL add_index('review', 'idx_review_isbn_rating', 'isbn, star_rating');
+-- A user's latest reviews, for the friends' activity feed.
+CALL add_index('review', 'idx_review_user_date', 'user_id, review_date');
+
+-- Books on a shelf in ISBN order, for paging through them; the primary key
+-- (isbn, shelf_id) only serves "which shelves is this book on".
+CALL add_index('on_shelf', 'idx_on_shelf_shelf', 'shelf_id, isbn');
+-- The latest books added to a shelf, for the friends' activity feed.
+CALL add_index('on_shelf', 'idx_on_shelf_added', 'shelf_id, added_at');
+
+-- Books by an author and books in a genre.
+CALL add_index('book_author', 'idx_book_author_author', 'author_id, isbn');
+CALL add_index('book_genre', 'idx_book_genre_genre', 'genre_name, isbn');
+
+-- Who has a user as a friend (the reverse of the primary key).
+CALL add_index('friend', 'idx_friend_friend', 'friend_id, user_id');
+
+DROP PROCEDURE add_index;
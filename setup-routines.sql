@@ -3,7 +3,13 @@ DROP PROCEDURE IF EXISTS add_authors;
 DROP PROCEDURE IF EXISTS add_genres;
 DROP PROCEDURE IF EXISTS add_book;
 DROP FUNCTION IF EXISTS calculate_reading_time;
+DROP PROCEDURE IF EXISTS adjust_book_review_stats;
+DROP PROCEDURE IF EXISTS refresh_book_review_stats;
 DROP TRIGGER IF EXISTS auto_add_to_has_read_shelf;
+DROP TRIGGER IF EXISTS review_stats_after_insert;
+DROP TRIGGER IF EXISTS review_stats_after_update;
+DROP TRIGGER IF EXISTS review_stats_after_delete;
+DROP TRIGGER IF EXISTS delete_user_reviews;
 
 -- Functions
 
@@ -130,6 +136,42 @@ BEGIN
 END !
 DELIMITER ;
 
+-- Procedure to add a change in a book's ratings to its review statistics
+DELIMITER !
+CREATE PROCEDURE adjust_book_review_stats(
+    book_isbn CHAR(13),
+    -- Change in the sum of the book's star ratings
+    rating_change DECIMAL(12, 1),
+    -- Changes in the number of ratings and of reviews with text
+    ratings_change INT,
+    reviews_change INT
+)
+BEGIN
+    INSERT INTO book_review_stats (isbn, rating_sum, num_ratings, num_reviews)
+        VALUES (book_isbn, rating_change, ratings_change, reviews_change)
+    ON DUPLICATE KEY UPDATE
+        rating_sum = rating_sum + rating_change,
+        num_ratings = num_ratings + ratings_change,
+        num_reviews = num_reviews + reviews_change;
+
+    -- Only books with ratings have statistics
+    DELETE FROM book_review_stats WHERE isbn = book_isbn AND num_ratings = 0;
+END !
+DELIMITER ;
+
+-- Procedure to recompute all review statistics from the review table, e.g.
+-- after loading reviews while the triggers below didn't exist
+DELIMITER !
+CREATE PROCEDURE refresh_book_review_stats()
+BEGIN
+    DELETE FROM book_review_stats;
+    INSERT INTO book_review_stats (isbn, rating_sum, num_ratings, num_reviews)
+        SELECT isbn, SUM(star_rating), COUNT(*), COUNT(review_text)
+        FROM review
+        GROUP BY isbn;
+END !
+DELIMITER ;
+
 -- Triggers
 
 -- Add a trigger to add a book to "Has Read" after a user reviews it
@@ -147,13 +189,64 @@ BEGIN
         AND user_id = NEW.user_id
         AND shelf_name = 'Has Read'
     ) THEN
-        -- Insert the book into the has read shelf
-        INSERT INTO on_shelf (isbn, shelf_id)
-        SELECT NEW.isbn, shelf_id
+        -- Insert the book into the has read shelf, with no added_at so the
+        -- review doesn't also show up in friends' feeds as a shelf addition
+        INSERT INTO on_shelf (isbn, shelf_id, added_at)
+        SELECT NEW.isbn, shelf_id, NULL
         FROM shelf
         WHERE user_id = NEW.user_id
         AND shelf_name = 'Has Read'
         LIMIT 1;
     END IF;
 END !
-DELIMITER ;
\ No newline at end of file
+DELIMITER ;
+
+-- Triggers to keep book_review_stats up to date as reviews change
+DELIMITER !
+CREATE TRIGGER review_stats_after_insert
+AFTER INSERT ON review
+FOR EACH ROW
+BEGIN
+    CALL adjust_book_review_stats(NEW.isbn, NEW.star_rating, 1,
+                                  NEW.review_text IS NOT NULL);
+END !
+DELIMITER ;
+
+DELIMITER !
+CREATE TRIGGER review_stats_after_update
+AFTER UPDATE ON review
+FOR EACH ROW
+BEGIN
+    -- Take out the old rating and put in the new one (which may even be for
+    -- a different book)
+    CALL adjust_book_review_stats(OLD.isbn, -OLD.star_rating, -1,
+                                  -(OLD.review_text IS NOT NULL));
+    CALL adjust_book_review_stats(NEW.isbn, NEW.star_rating, 1,
+                                  NEW.review_text IS NOT NULL);
+END !
+DELIMITER ;
+
+DELIMITER !
+CREATE TRIGGER review_stats_after_delete
+AFTER DELETE ON review
+FOR EACH ROW
+BEGIN
+    CALL adjust_book_review_stats(OLD.isbn, -OLD.star_rating, -1,
+                                  -(OLD.review_text IS NOT NULL));
+END !
+DELIMITER ;
+
+-- Foreign key cascades don't fire triggers, so delete a user's reviews
+-- ourselves before the user is deleted, keeping the statistics of the books
+-- they reviewed correct. (Deleting a book deletes its statistics directly.)
+DELIMITER !
+CREATE TRIGGER delete_user_reviews
+BEFORE DELETE ON user_info
+FOR EACH ROW
+BEGIN
+    DELETE FROM review WHERE user_id = OLD.user_id;
+END !
+DELIMITER ;
+
+-- Compute the statistics of the reviews loaded by load-data.sql
+CALL refresh_book_review_stats();
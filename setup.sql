@@ -3,7 +3,7 @@ CREATE DATABASE IF NOT EXISTS goodreads;
 USE goodreads;
 
 -- Clean up tables if they already exist.
-DROP VIEW IF EXISTS book_review_stats;
+DROP TABLE IF EXISTS book_review_stats;
 DROP TABLE IF EXISTS book_genre;
 DROP TABLE IF EXISTS review;
 DROP TABLE IF EXISTS on_shelf;
@@ -54,14 +54,19 @@ CREATE TABLE book (
     cover_photo_url VARCHAR(255),
     -- The series the book is a part of, if any; NULL if not part of a series.
     series_name VARCHAR(255) DEFAULT NULL,
-    PRIMARY KEY (isbn)
+    PRIMARY KEY (isbn),
+    -- Word index for title search; InnoDB keeps it up to date as books are
+    -- added and deleted.
+    FULLTEXT INDEX ft_title (title)
 );
 
 -- Represents an author of a book.
 CREATE TABLE author (
     author_id INT AUTO_INCREMENT,
     author_name VARCHAR(255) NOT NULL,
-    PRIMARY KEY (author_id)
+    PRIMARY KEY (author_id),
+    -- Word index for author search.
+    FULLTEXT INDEX ft_author_name (author_name)
 );
 
 -- Represents a many-to-many relationship between books and authors.
@@ -117,6 +122,9 @@ CREATE TABLE on_shelf (
     -- International Standard Book Numbers (ISBNs) uniquely identify books.
     isbn CHAR(13),
     shelf_id INT,
+    -- When the book was added to the shelf; NULL for loaded data, whose
+    -- times aren't known, and for books shelved by reviewing them.
+    added_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP,
     PRIMARY KEY (isbn, shelf_id),
     FOREIGN KEY (isbn) REFERENCES book(isbn) ON DELETE CASCADE,
     FOREIGN KEY (shelf_id) REFERENCES shelf(shelf_id) ON DELETE CASCADE,
@@ -142,20 +150,26 @@ CREATE TABLE review (
 );
 
 
--- Add indexes
-CREATE INDEX idx_email ON user_info(email);
-
--- Create book statistics VIEW
-CREATE VIEW book_review_stats AS
-SELECT isbn, AVG(star_rating) AS average_rating,
-    COUNT(*) AS num_ratings, COUNT(review_text) AS num_reviews
-FROM review
-GROUP BY isbn;
-
-/* CREATE INDEX idx_author ON books(author); */
+-- Review statistics of each book with at least one rating. Kept up to
+-- date by the triggers on review in setup-routines.sql, so book pages and
+-- leaderboards read one row instead of aggregating the book's reviews.
+CREATE TABLE book_review_stats (
+    isbn CHAR(13),
+    -- Sum of the book's star ratings.
+    rating_sum DECIMAL(12, 1) NOT NULL DEFAULT 0,
+    num_ratings INT NOT NULL DEFAULT 0,
+    -- Number of ratings that came with review text.
+    num_reviews INT NOT NULL DEFAULT 0,
+    average_rating DECIMAL(6, 5)
+        GENERATED ALWAYS AS (rating_sum / NULLIF(num_ratings, 0)) STORED,
+    PRIMARY KEY (isbn),
+    FOREIGN KEY (isbn) REFERENCES book(isbn) ON DELETE CASCADE,
+    -- For top-rated leaderboards.
+    INDEX idx_top_rated (average_rating, num_ratings)
+);
 
--- CREATE INDEX idx_isbn ON reviews(isbn);
--- CREATE INDEX idx_isbn ON on_shelf(isbn);
--- CREATE INDEX idx_isbn ON book_genres(isbn);
--- CREATE INDEX idx_isbn ON book_authors(isbn);
 
+-- Add indexes
+CREATE INDEX idx_email ON user_info(email);
+-- The indexes for the app's other lookups are added by setup-indexes.sql,
+-- once the data is loaded.